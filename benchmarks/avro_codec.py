@@ -0,0 +1,78 @@
+"""
+Per-message cost of `confluent.to_dict`/`to_avro` vs `avro.to_dict`/`to_avro` for a small and a wide record,
+and of `avro.to_dict` + `pydantic.to_instance_of` vs the fused `avro.to_instance_of`.
+
+The registry is an in-memory stand-in, so only serialization is measured.
+The `avro` compositions save the per-message overhead of the Confluent wrapper: it shows with the small record,
+while fastavro's own encoding and decoding take all the time of the wide one, which costs the same either way.
+
+Usage:
+    python benchmarks/avro_codec.py [--number 20000]
+"""
+
+import argparse
+import timeit
+from typing import Optional, Union
+
+import orjson
+from confluent_kafka.schema_registry import Schema
+from pydantic import create_model
+from quixstreams.models import Deserializer, SerializationContext
+
+from fixtures import InMemorySchemaRegistryClient
+from quixstreams_extensions.serializers.composer import composed
+from quixstreams_extensions.serializers.compositions import avro, confluent, pydantic
+
+
+SMALL = {"type": "record", "name": "Small", "fields": [{"name": "age", "type": "int"}]}
+WIDE = {
+    "type": "record",
+    "name": "Wide",
+    "fields": [{"name": f"field_{idx}", "type": ["null", "string", "long"], "default": None} for idx in range(50)],
+}
+RECORDS = {
+    "small": (SMALL, {"age": 42}),
+    "wide": (WIDE, {f"field_{idx}": (f"value-{idx}" if idx % 2 else idx) for idx in range(50)}),
+}
+MODELS = {
+    "small": create_model("Small", age=(int, ...)),
+    "wide": create_model("Wide", **{f"field_{idx}": (Optional[Union[str, int]], None) for idx in range(50)}),
+}
+
+
+def measure(fn, number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20_000, help="calls per measurement")
+    args = parser.parse_args()
+
+    ctx = SerializationContext("topic")
+    print(f"{'record':>6} | {'direction':>9} | {'baseline, ns/msg':>17} | {'avro, ns/msg':>12} | {'speedup':>7}")
+    for name, (schema, record) in RECORDS.items():
+        client = InMemorySchemaRegistryClient()
+        schema = Schema(orjson.dumps(schema).decode(), "AVRO")
+        payload = confluent.to_avro(client, schema)(record, ctx)
+        for direction, candidates in (
+            ("encode", (confluent.to_avro(client, schema), avro.to_avro(client, schema), record)),
+            ("decode", (confluent.to_dict(client), avro.to_dict(client), payload)),
+            (
+                "to model",
+                (
+                    composed(Deserializer, avro.to_dict(client), pydantic.to_instance_of(MODELS[name])),
+                    avro.to_instance_of(client, MODELS[name]),
+                    payload,
+                ),
+            ),
+        ):
+            baseline, compiled, value = candidates
+            assert baseline(value, ctx) == compiled(value, ctx)
+            before = measure(lambda: baseline(value, ctx), args.number)
+            after = measure(lambda: compiled(value, ctx), args.number)
+            print(f"{name:>6} | {direction:>9} | {before:>17.0f} | {after:>12.0f} | {before / after:>6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Per-message overhead of `composed()` chains: the original reduce-based implementation vs the compiled one.
+
+Every step is a trivial function, so the numbers show the composition overhead only.
+
+Usage:
+    python benchmarks/composer.py [--number 200000]
+"""
+
+import argparse
+import timeit
+from functools import reduce
+from inspect import signature
+from typing import Any, Optional
+
+from quixstreams.models import SerializationContext, Serializer
+
+from quixstreams_extensions.serializers.composer import composed
+
+
+def legacy_composed(serializer_type, *functions):
+    """
+    The implementation `composed()` used to have, kept here as a reference point.
+    """
+
+    class ComposedSerializer(serializer_type):
+        def __call__(self, value: Any, ctx: Optional[SerializationContext] = None) -> Any:
+            def apply(acc, f):
+                sig = signature(f)
+                if len(sig.parameters) == 1:
+                    return f(acc)
+                elif len(sig.parameters) == 2:
+                    return f(acc, ctx)
+                else:
+                    raise ValueError(f"Function {f} has an unexpected number of parameters")
+
+            return reduce(apply, functions, value)
+
+    return ComposedSerializer()
+
+
+def identity(value):
+    return value
+
+
+def identity_with_ctx(value, ctx):
+    return value
+
+
+def chain(length: int):
+    return [identity if idx % 2 else identity_with_ctx for idx in range(length)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=200_000, help="calls per measurement")
+    args = parser.parse_args()
+
+    ctx = SerializationContext("topic")
+    print(f"{'steps':>5} | {'legacy, ns/msg':>15} | {'compiled, ns/msg':>16} | {'speedup':>7}")
+    for length in range(1, 7):
+        timings = []
+        for factory in (legacy_composed, composed):
+            serializer = factory(Serializer, *chain(length))
+            best = min(timeit.repeat(lambda: serializer(1, ctx), number=args.number, repeat=5))
+            timings.append(best / args.number * 1e9)
+        legacy, compiled = timings
+        print(f"{length:>5} | {legacy:>15.0f} | {compiled:>16.0f} | {legacy / compiled:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Offline stand-ins and payloads shared by the benchmarks:
+an in-memory schema registry, small/wide/nested Avro schemas with matching records and pydantic models,
+and a Firestore client recording writes instead of sending them.
+"""
+
+from typing import Dict, List, Optional, Union
+
+import orjson
+from confluent_kafka.schema_registry import RegisteredSchema, Schema, SchemaRegistryClient
+from pydantic import BaseModel, create_model
+
+
+class InMemorySchemaRegistryClient(SchemaRegistryClient):
+    """
+    A registry that never leaves the process.
+    """
+
+    def __init__(self):
+        super().__init__({"url": "http://in-memory"})
+        self._schemas = {}
+
+    def register_schema(self, subject_name, schema, normalize_schemas=False):
+        for schema_id, known in self._schemas.items():
+            if known.schema_str == schema.schema_str:
+                return schema_id
+        schema_id = len(self._schemas) + 1
+        self._schemas[schema_id] = schema
+        return schema_id
+
+    def lookup_schema(self, subject_name, schema, normalize_schemas=False):
+        schema_id = self.register_schema(subject_name, schema)
+        return RegisteredSchema(schema_id, schema, subject_name, 1)
+
+    def get_schema(self, schema_id):
+        return self._schemas[schema_id]
+
+
+class RecordingDocument:
+    def __init__(self, path: str):
+        self.path = path
+
+
+class RecordingCollection:
+    def __init__(self, path: str):
+        self.path = path
+
+    def document(self, key: str) -> RecordingDocument:
+        return RecordingDocument(f"{self.path}/{key}")
+
+
+class RecordingBatch:
+    def __init__(self, client: "RecordingFirestoreClient"):
+        self._client = client
+        self._writes = 0
+
+    def set(self, document: RecordingDocument, data: dict, merge: bool = False):
+        self._writes += 1
+
+    def commit(self):
+        self._client.commits += 1
+        self._client.writes += self._writes
+
+
+class RecordingFirestoreClient:
+    """
+    A `firestore.Client` stand-in counting commits and writes, so only the sink's own work is measured.
+    """
+
+    def __init__(self):
+        self.commits = 0
+        self.writes = 0
+
+    def collection(self, name: str) -> RecordingCollection:
+        return RecordingCollection(name)
+
+    def document(self, path: str) -> RecordingDocument:
+        return RecordingDocument(path)
+
+    def batch(self) -> RecordingBatch:
+        return RecordingBatch(self)
+
+
+SMALL_SCHEMA = {"type": "record", "name": "Small", "fields": [{"name": "age", "type": "int"}]}
+WIDE_SCHEMA = {
+    "type": "record",
+    "name": "Wide",
+    "fields": [{"name": f"field_{idx}", "type": ["null", "string", "long"], "default": None} for idx in range(50)],
+}
+# WIDE_SCHEMA as a reader of a later version, with a field added
+EVOLVED_WIDE_SCHEMA = {
+    **WIDE_SCHEMA,
+    "fields": [*WIDE_SCHEMA["fields"], {"name": "added", "type": "string", "default": ""}],
+}
+NESTED_SCHEMA = {
+    "type": "record",
+    "name": "Order",
+    "fields": [
+        {"name": "id", "type": "string"},
+        {
+            "name": "customer",
+            "type": {
+                "type": "record",
+                "name": "Customer",
+                "fields": [{"name": "name", "type": "string"}, {"name": "email", "type": ["null", "string"]}],
+            },
+        },
+        {
+            "name": "lines",
+            "type": {
+                "type": "array",
+                "items": {
+                    "type": "record",
+                    "name": "Line",
+                    "fields": [
+                        {"name": "sku", "type": "string"},
+                        {"name": "quantity", "type": "int"},
+                        {"name": "price", "type": "double"},
+                    ],
+                },
+            },
+        },
+        {"name": "tags", "type": {"type": "map", "values": "string"}},
+    ],
+}
+
+SMALL_RECORD = {"age": 42}
+WIDE_RECORD = {f"field_{idx}": (f"value-{idx}" if idx % 2 else idx) for idx in range(50)}
+NESTED_RECORD = {
+    "id": "order-1",
+    "customer": {"name": "Jane", "email": "jane@example.com"},
+    "lines": [{"sku": f"sku-{idx}", "quantity": idx, "price": idx * 1.5} for idx in range(10)],
+    "tags": {"channel": "web", "region": "eu"},
+}
+# a NESTED_RECORD of about 50 KiB, where copies of the payload show
+LARGE_RECORD = {
+    **NESTED_RECORD,
+    "lines": [{"sku": f"sku-{idx}", "quantity": idx, "price": idx * 1.5} for idx in range(1_000)],
+}
+
+
+class Customer(BaseModel):
+    name: str
+    email: Optional[str]
+
+
+class Line(BaseModel):
+    sku: str
+    quantity: int
+    price: float
+
+
+class Order(BaseModel):
+    id: str
+    customer: Customer
+    lines: List[Line]
+    tags: Dict[str, str]
+
+
+SmallModel = create_model("Small", age=(int, ...))
+WideModel = create_model("Wide", **{f"field_{idx}": (Optional[Union[str, int]], None) for idx in range(50)})
+
+PAYLOADS = {
+    "small": (SMALL_SCHEMA, SMALL_RECORD, SmallModel),
+    "wide": (WIDE_SCHEMA, WIDE_RECORD, WideModel),
+    "nested": (NESTED_SCHEMA, NESTED_RECORD, Order),
+}
+
+
+def avro_schema(schema: dict) -> Schema:
+    return Schema(orjson.dumps(schema).decode(), "AVRO")
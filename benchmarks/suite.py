@@ -0,0 +1,388 @@
+"""
+Throughput and memory of the serializers and sinks, with offline fixtures only (see `fixtures.py`).
+
+Every case processes a batch of messages per run and reports:
+- msgs/s, the best of several timed repeats,
+- blocks/msg and bytes/msg, the allocations still alive after a run while its results are kept,
+  as traced by tracemalloc (CPython doesn't count transient allocations),
+- peak KiB, the traced memory peak of a run.
+
+Results can be saved with `--json` and compared with a previous run with `--compare`,
+e.g. to check a change against the commit before it.
+
+Usage:
+    python benchmarks/suite.py [--filter avro] [--number 5] [--json results.json] [--compare baseline.json]
+"""
+
+import argparse
+import gc
+import json
+import platform
+import subprocess
+import tempfile
+import timeit
+import tracemalloc
+from io import BytesIO
+from itertools import cycle, islice
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+import orjson
+from fastavro import parse_schema, schemaless_reader
+from quixstreams.models import Deserializer, SerializationContext, Serializer
+
+from fixtures import (
+    EVOLVED_WIDE_SCHEMA,
+    LARGE_RECORD,
+    PAYLOADS,
+    WIDE_RECORD,
+    WIDE_SCHEMA,
+    InMemorySchemaRegistryClient,
+    Order,
+    RecordingFirestoreClient,
+    avro_schema,
+)
+from quixstreams_extensions.serializers.composer import composed
+from quixstreams_extensions.serializers.offload import offloaded
+from quixstreams_extensions.serializers.compositions import avro, confluent, pydantic
+from quixstreams_extensions.serializers.compositions import json as json_steps
+from quixstreams_extensions.sinks.google_cloud import GoogleFirestoreFlatSink, GoogleFirestoreNestedSink
+from quixstreams_extensions.sinks.kv import KeyValueFlatSink, KeyValueNestedSink
+from quixstreams_extensions.sinks.local import SQLiteBackend
+
+MESSAGES = 1_000
+
+
+class Case(NamedTuple):
+    run: Callable[[], Any]
+    messages: int = MESSAGES
+
+
+class Result(NamedTuple):
+    msgs_per_s: float
+    blocks_per_msg: float
+    bytes_per_msg: float
+    peak_kib: float
+
+
+CASES: Dict[str, Callable[[], Case]] = {}
+
+
+def case(name: str):
+    """
+    Registers a case factory, called once to set up the case before it is measured.
+    """
+
+    def decorator(factory: Callable[[], Case]) -> Callable[[], Case]:
+        CASES[name] = factory
+        return factory
+
+    return decorator
+
+
+def per_message(fn: Callable[[Any, SerializationContext], Any], values: List[Any]) -> Case:
+    ctx = SerializationContext("topic")
+    return Case(lambda: [fn(value, ctx) for value in values], len(values))
+
+
+def identity(value):
+    return value
+
+
+def identity_with_ctx(value, ctx):
+    return value
+
+
+for length in (1, 3, 6):
+
+    @case(f"composer/{length}-steps")
+    def composer_chain(length=length) -> Case:
+        chain = [identity if idx % 2 else identity_with_ctx for idx in range(length)]
+        return per_message(composed(Serializer, *chain), list(range(MESSAGES)))
+
+
+for size, (schema, record, model) in PAYLOADS.items():
+
+    @case(f"confluent/encode/{size}")
+    def confluent_encode(schema=schema, record=record) -> Case:
+        return per_message(confluent.to_avro(InMemorySchemaRegistryClient(), avro_schema(schema)), [record] * MESSAGES)
+
+    @case(f"confluent/decode/{size}")
+    def confluent_decode(schema=schema, record=record) -> Case:
+        client = InMemorySchemaRegistryClient()
+        payload = confluent.to_avro(client, avro_schema(schema))(record, SerializationContext("topic"))
+        return per_message(confluent.to_dict(client), [payload] * MESSAGES)
+
+    @case(f"avro/encode/{size}")
+    def avro_encode(schema=schema, record=record) -> Case:
+        return per_message(avro.to_avro(InMemorySchemaRegistryClient(), avro_schema(schema)), [record] * MESSAGES)
+
+    @case(f"avro/decode/{size}")
+    def avro_decode(schema=schema, record=record) -> Case:
+        client = InMemorySchemaRegistryClient()
+        payload = avro.to_avro(client, avro_schema(schema))(record, SerializationContext("topic"))
+        return per_message(avro.to_dict(client), [payload] * MESSAGES)
+
+    @case(f"avro/to_instance_of/{size}")
+    def avro_to_instance_of(schema=schema, record=record, model=model) -> Case:
+        client = InMemorySchemaRegistryClient()
+        payload = avro.to_avro(client, avro_schema(schema))(record, SerializationContext("topic"))
+        return per_message(avro.to_instance_of(client, model), [payload] * MESSAGES)
+
+    @case(f"pydantic/to_instance_of/{size}")
+    def pydantic_to_instance_of(record=record, model=model) -> Case:
+        return per_message(pydantic.to_instance_of(model), [record] * MESSAGES)
+
+    @case(f"pydantic/to_instance_of/{size}/batch")
+    def pydantic_to_instance_of_batch(record=record, model=model) -> Case:
+        serializer = composed(Deserializer, pydantic.to_instance_of(model))
+        values = [record] * MESSAGES
+        return Case(lambda: serializer.call_many(values))
+
+    @case(f"pydantic/from_json/{size}")
+    def pydantic_from_json(record=record, model=model) -> Case:
+        return per_message(
+            composed(Deserializer, orjson.loads, pydantic.to_instance_of(model)), [orjson.dumps(record)] * MESSAGES
+        )
+
+    @case(f"pydantic/to_dict/{size}")
+    def pydantic_to_dict(record=record, model=model) -> Case:
+        return per_message(pydantic.to_dict, [model(**record)] * MESSAGES)
+
+
+@case("avro/evolved/wide")
+def avro_evolved() -> Case:
+    client = InMemorySchemaRegistryClient()
+    payload = avro.to_avro(client, avro_schema(WIDE_SCHEMA))(WIDE_RECORD, SerializationContext("topic"))
+    return per_message(avro.to_dict(client, EVOLVED_WIDE_SCHEMA), [payload] * MESSAGES)
+
+
+@case("avro/evolved/wide/fastavro-resolved")
+def avro_evolved_fastavro() -> Case:
+    writer, reader = parse_schema(WIDE_SCHEMA), parse_schema(EVOLVED_WIDE_SCHEMA)
+    payload = avro.to_avro(InMemorySchemaRegistryClient(), avro_schema(WIDE_SCHEMA))(
+        WIDE_RECORD, SerializationContext("topic")
+    )
+    return per_message(lambda data, ctx: schemaless_reader(BytesIO(data[5:]), writer, reader), [payload] * MESSAGES)
+
+
+@case("json/loads/large/memoryview")
+def json_loads_memoryview() -> Case:
+    # e.g. the value within a larger buffer
+    buffer = memoryview(b" " + orjson.dumps(LARGE_RECORD) + b" ")
+    return per_message(json_steps.loads, [buffer[1:-1]] * (MESSAGES // 10))
+
+
+@case("json/loads/large/copied")
+def json_loads_copied() -> Case:
+    buffer = memoryview(b" " + orjson.dumps(LARGE_RECORD) + b" ")
+    return per_message(lambda value, ctx: orjson.loads(bytes(value)), [buffer[1:-1]] * (MESSAGES // 10))
+
+
+@case("pydantic/to_json/large")
+def pydantic_to_json() -> Case:
+    return per_message(pydantic.to_json, [Order(**LARGE_RECORD)] * (MESSAGES // 10))
+
+
+@case("pydantic/to_json/large/encoded")
+def pydantic_to_json_encoded() -> Case:
+    # the former implementation, making a str first
+    return per_message(
+        lambda obj, ctx: obj.model_dump_json(by_alias=True).encode(), [Order(**LARGE_RECORD)] * (MESSAGES // 10)
+    )
+
+
+def make_order_deserializer():
+    return composed(Deserializer, json_steps.loads, pydantic.to_instance_of(Order))
+
+
+OFFLOADED = MESSAGES * 10
+
+
+@case("offload/nested/inline")
+def offload_inline() -> Case:
+    deserializer = make_order_deserializer()
+    payloads = [orjson.dumps(PAYLOADS["nested"][1])] * OFFLOADED
+    return Case(lambda: deserializer.call_many(payloads), OFFLOADED)
+
+
+for shared_memory in (True, False):
+
+    @case(f"offload/nested/{'shared' if shared_memory else 'pickled'}")
+    def offload(shared_memory=shared_memory) -> Case:
+        # the workers are started by the warm-up run, their overhead is in `deserializer.stats`
+        deserializer = offloaded(make_order_deserializer, workers=4, shared_memory=shared_memory)
+        payloads = [orjson.dumps(PAYLOADS["nested"][1])] * OFFLOADED
+        return Case(lambda: deserializer.call_many(payloads), OFFLOADED)
+
+
+def fill(sink, values: List[Any], keys: List[Any]):
+    for offset, (key, value) in enumerate(zip(keys, values)):
+        sink.add(value, key, 0, [], "topic", 0, offset)
+    sink.flush("topic", 0)
+
+
+@case("sinks/flat")
+def flat_sink() -> Case:
+    sink = GoogleFirestoreFlatSink("collection", client=RecordingFirestoreClient())
+    keys = [f"key-{idx}" for idx in range(MESSAGES)]
+    values = [{"idx": idx} for idx in range(MESSAGES)]
+    return Case(lambda: fill(sink, values, keys))
+
+
+@case("sinks/flat/deduplicate")
+def flat_sink_deduplicate() -> Case:
+    sink = GoogleFirestoreFlatSink("collection", client=RecordingFirestoreClient(), deduplicate=True)
+    # ten updates per key
+    keys = list(islice(cycle(f"key-{idx}" for idx in range(MESSAGES // 10)), MESSAGES))
+    values = [{"idx": idx} for idx in range(MESSAGES)]
+    return Case(lambda: fill(sink, values, keys))
+
+
+def user_key(key: dict) -> str:
+    return f"user-{key['id']}"
+
+
+for cache_size in (0, MESSAGES):
+
+    @case("sinks/flat/keys/cached" if cache_size else "sinks/flat/keys")
+    def flat_sink_keys(cache_size=cache_size) -> Case:
+        sink = GoogleFirestoreFlatSink(
+            "collection",
+            client=RecordingFirestoreClient(),
+            key_serializer=composed(Serializer, json_steps.loads, user_key),
+            key_cache_size=cache_size,
+        )
+        # JSON keys of a compacted topic, ten updates per key
+        keys = list(islice(cycle(orjson.dumps({"id": idx}) for idx in range(MESSAGES // 10)), MESSAGES))
+        values = [{"idx": idx} for idx in range(MESSAGES)]
+        return Case(lambda: fill(sink, values, keys))
+
+
+@case("sinks/flat/pydantic")
+def flat_sink_pydantic() -> Case:
+    _, record, model = PAYLOADS["nested"]
+    sink = GoogleFirestoreFlatSink(
+        "collection", client=RecordingFirestoreClient(), value_serializer=composed(Serializer, pydantic.to_dict)
+    )
+    keys = [f"key-{idx}" for idx in range(MESSAGES)]
+    values = [model(**record)] * MESSAGES
+    return Case(lambda: fill(sink, values, keys))
+
+
+@case("sinks/nested")
+def nested_sink() -> Case:
+    state_dir = tempfile.mkdtemp(prefix="benchmark-")
+    sink = GoogleFirestoreNestedSink(
+        [
+            ("stores", lambda item: item.key["store"]),
+            ("days", lambda item: item.key["day"]),
+            ("users", lambda item: item.key["user"]),
+        ],
+        client=RecordingFirestoreClient(),
+        state_dir=state_dir,
+    )
+    keys = [{"store": f"store-{idx % 10}", "day": "2024-07-13", "user": f"user-{idx}"} for idx in range(MESSAGES)]
+    values = [{"idx": idx} for idx in range(MESSAGES)]
+    return Case(lambda: fill(sink, values, keys))
+
+
+@case("sinks/flat/sqlite")
+def flat_sink_sqlite() -> Case:
+    # the sink's work plus actually storing the documents, on disk
+    sink = KeyValueFlatSink("collection", SQLiteBackend(f"{tempfile.mkdtemp(prefix='benchmark-')}/documents.db"))
+    keys = [f"key-{idx}" for idx in range(MESSAGES)]
+    values = [{"idx": idx} for idx in range(MESSAGES)]
+    return Case(lambda: fill(sink, values, keys))
+
+
+@case("sinks/nested/sqlite")
+def nested_sink_sqlite() -> Case:
+    state_dir = tempfile.mkdtemp(prefix="benchmark-")
+    sink = KeyValueNestedSink(
+        [
+            ("stores", lambda item: item.key["store"]),
+            ("days", lambda item: item.key["day"]),
+            ("users", lambda item: item.key["user"]),
+        ],
+        SQLiteBackend(f"{state_dir}/documents.db"),
+        state_dir=state_dir,
+    )
+    keys = [{"store": f"store-{idx % 10}", "day": "2024-07-13", "user": f"user-{idx}"} for idx in range(MESSAGES)]
+    values = [{"idx": idx} for idx in range(MESSAGES)]
+    return Case(lambda: fill(sink, values, keys))
+
+
+def measure(factory: Callable[[], Case], number: int, repeat: int) -> Result:
+    bench = factory()
+    bench.run()  # warm up caches, e.g. parsed schemas and created nodes
+
+    best = min(timeit.repeat(bench.run, number=number, repeat=repeat))
+    msgs_per_s = number * bench.messages / best
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        result = bench.run()
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+        del result
+    finally:
+        tracemalloc.stop()
+    differences = after.compare_to(before, "filename")
+    blocks = sum(stat.count_diff for stat in differences)
+    size = sum(stat.size_diff for stat in differences)
+    return Result(msgs_per_s, blocks / bench.messages, size / bench.messages, (peak - baseline) / 1024)
+
+
+def commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", default="", help="run the cases whose name contains this text only")
+    parser.add_argument("--number", type=int, default=5, help="runs per timed repeat")
+    parser.add_argument("--repeat", type=int, default=5, help="timed repeats, the best one is reported")
+    parser.add_argument("--json", help="save the results to this file")
+    parser.add_argument("--compare", help="compare msgs/s with results saved by --json")
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)["results"]
+
+    results = {}
+    header = f"{'case':<36} | {'msgs/s':>12} | {'blocks/msg':>10} | {'bytes/msg':>9} | {'peak KiB':>8}"
+    print(header + (f" | {'vs ' + baseline_name(args.compare):>12}" if baseline else ""))
+    for name, factory in CASES.items():
+        if args.filter not in name:
+            continue
+        result = measure(factory, args.number, args.repeat)
+        results[name] = result._asdict()
+        line = (
+            f"{name:<36} | {result.msgs_per_s:>12,.0f} | {result.blocks_per_msg:>10.1f} | "
+            f"{result.bytes_per_msg:>9.0f} | {result.peak_kib:>8.0f}"
+        )
+        if name in baseline:
+            line += f" | {result.msgs_per_s / baseline[name]['msgs_per_s']:>11.2f}x"
+        print(line)
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"commit": commit(), "python": platform.python_version(), "results": results}, file, indent=2)
+
+
+def baseline_name(path: str) -> str:
+    with open(path) as file:
+        return json.load(file)["commit"]
+
+
+if __name__ == "__main__":
+    main()
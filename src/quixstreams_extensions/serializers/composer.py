@@ -1,11 +1,14 @@
-from functools import reduce
-from inspect import signature
-from typing import Callable, Union, Optional, Any, TypeVar, overload, Type
+import logging
+from inspect import Parameter, signature
+from typing import Callable, Union, Optional, Any, TypeVar, overload, Type, NamedTuple, Sequence
 
 from quixstreams.models import SerializationContext, Deserializer, Serializer
 
+from quixstreams_extensions.serializers.profiling import Profile, maybe_profile
+
 Composable = Union[Callable[[Any], Any], Callable[[Any, SerializationContext], Any]]
 Composed = Callable[[Any, SerializationContext], Any]
+BatchComposable = Callable[[list[Any], Sequence[Optional[SerializationContext]]], list[Any]]
 
 T1 = TypeVar("T1")
 T2 = TypeVar("T2")
@@ -18,18 +21,299 @@ S = TypeVar("S", bound=Serializer)
 D = TypeVar("D", bound=Deserializer)
 ST = Union[S, D]
 
+_POSITIONAL = (Parameter.POSITIONAL_ONLY, Parameter.POSITIONAL_OR_KEYWORD)
+_CONTEXT_NAMES = ("ctx", "context")
+_BATCH_ATTRIBUTE = "__composer_batch__"
+_ORIGIN_ATTRIBUTE = "__composer_origin__"
+_HEADERS_ATTRIBUTE = "__composer_headers__"
+
+F = TypeVar("F", bound=Callable)
+Fusion = Callable[[Composable, Composable], Optional[Composable]]
+
+logger = logging.getLogger(__name__)
+
+
+class Origin(NamedTuple):
+    """
+    The factory call which made a composable, e.g. `Origin("pydantic.to_instance_of", (User,), {})`.
+    """
+
+    name: str
+    args: tuple
+    kwargs: dict
+
+
+class Step(NamedTuple):
+    """
+    A composed callable with its calling convention resolved once, at composition time.
+    `replaces` lists the callables a fused step has been substituted for.
+    """
+
+    fn: Composable
+    takes_ctx: bool
+    many: Optional[BatchComposable] = None
+    replaces: tuple = ()
+
+
+_fusions: dict[tuple[Any, Any], Fusion] = {}
+
+
+def with_batch(many: BatchComposable) -> Callable[[F], F]:
+    """
+    Attaches a batch implementation to a composable function.
+    `many(values, ctxs)` must return a list of results in the same order as `values`,
+    it is used by `call_many` instead of calling the function once per value.
+
+    **Example**:
+
+    `with_batch(lambda values, ctxs: adapter.validate_python(values))(validate)`
+    """
+
+    def decorator(fn: F) -> F:
+        setattr(fn, _BATCH_ATTRIBUTE, many)
+        return fn
+
+    return decorator
+
+
+def with_headers(headers: dict) -> Callable[[F], F]:
+    """
+    Attaches headers to a composable function, which a composed `Serializer` asks the producer to set
+    on every message it serializes, see `Serializer.extra_headers`.
+
+    **Example**:
+
+    `with_headers({"content-encoding": "zstd"})(compress)`
+    """
+
+    def decorator(fn: F) -> F:
+        setattr(fn, _HEADERS_ATTRIBUTE, headers)
+        return fn
+
+    return decorator
+
+
+def origin(name: str, *args: Any, **kwargs: Any) -> Callable[[F], F]:
+    """
+    Records which factory call made a composable, so fusion rules can recognise it and `explain` can describe it.
+
+    **Example**:
+
+    `origin("pydantic.to_instance_of", model_class)(validate)`
+    """
+
+    def decorator(fn: F) -> F:
+        setattr(fn, _ORIGIN_ATTRIBUTE, Origin(name, args, kwargs))
+        return fn
+
+    return decorator
+
+
+def origin_of(fn: Composable) -> Optional[Origin]:
+    return getattr(fn, _ORIGIN_ATTRIBUTE, None)
+
+
+def _kind(fn: Composable) -> Any:
+    """
+    The key fusion rules are registered by: an origin name for recorded factories, the callable itself otherwise.
+    """
+    fn_origin = origin_of(fn)
+    return fn_origin.name if fn_origin is not None else fn
+
+
+def fusion(first: Any, second: Any) -> Callable[[Fusion], Fusion]:
+    """
+    Registers a rule replacing two adjacent steps by a single faster one.
+    Steps are matched by their origin name (see `origin`) or by identity, e.g. `orjson.loads`.
+    The rule is called with both steps and returns the fused step, or `None` if it doesn't apply.
+
+    **Example**:
+
+    `fusion("pydantic.to_dict", orjson.dumps)(lambda to_dict, dumps: to_json)`
+    """
+
+    def decorator(rule: Fusion) -> Fusion:
+        _fusions[(first, second)] = rule
+        return rule
+
+    return decorator
+
+
+def optimize(functions: Sequence[Composable]) -> list[tuple[Composable, tuple]]:
+    """
+    Applies registered fusion rules to adjacent steps, repeatedly, so fused steps may be fused again.
+    :return: A list of `(step, replaced steps)`.
+    """
+    result: list[tuple[Composable, tuple]] = []
+    for fn in functions:
+        result.append((fn, ()))
+        while len(result) > 1:
+            (first, first_replaces), (second, second_replaces) = result[-2:]
+            rule = _fusions.get((_kind(first), _kind(second)))
+            fused = rule(first, second) if rule is not None else None
+            if fused is None:
+                break
+            result[-2:] = [(fused, (first_replaces or (first,)) + (second_replaces or (second,)))]
+    return result
+
+
+def describe(fn: Composable) -> str:
+    """
+    A human readable name of a composable, e.g. `pydantic.to_instance_of(User)` or `orjson.loads`.
+    """
+    fn_origin = origin_of(fn)
+    if fn_origin is None:
+        return f"{getattr(fn, '__module__', None) or type(fn).__module__}.{getattr(fn, '__qualname__', repr(fn))}"
+
+    def describe_arg(arg: Any) -> str:
+        if arg is None or isinstance(arg, (bool, int, float)):
+            return repr(arg)
+        return getattr(arg, "__name__", None) or type(arg).__name__
+
+    args = [describe_arg(arg) for arg in fn_origin.args]
+    args += [f"{key}={describe_arg(value)}" for key, value in fn_origin.kwargs.items()]
+    return f"{fn_origin.name}({', '.join(args)})" if args else fn_origin.name
+
+
+def explain(steps: Sequence[Step]) -> str:
+    """
+    Describes a resolved chain, one step per line, including which steps have been fused.
+    """
+    lines = []
+    for idx, step in enumerate(steps, start=1):
+        line = f"{idx}. {describe(step.fn)}{'(value, ctx)' if step.takes_ctx else '(value)'}"
+        if step.replaces:
+            line += f" <- fused {' + '.join(describe(fn) for fn in step.replaces)}"
+        lines.append(line)
+    return "\n".join(lines) or "(identity)"
+
+
+def _takes_ctx(fn: Composable) -> bool:
+    """
+    Decides whether `fn` should be called as `fn(value, ctx)` or as `fn(value)`.
+
+    Two positional parameters always mean `(value, ctx)`, regardless of defaults (e.g. `pydantic.to_dict`).
+    With more positional parameters, the second one is treated as a context only if it is required,
+    named `ctx`/`context` or annotated with `SerializationContext`, so `orjson.dumps(obj, default=None, option=None)`
+    is still called with a single argument. Builtins without an introspectable signature (`str`, `bytes`, ...)
+    are called with a single argument.
+    """
+    try:
+        sig = signature(fn)
+    except (ValueError, TypeError):
+        return False
+
+    positional = [p for p in sig.parameters.values() if p.kind in _POSITIONAL]
+    required = [p for p in positional if p.default is Parameter.empty]
+    if len(required) > 2 or any(
+        p.kind is Parameter.KEYWORD_ONLY and p.default is Parameter.empty for p in sig.parameters.values()
+    ):
+        raise ValueError(f"Function {fn} has an unexpected number of parameters")
+    if not positional:
+        if any(p.kind is Parameter.VAR_POSITIONAL for p in sig.parameters.values()):
+            return False
+        raise ValueError(f"Function {fn} has an unexpected number of parameters")
+    if len(positional) == 1:
+        return False
+    second = positional[1]
+    return (
+        len(positional) == 2
+        or second.default is Parameter.empty
+        or second.name in _CONTEXT_NAMES
+        or second.annotation in (SerializationContext, "SerializationContext")
+    )
+
+
+def resolve(functions: Sequence[Composable], optimized: bool = True) -> tuple[Step, ...]:
+    """
+    Resolves the calling convention of every function in a chain, applying fusion rules first if `optimized`.
+    :raises: ValueError: If a function can't be called with a value and an optional context.
+    """
+    planned = optimize(functions) if optimized else [(fn, ()) for fn in functions]
+    return tuple(Step(fn, _takes_ctx(fn), getattr(fn, _BATCH_ATTRIBUTE, None), replaces) for fn, replaces in planned)
+
+
+def compile_steps(steps: Sequence[Step]) -> Composed:
+    """
+    Generates a flat `(value, ctx=None)` function for the given steps,
+    e.g. `return f1(f0(value), ctx)`, so that nothing but the steps themselves runs per message.
+    """
+    names = [f"f{idx}" for idx in range(len(steps))]
+    expression = "value"
+    for name, step in zip(names, steps):
+        expression = f"{name}({expression}, ctx)" if step.takes_ctx else f"{name}({expression})"
+    source = (
+        f"def __make_call__({', '.join(names)}):\n"
+        f"    def __call__(value, ctx=None):\n"
+        f"        return {expression}\n"
+        f"    return __call__\n"
+    )
+    namespace: dict[str, Any] = {}
+    exec(source, namespace)  # noqa: S102 - the source is built from identifiers only
+    return namespace["__make_call__"](*(step.fn for step in steps))
+
+
+def compile_batch(steps: Sequence[Step]) -> BatchComposable:
+    """
+    Generates a `(values, ctxs)` function for the given steps.
+    Steps with a batch implementation are applied to the whole list at once,
+    runs of steps without it are compiled together and applied per value.
+    """
+    segments: list[BatchComposable] = []
+    run: list[Step] = []
+
+    def flush_run():
+        if run:
+            call = compile_steps(run)
+            segments.append(lambda values, ctxs: list(map(call, values, ctxs)))
+            run.clear()
+
+    for step in steps:
+        if step.many is None:
+            run.append(step)
+        else:
+            flush_run()
+            segments.append(step.many)
+    flush_run()
+
+    def call_many(values: list[Any], ctxs: Sequence[Optional[SerializationContext]]) -> list[Any]:
+        for segment in segments:
+            values = segment(values, ctxs)
+        return values
+
+    return call_many
+
+
+def call_many(
+    serializer: Composed, values: Sequence[Any], ctxs: Optional[Sequence[Optional[SerializationContext]]] = None
+) -> list[Any]:
+    """
+    Applies a serializer to a batch of values.
+    Uses `serializer.call_many` when the serializer is composed, otherwise calls it once per value.
+    :param serializer: Any serializer, either composed or not.
+    :param values: Values to serialize.
+    :param ctxs: A context per value, defaults to no context at all.
+    """
+    if ctxs is None:
+        ctxs = [None] * len(values)
+    many = getattr(serializer, "call_many", None)
+    if many is not None:
+        return many(values, ctxs)
+    return list(map(serializer, values, ctxs))
+
 
 @overload
-def composed(serializer_type: Type[ST]) -> ST:
-    ...
+def composed(serializer_type: Type[ST], *, optimized: bool = ..., profile: Union[None, bool, float] = ...) -> ST: ...
 
 
 @overload
 def composed(
     serializer_type: Type[ST],
     fn1: Union[Callable[[T1], T2], Callable[[T1, SerializationContext], T2]],
-) -> ST:
-    ...
+    *,
+    optimized: bool = ...,
+    profile: Union[None, bool, float] = ...,
+) -> ST: ...
 
 
 @overload
@@ -37,8 +321,10 @@ def composed(
     serializer_type: Type[ST],
     fn1: Union[Callable[[T1], T2], Callable[[T1, SerializationContext], T2]],
     fn2: Union[Callable[[T2], T3], Callable[[T2, SerializationContext], T3]],
-) -> ST:
-    ...
+    *,
+    optimized: bool = ...,
+    profile: Union[None, bool, float] = ...,
+) -> ST: ...
 
 
 @overload
@@ -47,8 +333,10 @@ def composed(
     fn1: Union[Callable[[T1], T2], Callable[[T1, SerializationContext], T2]],
     fn2: Union[Callable[[T2], T3], Callable[[T2, SerializationContext], T3]],
     fn3: Union[Callable[[T3], T4], Callable[[T3, SerializationContext], T4]],
-) -> ST:
-    ...
+    *,
+    optimized: bool = ...,
+    profile: Union[None, bool, float] = ...,
+) -> ST: ...
 
 
 @overload
@@ -58,8 +346,10 @@ def composed(
     fn2: Union[Callable[[T2], T3], Callable[[T2, SerializationContext], T3]],
     fn3: Union[Callable[[T3], T4], Callable[[T3, SerializationContext], T4]],
     fn4: Union[Callable[[T4], T5], Callable[[T4, SerializationContext], T5]],
-) -> ST:
-    ...
+    *,
+    optimized: bool = ...,
+    profile: Union[None, bool, float] = ...,
+) -> ST: ...
 
 
 @overload
@@ -70,8 +360,10 @@ def composed(
     fn3: Union[Callable[[T3], T4], Callable[[T3, SerializationContext], T4]],
     fn4: Union[Callable[[T4], T5], Callable[[T4, SerializationContext], T5]],
     fn5: Union[Callable[[T5], T6], Callable[[T5, SerializationContext], T6]],
-) -> ST:
-    ...
+    *,
+    optimized: bool = ...,
+    profile: Union[None, bool, float] = ...,
+) -> ST: ...
 
 
 @overload
@@ -80,33 +372,90 @@ def composed(
     fn1: Union[Callable[[T1], Any], Callable[[T1, SerializationContext], Any]],
     *,
     last: Union[Callable[[Any], T2], Callable[[Any, SerializationContext], T2]],
-) -> Union[Callable[[T1], T2], Callable[[T1, SerializationContext], T2]]:
-    ...
+    optimized: bool = ...,
+    profile: Union[None, bool, float] = ...,
+) -> Union[Callable[[T1], T2], Callable[[T1, SerializationContext], T2]]: ...
 
 
-def composed(serializer_type: Type[ST], *functions: Composable) -> ST:
+def composed(
+    serializer_type: Type[ST],
+    *functions: Composable,
+    optimized: bool = True,
+    profile: Union[None, bool, float] = None,
+) -> ST:
     """
     Compose multiple functions into a composed Serializer. Provides IO type checks across the chain.
     :param serializer_type: Should be either `Serializer` or `Deserializer` type.
     :param functions: A series of composed callables which will be called sequentially to achieve a final result.
+    :param optimized: Replace known adjacent steps by faster fused equivalents, see `explain()` for the result.
+    :param profile: Time every step, `True` for every call or a sample rate, e.g. `0.01` for one call in a hundred.
+        Reads `QUIXSTREAMS_EXTENSIONS_PROFILE` when omitted. The statistics are available as `serializer.profile`.
+    :raises: ValueError: If a function can't be called with a value and an optional context.
 
     **Example**:
 
     `composed(Deserializer, orjson.loads, pydantic.to_instance_of(Model))` --
     Converts bytes into dict and then into pydantic object.
     """
+    resolved = resolve(functions, optimized)
+    call = compile_steps(resolved)
+    batch = compile_batch(resolved)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Composed %s:\n%s", serializer_type.__name__, explain(resolved))
+    stats = maybe_profile(
+        [f"{idx}. {describe(step.fn)}" for idx, step in enumerate(resolved, start=1)],
+        profile,
+    )
+    if stats is not None:
+        timed = [
+            step._replace(fn=stats.timed(idx, step.fn), many=step.many and stats.timed_many(idx, step.many))
+            for idx, step in enumerate(resolved)
+        ]
+        call = stats.sampled(call, compile_steps(timed))
+        batch = stats.sampled(batch, compile_batch(timed))
+
+    headers = {}
+    for step in resolved:
+        headers.update(getattr(step.fn, _HEADERS_ATTRIBUTE, {}))
 
     class ComposedSerializer(serializer_type):
-        def __call__(self, value: Any, ctx: Optional[SerializationContext] = None) -> Any:
-            def apply(acc: T1, f: Composable) -> T2:
-                sig = signature(f)
-                if len(sig.parameters) == 1:
-                    return f(acc)
-                elif len(sig.parameters) == 2:
-                    return f(acc, ctx)
-                else:
-                    raise ValueError(f"Function {f} has an unexpected number of parameters")
-
-            return reduce(apply, functions, value)
+        __call__ = staticmethod(call)
+
+        @property
+        def extra_headers(self) -> dict:
+            """
+            Headers of the steps, see `with_headers`, set by the producer on every message serialized.
+            """
+            return headers
+
+        def call_many(
+            self, values: Sequence[Any], ctxs: Optional[Sequence[Optional[SerializationContext]]] = None
+        ) -> list[Any]:
+            """
+            Applies the chain to a batch of values, using batch implementations of steps where available.
+            :param values: Values to serialize.
+            :param ctxs: A context per value, defaults to no context at all.
+            :return: A list of results in the same order as `values`.
+            """
+            if ctxs is None:
+                ctxs = [None] * len(values)
+            return batch(list(values), ctxs)
+
+        @property
+        def steps(self) -> tuple[Step, ...]:
+            return resolved
+
+        @property
+        def profile(self) -> Optional[Profile]:
+            """
+            Per-step statistics, if profiling is enabled.
+            """
+            return stats
+
+        def explain(self) -> str:
+            """
+            Describes the chain as it is executed, after fusion.
+            """
+            return explain(resolved)
 
     return ComposedSerializer()
@@ -0,0 +1,782 @@
+"""
+Drop-in replacements for `confluent.to_dict` and `confluent.to_avro` talking to fastavro directly:
+schemas are parsed once per schema id, the framing is handled in place
+and no confluent `SerializationContext` is allocated per message.
+`to_instance_of` and `from_instance_of` additionally fuse the conversion from/to Pydantic models.
+
+With a reader schema, messages of every writer schema version are decoded into the same shape.
+Instead of letting fastavro resolve each message against the reader schema, a projection from the writer shape to the
+reader one is compiled once per writer schema id, so that decoding costs the same whatever the writer version.
+"""
+
+from collections import Counter
+from io import BytesIO
+from struct import Struct
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Literal,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    get_args,
+    get_origin,
+)
+from weakref import WeakKeyDictionary
+
+import orjson
+from confluent_kafka.schema_registry import Schema, SchemaRegistryClient, topic_subject_name_strategy
+from confluent_kafka.serialization import MessageField, SerializationError
+from confluent_kafka.serialization import SerializationContext as ConfluentSerializationContext
+from fastavro import parse_schema, schemaless_reader, schemaless_writer
+from quixstreams.models import SerializationContext
+
+from quixstreams_extensions.serializers.composer import fusion, origin, origin_of
+
+try:
+    from pydantic import BaseModel
+except ImportError:  # pydantic is an optional extra, needed by `to_instance_of` and `from_instance_of` only
+    BaseModel = None
+
+try:
+    from types import UnionType as _UnionType
+except ImportError:  # Python < 3.10
+    _UnionType = None
+
+M = TypeVar("M", bound="BaseModel")
+
+_object_setattr = object.__setattr__
+
+_MAGIC_BYTE = 0
+_HEADER = Struct(">bI")
+
+_DEFAULT_CONF = {
+    "auto.register.schemas": True,
+    "normalize.schemas": False,
+    "use.latest.version": False,
+    "subject.name.strategy": topic_subject_name_strategy,
+}
+
+
+def _as_schema(schema: Union[dict, str, Schema]) -> Schema:
+    if isinstance(schema, Schema):
+        return schema
+    if isinstance(schema, dict):
+        return Schema(orjson.dumps(schema).decode("utf-8"), schema_type="AVRO")
+    schema = schema.strip()
+    if schema[0] not in "{[":
+        # canonical form primitive declarations, e.g. `"string"`
+        schema = '{"type":' + schema + "}"
+    return Schema(schema, schema_type="AVRO")
+
+
+class ReadPlan(NamedTuple):
+    """
+    How to decode messages written with a particular writer schema.
+    `reader` is `None` when fastavro has no schema resolution to do, `project` converts the decoded record
+    into the shape of the reader schema when the resolution has been compiled instead.
+    """
+
+    writer: Any
+    reader: Optional[Any]
+    project: Optional[Callable[[Any], Any]] = None
+
+    @property
+    def resolution(self) -> str:
+        """
+        `identical` if the writer schema is the reader one, `projected` if the resolution has been compiled,
+        `resolved` if it is left to fastavro.
+        """
+        if self.project is not None:
+            return "projected"
+        return "identical" if self.reader is None else "resolved"
+
+
+class WriterVersion(NamedTuple):
+    """
+    A writer schema decoded by a `Reader`, with the number of messages written with it.
+    """
+
+    schema_id: int
+    resolution: str
+    messages: int
+
+
+class SchemaCache:
+    """
+    A per schema id table of parsed fastavro schemas, shared by all compositions using the same registry client.
+    """
+
+    def __init__(self, schema_registry_client: SchemaRegistryClient):
+        self._client = schema_registry_client
+        self._parsed: Dict[int, Any] = {}
+        self._readers: Dict[Any, Reader] = {}
+
+    def _named_schemas(self, schema: Schema, named_schemas: Optional[dict] = None) -> dict:
+        named_schemas = {} if named_schemas is None else named_schemas
+        for ref in schema.references or ():
+            referenced = self._client.get_version(ref.subject, ref.version).schema
+            self._named_schemas(referenced, named_schemas)
+            parse_schema(orjson.loads(referenced.schema_str), named_schemas=named_schemas)
+        return named_schemas
+
+    def parse(self, schema: Union[dict, str, Schema]) -> Any:
+        """
+        Parses a schema, resolving its references via the registry.
+        """
+        schema = _as_schema(schema)
+        return parse_schema(orjson.loads(schema.schema_str), named_schemas=self._named_schemas(schema))
+
+    def get(self, schema_id: int) -> Any:
+        """
+        Returns a parsed writer schema by its id, fetching it from the registry on the first use.
+        """
+        parsed = self._parsed.get(schema_id)
+        if parsed is None:
+            parsed = self._parsed[schema_id] = self.parse(self._client.get_schema(schema_id))
+        return parsed
+
+    def reader(self, reader_schema: Optional[Union[dict, str, Schema]] = None) -> "Reader":
+        """
+        Returns the `Reader` of a reader schema, shared by all compositions decoding to the same schema.
+        :param reader_schema: The schema to decode to, the writer schemas themselves if omitted.
+        """
+        key = None
+        if reader_schema is not None:
+            schema = _as_schema(reader_schema)
+            references = tuple((ref.name, ref.subject, ref.version) for ref in schema.references or ())
+            key = orjson.dumps(orjson.loads(schema.schema_str), option=orjson.OPT_SORT_KEYS), references
+        reader = self._readers.get(key)
+        if reader is None:
+            reader = self._readers[key] = Reader(self, reader_schema)
+        return reader
+
+
+class Reader:
+    """
+    Decodes messages of any writer schema into a reader schema, with a `ReadPlan` per writer schema id
+    computed on its first message, and counts the messages of every writer schema.
+    """
+
+    def __init__(self, schemas: SchemaCache, reader_schema: Optional[Union[dict, str, Schema]] = None):
+        self._schemas = schemas
+        self.schema = schemas.parse(reader_schema) if reader_schema is not None else None
+        self._plans: Dict[int, ReadPlan] = {}
+        self._messages: Counter = Counter()
+
+    def plan(self, schema_id: int) -> ReadPlan:
+        """
+        Returns the read plan of a writer schema id, computing it on the first call.
+        """
+        plan = self._plans.get(schema_id)
+        if plan is None:
+            plan = self._plans[schema_id] = _read_plan(self._schemas, schema_id, self.schema)
+        return plan
+
+    @property
+    def writers(self) -> List[WriterVersion]:
+        """
+        The writer schemas decoded so far, in the order they have been met.
+        """
+        return [
+            WriterVersion(schema_id, plan.resolution, self._messages[schema_id])
+            for schema_id, plan in self._plans.items()
+        ]
+
+
+_caches: "WeakKeyDictionary[SchemaRegistryClient, SchemaCache]" = WeakKeyDictionary()
+
+
+def schema_cache(schema_registry_client: SchemaRegistryClient) -> SchemaCache:
+    """
+    Returns the `SchemaCache` shared by all compositions using the given registry client.
+    """
+    cache = _caches.get(schema_registry_client)
+    if cache is None:
+        cache = _caches[schema_registry_client] = SchemaCache(schema_registry_client)
+    return cache
+
+
+def _field_options(field: str) -> dict:
+    """
+    The origin keyword arguments of a step, the field is recorded only when it isn't the default one.
+    """
+    return {"field": field} if field != MessageField.VALUE else {}
+
+
+def _framing(
+    schema_registry_client: SchemaRegistryClient,
+    schema: Schema,
+    conf: Optional[dict],
+    field: str = MessageField.VALUE,
+) -> Callable[[str], bytes]:
+    """
+    Returns a function giving the framing header per topic, registering (or looking up) the schema once per topic,
+    under the subject of the key or value `field` as given by the subject name strategy.
+    Accepts the same `conf` as `confluent_kafka.schema_registry.avro.AvroSerializer`.
+    """
+    conf = {**_DEFAULT_CONF, **(conf or {})}
+    auto_register = conf.pop("auto.register.schemas")
+    normalize = conf.pop("normalize.schemas")
+    use_latest_version = conf.pop("use.latest.version")
+    subject_name_strategy = conf.pop("subject.name.strategy")
+    if conf:
+        raise ValueError(f"Unrecognized properties: {', '.join(conf)}")
+    if use_latest_version and auto_register:
+        raise ValueError("cannot enable both use.latest.version and auto.register.schemas")
+
+    schema_dict = orjson.loads(schema.schema_str)
+    record_name = None if isinstance(schema_dict, list) else schema_dict.get("name", schema_dict["type"])
+    headers: Dict[str, bytes] = {}
+
+    def header_for(topic: str) -> bytes:
+        header = headers.get(topic)
+        if header is not None:
+            return header
+        subject = subject_name_strategy(ConfluentSerializationContext(topic, field), record_name)
+        if use_latest_version:
+            schema_id = schema_registry_client.get_latest_version(subject).schema_id
+        elif auto_register:
+            schema_id = schema_registry_client.register_schema(subject, schema, normalize)
+        else:
+            schema_id = schema_registry_client.lookup_schema(subject, schema, normalize).schema_id
+        header = headers[topic] = _HEADER.pack(_MAGIC_BYTE, schema_id)
+        return header
+
+    return header_for
+
+
+def _write(header: bytes, parsed_schema: Any, record: Any) -> bytes:
+    fo = BytesIO()
+    fo.write(header)
+    schemaless_writer(fo, parsed_schema, record)
+    return fo.getvalue()
+
+
+def _schema_id(data: bytes) -> int:
+    if len(data) <= _HEADER.size:
+        raise SerializationError(
+            f"Expecting data framing of length 6 bytes or more but total data size is {len(data)} bytes. "
+            "This message was not produced with a Confluent Schema Registry serializer"
+        )
+    magic, schema_id = _HEADER.unpack_from(data)
+    if magic != _MAGIC_BYTE:
+        raise SerializationError(
+            f"Unexpected magic byte {magic}. This message was not produced with a Confluent Schema Registry serializer"
+        )
+    return schema_id
+
+
+def _read(data: bytes, plan: ReadPlan) -> Any:
+    payload = BytesIO(data)  # shares the buffer of `bytes` instead of copying it
+    payload.seek(_HEADER.size)
+    record = schemaless_reader(payload, plan.writer, plan.reader)
+    return record if plan.project is None else plan.project(record)
+
+
+def _read_plan(schemas: SchemaCache, schema_id: int, parsed_reader_schema: Optional[Any]) -> ReadPlan:
+    writer = schemas.get(schema_id)
+    if parsed_reader_schema is None or writer == parsed_reader_schema:
+        return ReadPlan(writer, None)
+    try:
+        project = _projection(
+            writer,
+            parsed_reader_schema,
+            writer.get("__named_schemas", {}) if isinstance(writer, dict) else {},
+            parsed_reader_schema.get("__named_schemas", {}) if isinstance(parsed_reader_schema, dict) else {},
+            frozenset(),
+        )
+    except _Unsupported:
+        return ReadPlan(writer, parsed_reader_schema)
+    return ReadPlan(writer, None, project)
+
+
+class _Unsupported(Exception):
+    """
+    A difference between a writer and a reader schema which isn't compiled, left to fastavro's resolution.
+    """
+
+
+# promotions allowed by the Avro specification, as fastavro applies them
+_PROMOTIONS: Dict[Tuple[str, str], Optional[Callable[[Any], Any]]] = {
+    ("int", "long"): None,
+    ("int", "float"): float,
+    ("int", "double"): float,
+    ("long", "float"): float,
+    ("long", "double"): float,
+    ("float", "double"): None,
+    ("string", "bytes"): str.encode,
+    ("bytes", "string"): bytes.decode,
+}
+
+
+def _named(avro_type: Any, named_schemas: dict) -> Any:
+    if isinstance(avro_type, str) and avro_type not in _PRIMITIVES:
+        if avro_type not in named_schemas:
+            raise _Unsupported(avro_type)
+        return named_schemas[avro_type]
+    if isinstance(avro_type, dict) and avro_type["type"] in _PRIMITIVES and "logicalType" not in avro_type:
+        return avro_type["type"]
+    return avro_type
+
+
+def _branch(avro_type: Any) -> Any:
+    """
+    What identifies a branch of a union: the name of named types, the type of the others.
+    """
+    if isinstance(avro_type, str):
+        return avro_type
+    return avro_type.get("name", avro_type["type"]), avro_type.get("logicalType")
+
+
+def _projection(writer: Any, reader: Any, writer_named: dict, reader_named: dict, records: frozenset):
+    """
+    Compiles the conversion of values decoded with the writer type into values of the reader type,
+    following the resolution rules of the Avro specification.
+    :return: A function converting values, or `None` if values are the same for both types.
+    :raises: _Unsupported: If the resolution isn't compiled, e.g. recursive records or changed union branches.
+    """
+    writer, reader = _named(writer, writer_named), _named(reader, reader_named)
+    if isinstance(writer, list) or isinstance(reader, list):
+        # union branches are only known after decoding, they are kept as they are
+        reader_branches = {_branch(_named(branch, reader_named)): branch for branch in _as_list(reader)}
+        for branch in _as_list(writer):
+            matching = reader_branches.get(_branch(_named(branch, writer_named)), _Unsupported)
+            if matching is _Unsupported or _projection(branch, matching, writer_named, reader_named, records):
+                raise _Unsupported(branch)
+        return None
+    if isinstance(writer, str) or isinstance(reader, str):
+        if writer == reader:
+            return None
+        if not isinstance(writer, str) or not isinstance(reader, str) or (writer, reader) not in _PROMOTIONS:
+            raise _Unsupported(writer, reader)
+        return _PROMOTIONS[writer, reader]
+    if "logicalType" in writer or "logicalType" in reader or writer["type"] != reader["type"]:
+        if writer != reader:
+            raise _Unsupported(writer, reader)
+        return None
+    kind = writer["type"]
+    if kind == "array":
+        items = _projection(writer["items"], reader["items"], writer_named, reader_named, records)
+        return None if items is None else lambda values: [items(value) for value in values]
+    if kind == "map":
+        values = _projection(writer["values"], reader["values"], writer_named, reader_named, records)
+        return None if values is None else lambda mapping: {key: values(value) for key, value in mapping.items()}
+    if writer["name"] != reader["name"]:
+        raise _Unsupported(writer["name"], reader["name"])
+    if kind == "fixed":
+        if writer["size"] != reader["size"]:
+            raise _Unsupported(writer, reader)
+        return None
+    if kind == "enum":
+        symbols = frozenset(reader["symbols"])
+        if symbols.issuperset(writer["symbols"]):
+            return None
+        if "default" not in reader:
+            raise _Unsupported(writer, reader)
+        default = reader["default"]
+        return lambda symbol: symbol if symbol in symbols else default
+    if reader["name"] in records:
+        raise _Unsupported("recursive", reader["name"])
+    return _record_projection(writer, reader, writer_named, reader_named, records | {reader["name"]})
+
+
+def _as_list(avro_type: Any) -> list:
+    return avro_type if isinstance(avro_type, list) else [avro_type]
+
+
+def _record_projection(writer: dict, reader: dict, writer_named: dict, reader_named: dict, records: frozenset):
+    """
+    Generates a function building the reader record from the writer one in a single dict display,
+    e.g. `return {k0: record[s0], k1: p1(record[s1]), k2: d2}`.
+    """
+    writer_fields = {field["name"]: field for field in writer["fields"]}
+    changed = [field["name"] for field in reader["fields"]] != list(writer_fields)
+    arguments: Dict[str, Any] = {}
+    items = []
+    for idx, field in enumerate(reader["fields"]):
+        key = arguments[f"k{idx}"] = field["name"]
+        candidates = [key, *field.get("aliases", ())]
+        source = next((candidate for candidate in candidates if candidate in writer_fields), None)
+        if source is None:
+            if "default" not in field:
+                raise _Unsupported(field)
+            default = field["default"]
+            if default == [] or default == {}:
+                items.append(f"k{idx}: {default!r}")  # a new empty list or dict per record
+            elif isinstance(default, (list, dict)):
+                raise _Unsupported(field)
+            else:
+                arguments[f"d{idx}"] = default
+                items.append(f"k{idx}: d{idx}")
+            changed = True
+            continue
+        arguments[f"s{idx}"] = source
+        project = _projection(writer_fields[source]["type"], field["type"], writer_named, reader_named, records)
+        if project is None:
+            items.append(f"k{idx}: record[s{idx}]")
+        else:
+            arguments[f"p{idx}"] = project
+            items.append(f"k{idx}: p{idx}(record[s{idx}])")
+        changed = changed or project is not None or source != key
+    if not changed:
+        return None
+    source = (
+        f"def __make_projection__({', '.join(arguments)}):\n"
+        f"    def project(record):\n"
+        f"        return {{{', '.join(items)}}}\n"
+        f"    return project\n"
+    )
+    namespace: Dict[str, Any] = {}
+    exec(source, namespace)  # noqa: S102 - the source is built from identifiers only
+    return namespace["__make_projection__"](**arguments)
+
+
+def to_avro(
+    schema_registry_client: SchemaRegistryClient,
+    writer_schema: Union[dict, str, Schema],
+    conf: Optional[dict] = None,
+    field: str = MessageField.VALUE,
+) -> Callable[[dict[str, Any], SerializationContext], bytes]:
+    """
+    Converts a dict into Avro with the Confluent Schema Registry framing.
+    Accepts the same `conf` as `confluent_kafka.schema_registry.avro.AvroSerializer`.
+    The schema is registered (or looked up) once per subject, the framing header is precomputed.
+    :param field: `MessageField.KEY` to serialize message keys, registered under the key subject.
+    """
+    schema = _as_schema(writer_schema)
+    parsed_schema = schema_cache(schema_registry_client).parse(schema)
+    header_for = _framing(schema_registry_client, schema, conf, field)
+
+    @origin("avro.to_avro", schema_registry_client, writer_schema, conf, **_field_options(field))
+    def wrapper(data: dict[str, Any], ctx: SerializationContext) -> bytes:
+        if data is None:
+            return None
+        return _write(header_for(ctx.topic), parsed_schema, data)
+
+    return wrapper
+
+
+ReaderSchema = Union[dict, str, Schema, Type["BaseModel"]]
+
+
+def _as_reader_schema(reader_schema: Optional[ReaderSchema]) -> Optional[Union[dict, str, Schema]]:
+    if not _is_model_class(reader_schema):
+        return reader_schema
+    if not hasattr(reader_schema, "avro_schema"):
+        raise ValueError(
+            f"Can't derive a reader schema from {reader_schema.__name__}: "
+            "it has no avro_schema() method, as provided by pydantic-avro"
+        )
+    return reader_schema.avro_schema()
+
+
+def reader(schema_registry_client: SchemaRegistryClient, reader_schema: Optional[ReaderSchema] = None) -> Reader:
+    """
+    Returns the `Reader` shared by the compositions decoding to a reader schema, e.g. to check which writer schemas
+    a topic holds and how they are resolved: `avro.reader(client, User).writers`.
+    :param reader_schema: A schema, or a Pydantic model to derive it from with `avro_schema()` (see `pydantic-avro`).
+    :raises: ValueError: If a schema can't be derived from the model.
+    """
+    return schema_cache(schema_registry_client).reader(_as_reader_schema(reader_schema))
+
+
+def to_dict(
+    schema_registry_client: SchemaRegistryClient, reader_schema: Optional[ReaderSchema] = None
+) -> Callable[[bytes, SerializationContext], dict[str, Any]]:
+    """
+    Converts Avro with the Confluent Schema Registry framing into a dict.
+    The payload is read in place, bytes are never copied.
+    :param schema_registry_client: A registry to fetch writer schemas from, once per schema id.
+    :param reader_schema: An optional schema to resolve all writer schemas to,
+        or a Pydantic model to derive it from (see `reader`).
+    """
+    schema_reader = reader(schema_registry_client, reader_schema)
+    plans, messages = schema_reader._plans, schema_reader._messages
+
+    @origin("avro.to_dict", schema_registry_client, reader_schema)
+    def wrapper(data: bytes, ctx: Optional[SerializationContext] = None) -> dict[str, Any]:
+        if data is None:
+            return None
+        schema_id = _schema_id(data)
+        messages[schema_id] += 1
+        return _read(data, plans.get(schema_id) or schema_reader.plan(schema_id))
+
+    return wrapper
+
+
+_PRIMITIVES = {
+    "null": (type(None),),
+    "boolean": (bool,),
+    "int": (int,),
+    "long": (int,),
+    "float": (float,),
+    "double": (float,),
+    "string": (str,),
+    "bytes": (bytes,),
+}
+
+
+def _is_compatible(avro_type: Any, annotation: Any, named_schemas: dict) -> bool:
+    """
+    Tells whether values of an Avro type are, as decoded by fastavro, valid values of a Python type annotation.
+    Conservative: anything it is not sure about is reported as incompatible.
+    """
+    if annotation is Any:
+        return True
+    origin, args = get_origin(annotation), get_args(annotation)
+    if origin is Union or (_UnionType is not None and origin is _UnionType):
+        branches = avro_type if isinstance(avro_type, list) else [avro_type]
+        return all(any(_is_compatible(branch, arg, named_schemas) for arg in args) for branch in branches)
+    if isinstance(avro_type, list):
+        return False
+    if isinstance(avro_type, str):
+        if avro_type in _PRIMITIVES:
+            return annotation in _PRIMITIVES[avro_type]
+        avro_type = named_schemas.get(avro_type)
+        if avro_type is None:
+            return False
+    if not isinstance(avro_type, dict) or "logicalType" in avro_type:
+        return False
+    kind = avro_type["type"]
+    if kind in _PRIMITIVES:
+        return annotation in _PRIMITIVES[kind]
+    if kind == "enum":
+        return annotation is str or (origin is Literal and set(avro_type["symbols"]) <= set(args))
+    if kind == "array":
+        return origin is list and len(args) == 1 and _is_compatible(avro_type["items"], args[0], named_schemas)
+    if kind == "map":
+        return (
+            origin is dict
+            and len(args) == 2
+            and args[0] is str
+            and _is_compatible(avro_type["values"], args[1], named_schemas)
+        )
+    return False
+
+
+# model configuration which doesn't change or constrain values already of the annotated types, nor how they are dumped
+_INERT_CONFIG = frozenset(
+    {
+        "title",
+        "extra",
+        "frozen",
+        "populate_by_name",
+        "arbitrary_types_allowed",
+        "from_attributes",
+        "loc_by_alias",
+        "protected_namespaces",
+        "hide_input_in_errors",
+        "defer_build",
+        "plugin_settings",
+        "schema_generator",
+        "json_schema_extra",
+        "json_schema_mode_override",
+        "json_schema_serialization_defaults_required",
+        "use_attribute_docstrings",
+        "ignored_types",
+        "cache_strings",
+        "validate_assignment",
+        "revalidate_instances",
+        "validate_default",
+        "validate_return",
+        "validation_error_cause",
+    }
+)
+
+
+def _is_trusted(record_schema: Any, model_class: Type) -> bool:
+    """
+    Tells whether a model instance and an Avro record of a given schema can be converted into each other as is,
+    i.e. the model's `__dict__` is exactly the decoded record and there is no validation or serialization logic to run,
+    neither from validators and serializers nor from configuration like `str_strip_whitespace`.
+    """
+    if not isinstance(record_schema, dict) or record_schema.get("type") != "record":
+        return False
+    decorators = model_class.__pydantic_decorators__
+    if (
+        model_class.__pydantic_root_model__
+        or model_class.__pydantic_post_init__
+        or model_class.model_config.get("extra") == "allow"
+        or not _INERT_CONFIG.issuperset(model_class.model_config)
+        or decorators.validators
+        or decorators.field_validators
+        or decorators.root_validators
+        or decorators.model_validators
+        or decorators.field_serializers
+        or decorators.model_serializers
+    ):
+        return False
+    fields = model_class.model_fields
+    avro_fields = {field["name"]: field["type"] for field in record_schema["fields"]}
+    if set(avro_fields) != set(fields):
+        return False
+    named_schemas = record_schema.get("__named_schemas", {})
+    return all(
+        field.alias is None
+        and field.validation_alias is None
+        and field.serialization_alias is None
+        and not field.metadata
+        and _is_compatible(avro_fields[name], field.annotation, named_schemas)
+        for name, field in fields.items()
+    )
+
+
+def _constructor(model_class: Type[M]) -> Callable[[dict], M]:
+    """
+    Makes an instance of `model_class` owning a trusted record as its `__dict__`, like `model_construct` but without
+    copying the record.
+    """
+    fields_set = frozenset(model_class.model_fields)
+
+    def construct(record: dict) -> M:
+        instance = model_class.__new__(model_class)
+        _object_setattr(instance, "__dict__", record)
+        _object_setattr(instance, "__pydantic_fields_set__", set(fields_set))
+        _object_setattr(instance, "__pydantic_extra__", None)
+        _object_setattr(instance, "__pydantic_private__", None)
+        return instance
+
+    return construct
+
+
+def _require_pydantic():
+    if BaseModel is None:
+        raise ImportError('Package "pydantic" is missing: run pip install quixstreams-extensions[pydantic] to fix it')
+
+
+def to_instance_of(
+    schema_registry_client: SchemaRegistryClient,
+    model_class: Type[M],
+    reader_schema: Optional[ReaderSchema] = None,
+) -> Callable[[bytes, SerializationContext], M]:
+    """
+    Converts Avro with the Confluent Schema Registry framing straight into a Pydantic model.
+    A fused `composed(..., avro.to_dict(...), pydantic.to_instance_of(model_class))`.
+
+    When the record schema (the reader schema if given, otherwise the writer one) provably matches the model,
+    i.e. same field names, no aliases, constraints, validators or configuration changing values (`str_strip_whitespace`...)
+    and types decoded by fastavro as the model expects them,
+    the decoded record becomes the instance's `__dict__` without validation.
+    Otherwise, the record is validated with `model_validate`. The decision is taken once per writer schema id.
+    With a reader schema, e.g. `reader_schema=model_class` for topics with several writer versions,
+    records of every version are decoded to the same shape and take the same path.
+    :raises: ValidationError: If the record could not be validated.
+    """
+    _require_pydantic()
+    schema_reader = reader(schema_registry_client, reader_schema)
+    messages = schema_reader._messages
+    construct = _constructor(model_class)
+    plans: Dict[int, Tuple[ReadPlan, Callable[[dict], M]]] = {}
+
+    def plan_for(schema_id: int) -> Tuple[ReadPlan, Callable[[dict], M]]:
+        plan = schema_reader.plan(schema_id)
+        trusted = _is_trusted(schema_reader.schema or plan.writer, model_class)
+        plans[schema_id] = plan, (construct if trusted else model_class.model_validate)
+        return plans[schema_id]
+
+    @origin("avro.to_instance_of", schema_registry_client, model_class, reader_schema)
+    def wrapper(data: bytes, ctx: Optional[SerializationContext] = None) -> M:
+        if data is None:
+            return None
+        schema_id = _schema_id(data)
+        messages[schema_id] += 1
+        plan, build = plans.get(schema_id) or plan_for(schema_id)
+        return build(_read(data, plan))
+
+    return wrapper
+
+
+def from_instance_of(
+    schema_registry_client: SchemaRegistryClient,
+    model_class: Type[M],
+    writer_schema: Optional[Union[dict, str, Schema]] = None,
+    conf: Optional[dict] = None,
+    field: str = MessageField.VALUE,
+) -> Callable[[M, SerializationContext], bytes]:
+    """
+    Converts a Pydantic model into Avro with the Confluent Schema Registry framing.
+    A fused `composed(..., pydantic.to_dict, avro.to_avro(...))`.
+
+    When the writer schema provably matches the model (see `to_instance_of`), the instance's `__dict__` is written as is.
+    Otherwise, the instance is dumped with `model_dump(mode="json", by_alias=True)` first.
+    :param writer_schema: Defaults to `model_class.avro_schema()`, as provided by `pydantic-avro`.
+    :param field: `MessageField.KEY` to serialize message keys, registered under the key subject.
+    """
+    _require_pydantic()
+    if writer_schema is None:
+        writer_schema = model_class.avro_schema()
+    return origin(
+        "avro.from_instance_of", schema_registry_client, model_class, writer_schema, conf, **_field_options(field)
+    )(_models_to_avro(schema_registry_client, writer_schema, conf, _model_dump, field))
+
+
+def _model_dump(obj: M, ctx: Optional[SerializationContext] = None) -> dict[str, Any]:
+    return obj.model_dump(mode="json", by_alias=True)
+
+
+def _models_to_avro(
+    schema_registry_client: SchemaRegistryClient,
+    writer_schema: Union[dict, str, Schema],
+    conf: Optional[dict],
+    as_dict: Callable[[Any, Optional[SerializationContext]], dict[str, Any]],
+    field: str = MessageField.VALUE,
+) -> Callable[[Any, SerializationContext], bytes]:
+    """
+    Writes the `__dict__` of models matching the writer schema as is, converting anything else with `as_dict` first.
+    Whether a model matches is decided once per model class.
+    """
+    schema = _as_schema(writer_schema)
+    parsed_schema = schema_cache(schema_registry_client).parse(schema)
+    header_for = _framing(schema_registry_client, schema, conf, field)
+    trusted: Dict[type, bool] = {}
+
+    def is_trusted(model_class: type) -> bool:
+        result = trusted[model_class] = issubclass(model_class, BaseModel) and _is_trusted(parsed_schema, model_class)
+        return result
+
+    def wrapper(obj: Any, ctx: SerializationContext) -> bytes:
+        if obj is None:
+            return None
+        model_class = type(obj)
+        trusted_model = trusted.get(model_class)
+        if trusted_model is None:
+            trusted_model = is_trusted(model_class)
+        record = obj.__dict__ if trusted_model else as_dict(obj, ctx)
+        return _write(header_for(ctx.topic), parsed_schema, record)
+
+    return wrapper
+
+
+def _is_model_class(model_class: Any) -> bool:
+    return BaseModel is not None and isinstance(model_class, type) and issubclass(model_class, BaseModel)
+
+
+@fusion("avro.to_dict", "pydantic.to_instance_of")
+@fusion("confluent.to_dict", "pydantic.to_instance_of")
+def _fuse_decode_and_validate(decode, validate):
+    schema_registry_client, reader_schema = origin_of(decode).args
+    validate_origin = origin_of(validate)
+    (model_class,) = validate_origin.args
+    if _is_model_class(model_class) and validate_origin.kwargs.get("strict") is None:
+        from quixstreams_extensions.serializers.compositions.pydantic import _validator
+
+        # `to_instance_of` validates without context, which validators taking `ValidationInfo` may read
+        if not _validator(model_class)[1]:
+            return to_instance_of(schema_registry_client, model_class, reader_schema)
+
+
+@fusion("pydantic.to_dict", "avro.to_avro")
+@fusion("pydantic.to_dict", "confluent.to_avro")
+def _fuse_dump_and_encode(dump, encode):
+    encode_origin = origin_of(encode)
+    schema_registry_client, writer_schema, conf = encode_origin.args
+    field = encode_origin.kwargs.get("field", MessageField.VALUE)
+    return origin("avro.from_instance_of", schema_registry_client, None, writer_schema, conf, **_field_options(field))(
+        _models_to_avro(schema_registry_client, writer_schema, conf, dump, field)
+    )
@@ -0,0 +1,222 @@
+"""
+Compression steps: zstd (`zstandard` package), lz4 (`lz4` package) and gzip.
+
+`compress(codec)` asks the producer to set a `content-encoding` header on the messages of a composed `Serializer`.
+`decompress()` reads the codec from this header, or recognises it by the payload's magic bytes,
+so topics with mixed or no compression are read with the same step.
+"""
+
+import gzip
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+
+from quixstreams.models import SerializationContext
+
+from quixstreams_extensions.serializers.composer import origin, with_batch, with_headers
+
+HEADER = "content-encoding"
+
+# batches smaller than that are (de)compressed in the calling thread, even with `threads`
+PARALLEL_THRESHOLD = 256 << 10
+
+Payload = Union[bytes, bytearray, memoryview]
+
+
+class _Zstd:
+    """
+    Keeps a compressor and a decompressor per thread, they are costly to create and not thread-safe.
+    """
+
+    name = "zstd"
+    magic = b"\x28\xb5\x2f\xfd"
+
+    def __init__(self, level: Optional[int] = None, dictionary: Optional[bytes] = None):
+        import zstandard
+
+        self._zstandard = zstandard
+        self._level = 3 if level is None else level
+        self._dictionary = zstandard.ZstdCompressionDict(dictionary) if dictionary is not None else None
+        if self._dictionary is not None:
+            # digests the dictionary once for every compressor
+            self._dictionary.precompute_compress(level=self._level)
+        self._local = threading.local()
+
+    def compress(self, data: Payload) -> bytes:
+        compressor = getattr(self._local, "compressor", None)
+        if compressor is None:
+            compressor = self._local.compressor = self._zstandard.ZstdCompressor(
+                level=self._level, dict_data=self._dictionary
+            )
+        return compressor.compress(data)
+
+    def decompress(self, data: Payload) -> bytes:
+        decompressor = getattr(self._local, "decompressor", None)
+        if decompressor is None:
+            decompressor = self._local.decompressor = self._zstandard.ZstdDecompressor(dict_data=self._dictionary)
+        return decompressor.decompress(data)
+
+
+class _Lz4:
+    name = "lz4"
+    magic = b"\x04\x22\x4d\x18"
+
+    def __init__(self, level: Optional[int] = None, dictionary: Optional[bytes] = None):
+        import lz4.frame
+
+        self._frame = lz4.frame
+        self._level = 0 if level is None else level
+
+    def compress(self, data: Payload) -> bytes:
+        return self._frame.compress(data, compression_level=self._level, store_size=True)
+
+    def decompress(self, data: Payload) -> bytes:
+        return self._frame.decompress(data)
+
+
+class _Gzip:
+    name = "gzip"
+    magic = b"\x1f\x8b"
+
+    def __init__(self, level: Optional[int] = None, dictionary: Optional[bytes] = None):
+        self._level = 6 if level is None else level
+
+    def compress(self, data: Payload) -> bytes:
+        return gzip.compress(data, compresslevel=self._level, mtime=0)
+
+    def decompress(self, data: Payload) -> bytes:
+        # a gzip container, not zlib's
+        return zlib.decompress(data, 16 + zlib.MAX_WBITS)
+
+
+_CODECS = {codec.name: codec for codec in (_Zstd, _Lz4, _Gzip)}
+
+
+def _codec(name: str, level: Optional[int] = None, dictionary: Optional[bytes] = None):
+    if name not in _CODECS:
+        raise ValueError(f"Unknown codec {name}, expected one of {', '.join(_CODECS)}")
+    if dictionary is not None and name != "zstd":
+        raise ValueError("Dictionaries are supported by zstd only")
+    return _CODECS[name](level, dictionary)
+
+
+class _Pool:
+    """
+    Spreads large batches over `threads` threads, the codecs release the GIL while they work.
+    """
+
+    def __init__(self, threads: int):
+        self._threads = threads
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def map(self, fn: Callable[[Any], Payload], values: List[Any], size: int) -> List[Payload]:
+        """
+        Calls `fn` on every value, in parallel if the batch holds `size` >= `PARALLEL_THRESHOLD` bytes.
+        """
+        if self._threads < 2 or len(values) < 2 or size < PARALLEL_THRESHOLD:
+            return [fn(value) for value in values]
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self._threads, thread_name_prefix="compression")
+        return list(self._executor.map(fn, values, chunksize=max(1, len(values) // (self._threads * 4))))
+
+
+def compress(
+    codec: str = "zstd", level: Optional[int] = None, dictionary: Optional[bytes] = None, threads: int = 0
+) -> Callable[[Payload, Optional[SerializationContext]], bytes]:
+    """
+    Compresses payloads, sets the `content-encoding` header to the codec when used in a composed `Serializer`.
+    :param codec: `zstd`, `lz4` or `gzip`.
+    :param level: Compression level, the codec's default if omitted.
+    :param dictionary: A zstd dictionary, see `train_dictionary`. Readers need the same dictionary.
+    :param threads: Threads compressing a batch in `call_many`, batches are compressed in the calling thread if < 2.
+    :raises: ValueError: If the codec is unknown or doesn't support dictionaries.
+    """
+    compressor = _codec(codec, level, dictionary)
+    pool = _Pool(threads)
+    options = {"level": level} if level is not None else {}
+
+    def compress_many(values: List[Payload], ctxs: Sequence[Optional[SerializationContext]]) -> List[bytes]:
+        return pool.map(compressor.compress, values, sum(map(len, values)))
+
+    @origin("compression.compress", codec, **options)
+    @with_headers({HEADER: codec})
+    @with_batch(compress_many)
+    def compress_value(data: Payload, ctx: Optional[SerializationContext] = None) -> bytes:
+        return compressor.compress(data)
+
+    return compress_value
+
+
+def _header(ctx: Optional[SerializationContext], name: str) -> Optional[str]:
+    headers = ctx.headers if ctx is not None else None
+    if not headers:
+        return None
+    items = headers.items() if isinstance(headers, dict) else headers
+    for key, value in items:
+        if key == name:
+            return value.decode() if isinstance(value, (bytes, bytearray)) else value
+    return None
+
+
+def decompress(
+    codec: Optional[str] = None, dictionary: Optional[bytes] = None, threads: int = 0, header: str = HEADER
+) -> Callable[[Payload, Optional[SerializationContext]], bytes]:
+    """
+    Decompresses payloads, detecting their codec from the `header` header first,
+    then from their magic bytes. Payloads with an `identity` header, or matching neither,
+    are returned as they are, unless `codec` is given, which is used for the latter instead.
+    :param codec: The codec of payloads without header nor known magic bytes.
+    :param dictionary: The zstd dictionary the payloads have been compressed with.
+    :param threads: Threads decompressing a batch in `call_many`, batches are decompressed in the calling thread if < 2.
+    :param header: Name of the header holding the codec.
+    :raises: ValueError: If a header names an unknown codec.
+    """
+    codecs: Dict[str, Any] = {}
+
+    def get_codec(name: str):
+        if name not in codecs:
+            codecs[name] = _codec(name, dictionary=dictionary if name == "zstd" else None)
+        return codecs[name]
+
+    fallback = get_codec(codec) if codec is not None else None
+
+    def detect(data: Payload, ctx: Optional[SerializationContext]):
+        name = _header(ctx, header)
+        if name == "identity":
+            return None
+        if name is not None:
+            return get_codec(name)
+        prefix = bytes(data[:4])
+        for candidate in _CODECS.values():
+            if prefix.startswith(candidate.magic):
+                return get_codec(candidate.name)
+        return fallback
+
+    def decompress_detected(data: Payload, detected: Any) -> Payload:
+        return detected.decompress(data) if detected is not None else data
+
+    pool = _Pool(threads)
+
+    def decompress_many(values: List[Payload], ctxs: Sequence[Optional[SerializationContext]]) -> List[Payload]:
+        pairs = [(value, detect(value, ctx)) for value, ctx in zip(values, ctxs)]
+        return pool.map(lambda pair: decompress_detected(*pair), pairs, sum(map(len, values)))
+
+    @origin("compression.decompress", **({"codec": codec} if codec is not None else {}))
+    @with_batch(decompress_many)
+    def decompress_value(data: Payload, ctx: Optional[SerializationContext] = None) -> Payload:
+        return decompress_detected(data, detect(data, ctx))
+
+    return decompress_value
+
+
+def train_dictionary(samples: Sequence[bytes], size: int = 112_640) -> bytes:
+    """
+    Trains a zstd dictionary on sample payloads, e.g. a few thousand messages of a topic.
+    Dictionaries improve the ratio of small payloads sharing a structure, like JSON or Avro records.
+    :param samples: Uncompressed payloads.
+    :param size: Maximum size of the dictionary in bytes.
+    """
+    import zstandard
+
+    return zstandard.train_dictionary(size, list(samples)).as_bytes()
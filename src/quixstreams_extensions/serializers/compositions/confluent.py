@@ -1,37 +1,104 @@
-from typing import Callable, Any, Optional, Union
+from typing import Callable, Any, Dict, Optional, Tuple, Union
 
-from confluent_kafka.schema_registry import SchemaRegistryClient, Schema
+from confluent_kafka.schema_registry import (
+    SchemaRegistryClient,
+    Schema,
+    record_subject_name_strategy,
+    topic_record_subject_name_strategy,
+    topic_subject_name_strategy,
+)
 from confluent_kafka.schema_registry.avro import AvroDeserializer, AvroSerializer
 from confluent_kafka.serialization import MessageField
+from confluent_kafka.serialization import SerializationContext as ConfluentSerializationContext
 from orjson import orjson
 from quixstreams.models import SerializationContext
 
+from quixstreams_extensions.serializers.composer import origin
+from quixstreams_extensions.serializers.compositions import avro  # noqa: F401 - registers fusion rules for these steps
+from quixstreams_extensions.serializers.compositions.avro import _field_options
+
+
+def _confluent_context(field: str) -> Callable[[SerializationContext], ConfluentSerializationContext]:
+    """
+    Returns a function converting contexts for the given field, sharing one confluent context per topic
+    between messages without headers.
+    """
+    contexts: Dict[str, ConfluentSerializationContext] = {}
+
+    def convert(ctx: SerializationContext) -> ConfluentSerializationContext:
+        if ctx.headers:
+            return ctx.to_confluent_ctx(field)
+        confluent_ctx = contexts.get(ctx.topic)
+        if confluent_ctx is None:
+            confluent_ctx = contexts[ctx.topic] = ctx.to_confluent_ctx(field)
+        return confluent_ctx
+
+    return convert
+
+
+# strategies depending on the topic, field and record name only
+_CACHEABLE_STRATEGIES = (topic_subject_name_strategy, topic_record_subject_name_strategy, record_subject_name_strategy)
+
+
+def _cached_subject_name_strategy(strategy: Callable[[ConfluentSerializationContext, str], str]):
+    """
+    Wraps a built-in subject name strategy, called by `AvroSerializer` for every message, to compute a subject once
+    per topic, field and record name. Other strategies may depend on headers or state, they are returned as is.
+    """
+    if strategy not in _CACHEABLE_STRATEGIES:
+        return strategy
+    subjects: Dict[Tuple[str, str, Optional[str]], str] = {}
+
+    def subject_name(ctx: ConfluentSerializationContext, record_name: Optional[str]) -> str:
+        key = ctx.topic, ctx.field, record_name
+        subject = subjects.get(key)
+        if subject is None:
+            subject = subjects[key] = strategy(ctx, record_name)
+        return subject
+
+    return subject_name
+
 
 def to_avro(
-    schema_registry_client: SchemaRegistryClient, writer_schema: Union[dict, str, Schema], conf: Optional[dict] = None
+    schema_registry_client: SchemaRegistryClient,
+    writer_schema: Union[dict, str, Schema],
+    conf: Optional[dict] = None,
+    field: str = MessageField.VALUE,
 ) -> Callable[[dict[str, Any], SerializationContext], bytes]:
     """
     A factory wrapper around `confluent_kafka.schema_registry.avro.AvroSerializer`
+    :param field: `MessageField.KEY` to serialize message keys, registered under the key subject.
     """
     if isinstance(writer_schema, dict):
         writer_schema = orjson.dumps(writer_schema).decode("utf-8")
-    serializer = AvroSerializer(schema_registry_client, writer_schema, conf=conf)
+    serializer_conf = {
+        **(conf or {}),
+        "subject.name.strategy": _cached_subject_name_strategy(
+            (conf or {}).get("subject.name.strategy", topic_subject_name_strategy)
+        ),
+    }
+    serializer = AvroSerializer(schema_registry_client, writer_schema, conf=serializer_conf)
+    confluent_ctx = _confluent_context(field)
 
+    @origin("confluent.to_avro", schema_registry_client, writer_schema, conf, **_field_options(field))
     def wrapper(data: dict[str, Any], ctx: SerializationContext) -> bytes:
-        return serializer(data, ctx.to_confluent_ctx(MessageField.VALUE))
+        return serializer(data, confluent_ctx(ctx))
 
     return wrapper
 
 
 def to_dict(
-    schema_registry_client: SchemaRegistryClient, reader_schema: Optional[str] = None
+    schema_registry_client: SchemaRegistryClient, reader_schema: Optional[str] = None, field: str = MessageField.VALUE
 ) -> Callable[[bytes, SerializationContext], dict[str, Any]]:
     """
     A factory wrapper around `confluent_kafka.schema_registry.avro.AvroDeserializer`
+    :param field: `MessageField.KEY` to deserialize message keys.
     """
     deserializer = AvroDeserializer(schema_registry_client, reader_schema)
+    confluent_ctx = _confluent_context(field)
 
+    @origin("confluent.to_dict", schema_registry_client, reader_schema, **_field_options(field))
     def wrapper(data: bytes, ctx: SerializationContext) -> dict[str, Any]:
-        return deserializer(data, ctx.to_confluent_ctx(MessageField.VALUE))
+        return deserializer(data, confluent_ctx(ctx))
 
     return wrapper
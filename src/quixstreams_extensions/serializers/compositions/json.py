@@ -0,0 +1,65 @@
+"""
+JSON steps built on orjson, to be used instead of raw `orjson.loads`/`orjson.dumps` steps.
+"""
+
+from typing import Any, Callable, Optional, Union
+
+import orjson
+from quixstreams.models import SerializationContext
+
+from quixstreams_extensions.serializers.composer import origin
+
+
+@origin("json.loads")
+def loads(data: Union[bytes, bytearray, memoryview, str], ctx: Optional[SerializationContext] = None) -> Any:
+    """
+    Parses a JSON document. A `memoryview`, e.g. over a slice of a larger buffer, is parsed in place,
+    without copying it to bytes first: it saves the memory of the copy, not measurably its time.
+    """
+    return orjson.loads(data)
+
+
+def dumps_with(
+    non_str_keys: bool = False,
+    serialize_numpy: bool = False,
+    sort_keys: bool = False,
+    option: int = 0,
+    default: Optional[Callable[[Any], Any]] = None,
+) -> Callable[[Any, Optional[SerializationContext]], bytes]:
+    """
+    Makes a step serializing objects to JSON bytes with the given orjson options.
+    :param non_str_keys: Serialize dicts with keys other than strings, e.g. ints or datetimes.
+    :param serialize_numpy: Serialize numpy arrays natively instead of calling `default` on them.
+    :param sort_keys: Sort the keys of dicts, off by default as it's slower.
+    :param option: Any other `orjson.OPT_*` flags.
+    :param default: Called for objects orjson can't serialize, see `orjson.dumps`.
+    """
+    options = {
+        name: value
+        for name, value in (
+            ("non_str_keys", non_str_keys),
+            ("serialize_numpy", serialize_numpy),
+            ("sort_keys", sort_keys),
+            ("option", option),
+            ("default", default),
+        )
+        if value
+    }
+    flags = (
+        option
+        | (orjson.OPT_NON_STR_KEYS if non_str_keys else 0)
+        | (orjson.OPT_SERIALIZE_NUMPY if serialize_numpy else 0)
+        | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+    ) or None
+
+    @origin("json.dumps", **options)
+    def dumps(obj: Any, ctx: Optional[SerializationContext] = None) -> bytes:
+        return orjson.dumps(obj, default, flags)
+
+    return dumps
+
+
+dumps = dumps_with()
+dumps.__doc__ = """
+Serializes an object to JSON bytes, see `dumps_with` for options.
+"""
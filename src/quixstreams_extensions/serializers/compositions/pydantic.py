@@ -1,11 +1,18 @@
 from dataclasses import asdict, is_dataclass
-from typing import Type, TypeVar, Any, Callable, get_origin, Optional, Union, Protocol
+from functools import lru_cache
+from typing import Type, TypeVar, Any, Callable, get_origin, Optional, Union, Protocol, Sequence, List, Tuple
 
+import orjson
 from pydantic import BaseModel, TypeAdapter
+from pydantic_core import SchemaValidator
 from quixstreams.models import SerializationContext
 
+from quixstreams_extensions.serializers.composer import fusion, origin, origin_of, with_batch
+
 T = TypeVar("T")
 
+_MIXED = object()
+
 
 class _DataclassProtocol(Protocol):
     __dataclass_fields__: dict
@@ -19,26 +26,192 @@ def _as_own_context(ctx: Optional[SerializationContext]) -> Optional[dict[str, A
         }
 
 
-def to_instance_of(model_class: Type[T]) -> Callable[[dict, Optional[SerializationContext]], T]:
+def _as_shared_context(ctxs: Sequence[Optional[SerializationContext]]) -> Any:
+    """
+    Returns a context shared by the whole batch, or `_MIXED` if items have different contexts.
+    """
+    first = ctxs[0] if ctxs else None
+    for ctx in ctxs:
+        if ctx is first:
+            continue
+        if ctx is None or first is None or ctx.topic != first.topic or ctx.headers != first.headers:
+            return _MIXED
+    return _as_own_context(first)
+
+
+@lru_cache(maxsize=None)
+def _list_adapter(item_type: Any) -> TypeAdapter:
+    return TypeAdapter(List[item_type])
+
+
+def _is_model_class(model_class: Any) -> bool:
+    return get_origin(model_class) is None and isinstance(model_class, type) and issubclass(model_class, BaseModel)
+
+
+def _uses_info(schema: Any) -> bool:
+    """
+    Tells whether any validator within a core schema takes a `ValidationInfo` argument, i.e. may read the context.
+    """
+    if isinstance(schema, dict):
+        function = schema.get("function")
+        if isinstance(function, dict) and function.get("type") == "with-info":
+            return True
+        return any(_uses_info(value) for value in schema.values())
+    if isinstance(schema, (list, tuple)):
+        return any(_uses_info(value) for value in schema)
+    return False
+
+
+def _sets_strict(schema: Any) -> bool:
+    """
+    Tells whether a core schema validates anything strictly, by its configuration or per field.
+    """
+    if isinstance(schema, dict):
+        return schema.get("strict") is True or any(_sets_strict(value) for value in schema.values())
+    if isinstance(schema, (list, tuple)):
+        return any(_sets_strict(value) for value in schema)
+    return False
+
+
+def _validator_and_schema(model_class: Any) -> Tuple[SchemaValidator, Any]:
+    if _is_model_class(model_class):
+        return model_class.__pydantic_validator__, model_class.__pydantic_core_schema__
+    adapter = TypeAdapter(model_class)
+    return adapter.validator, adapter.core_schema
+
+
+def _validator(model_class: Any) -> Tuple[SchemaValidator, bool]:
+    """
+    Returns the pydantic-core validator of a type and whether it needs a validation context.
+    """
+    validator, schema = _validator_and_schema(model_class)
+    # a schema which is not built yet may use anything, including the context
+    return validator, _uses_info(schema) if isinstance(schema, dict) else True
+
+
+def _is_strict(model_class: Any) -> bool:
+    """
+    Tells whether a type is validated strictly anywhere, by its own configuration or a field's, without `strict=`.
+    """
+    schema = _validator_and_schema(model_class)[1]
+    # a schema which is not built yet may be strict
+    return _sets_strict(schema) if isinstance(schema, dict) else True
+
+
+def to_instance_of(
+    model_class: Type[T], strict: Optional[bool] = None, trusted: bool = False
+) -> Callable[[dict, Optional[SerializationContext]], T]:
     """
     Tries to map an input dict to an instance of a given type. Works well with Pydantic models, Dataclasses, Unions.
     May raise `ValidationError` If the object could not be validated.
+    The validation context (topic and headers) is built only if some validator of the type takes `ValidationInfo`.
+    :param model_class: A type
+    :param strict: Whether to validate in strict mode, defaults to the type's configuration.
+    :param trusted: Skip validation with `model_construct` for data already validated upstream, Pydantic models only.
+    :return: Instance of `model_class`
+    :raises: ValidationError: If the object could not be validated.
+    """
+    options = {"strict": strict} if strict is not None else {}
+    if trusted:
+        options["trusted"] = True
+        if not _is_model_class(model_class):
+            raise TypeError(f"Trusted mode requires a Pydantic model, got {model_class}")
+        construct = model_class.model_construct
+
+        def construct_many(data: List[dict], ctxs: Sequence[Optional[SerializationContext]]) -> List[T]:
+            return [construct(**item) for item in data]
+
+        @origin("pydantic.to_instance_of", model_class, **options)
+        @with_batch(construct_many)
+        def validate_trusted(data: dict, ctx: Optional[SerializationContext] = None) -> T:
+            return construct(**data)
+
+        return validate_trusted
+
+    validate_python = _validator(model_class)[0].validate_python
+    validate_list, needs_context = _validator(List[model_class])
+    validate_list = validate_list.validate_python
+
+    if not needs_context:
+
+        def validate_many(data: List[dict], ctxs: Sequence[Optional[SerializationContext]]) -> List[T]:
+            return validate_list(data, strict=strict)
+
+        @origin("pydantic.to_instance_of", model_class, **options)
+        @with_batch(validate_many)
+        def validate(data: dict, ctx: Optional[SerializationContext] = None) -> T:
+            return validate_python(data, strict=strict)
+
+        return validate
+
+    def validate_many_with_context(data: List[dict], ctxs: Sequence[Optional[SerializationContext]]) -> List[T]:
+        context = _as_shared_context(ctxs)
+        if context is _MIXED:
+            return [validate_with_context(item, ctx) for item, ctx in zip(data, ctxs)]
+        return validate_list(data, strict=strict, context=context)
+
+    @origin("pydantic.to_instance_of", model_class, **options)
+    @with_batch(validate_many_with_context)
+    def validate_with_context(data: dict, ctx: Optional[SerializationContext] = None) -> T:
+        return validate_python(data, strict=strict, context=_as_own_context(ctx))
+
+    return validate_with_context
+
+
+def from_json(
+    model_class: Type[T], strict: Optional[bool] = None
+) -> Callable[[bytes, Optional[SerializationContext]], T]:
+    """
+    Validates a JSON payload straight into an instance of a given type, without building an intermediate dict.
+    A faster `composed(..., json.loads, to_instance_of(model_class))`, which is fused into it automatically.
+    Pydantic doesn't read `memoryview`s, they are copied to bytes.
     :param model_class: A type
+    :param strict: Whether to validate in strict mode, defaults to the type's configuration.
     :return: Instance of `model_class`
     :raises: ValidationError: If the object could not be validated.
     """
-    if get_origin(model_class) is not None or not issubclass(model_class, BaseModel):
-        model_class = TypeAdapter[T](model_class)
+    validator, needs_context = _validator(model_class)
+    validate_json = validator.validate_json
+    options = {"strict": strict} if strict is not None else {}
+
+    if not needs_context:
+
+        @origin("pydantic.from_json", model_class, **options)
+        def validate(data: bytes, ctx: Optional[SerializationContext] = None) -> T:
+            if type(data) is memoryview:
+                data = data.tobytes()
+            return validate_json(data, strict=strict)
+
+        return validate
 
-    def validate(data: dict, ctx: Optional[SerializationContext] = None) -> T:
-        if isinstance(model_class, TypeAdapter):
-            return model_class.validate_python(data, context=_as_own_context(ctx))
-        else:
-            return model_class.model_validate(data)
+    @origin("pydantic.from_json", model_class, **options)
+    def validate_with_context(data: bytes, ctx: Optional[SerializationContext] = None) -> T:
+        if type(data) is memoryview:
+            data = data.tobytes()
+        return validate_json(data, strict=strict, context=_as_own_context(ctx))
 
-    return validate
+    return validate_with_context
+
+
+def _to_dict_many(objs: List[Union[BaseModel, _DataclassProtocol]], ctxs: Sequence[Optional[SerializationContext]]):
+    """
+    Dumps a batch of instances of the same Pydantic model in a single pydantic-core call.
+    """
+    model_class = type(objs[0]) if objs else None
+    context = _as_shared_context(ctxs)
+    if (
+        model_class is None
+        or context is _MIXED
+        or not issubclass(model_class, BaseModel)
+        or any(type(obj) is not model_class for obj in objs)
+    ):
+        return [to_dict(obj, ctx) for obj, ctx in zip(objs, ctxs)]
+    # `TypeAdapter.dump_python` doesn't take a context before pydantic 2.8, its serializer does
+    return _list_adapter(model_class).serializer.to_python(objs, mode="json", by_alias=True, context=context)
 
 
+@origin("pydantic.to_dict")
+@with_batch(_to_dict_many)
 def to_dict(obj: Union[BaseModel, _DataclassProtocol], ctx: Optional[SerializationContext] = None) -> dict[str, Any]:
     """
     Converts a Pydantic or Dataclass instance to a dictionary.
@@ -51,8 +224,39 @@ def to_dict(obj: Union[BaseModel, _DataclassProtocol], ctx: Optional[Serializati
         return dict(obj)
 
 
+@origin("pydantic.to_json")
 def to_json(obj: BaseModel, ctx: Optional[SerializationContext] = None) -> bytes:
     """
-    Converts a Pydantic instance to json string. A shortcut to `composed(..., to_dict, orjson.dumps)`
+    Converts a Pydantic instance to json string. A shortcut to `composed(..., to_dict, json.dumps)`
     """
-    return obj.model_dump_json(by_alias=True, context=_as_own_context(ctx)).encode()
+    # pydantic-core makes bytes, `model_dump_json` would decode them to a str
+    return obj.__pydantic_serializer__.to_json(obj, by_alias=True, context=_as_own_context(ctx))
+
+
+@origin("pydantic.to_json")
+def _dump_json(obj: Union[BaseModel, _DataclassProtocol], ctx: Optional[SerializationContext] = None) -> bytes:
+    if isinstance(obj, BaseModel):
+        return to_json(obj, ctx)
+    return orjson.dumps(to_dict(obj, ctx))
+
+
+@fusion(orjson.loads, "pydantic.to_instance_of")
+@fusion("json.loads", "pydantic.to_instance_of")
+def _fuse_loads_and_validate(loads, validate):
+    validate_origin = origin_of(validate)
+    # strict JSON validation accepts what strict Python validation rejects, like ISO strings for datetimes,
+    # whether `strict=` asks for it or the type is configured so
+    if (
+        not validate_origin.kwargs.get("trusted")
+        and validate_origin.kwargs.get("strict") is None
+        and not _is_strict(*validate_origin.args)
+    ):
+        return from_json(*validate_origin.args, **validate_origin.kwargs)
+
+
+@fusion("pydantic.to_dict", orjson.dumps)
+@fusion("pydantic.to_dict", "json.dumps")
+def _fuse_dump_and_dumps(dump, dumps):
+    # the options of `json.dumps_with` aren't supported by pydantic
+    if dumps is orjson.dumps or not origin_of(dumps).kwargs:
+        return _dump_json
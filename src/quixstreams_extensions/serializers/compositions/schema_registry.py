@@ -0,0 +1,256 @@
+"""
+A `SchemaRegistryClient` that can be warmed up at startup and persisted to a local snapshot,
+so restarted consumers don't call the registry for schemas they already knew.
+Works with both `confluent` and `avro` compositions, as a drop-in replacement of the registry client.
+"""
+
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import orjson
+from confluent_kafka.schema_registry import RegisteredSchema, Schema, SchemaReference, SchemaRegistryClient
+
+logger = logging.getLogger(__name__)
+
+
+def _schema_to_json(schema: Schema) -> dict:
+    return {
+        "schema": schema.schema_str,
+        "schemaType": schema.schema_type,
+        "references": [{"name": ref.name, "subject": ref.subject, "version": ref.version} for ref in schema.references],
+    }
+
+
+def _schema_from_json(data: dict) -> Schema:
+    return Schema(
+        data["schema"],
+        data.get("schemaType", "AVRO"),
+        [SchemaReference(ref["name"], ref["subject"], ref["version"]) for ref in data.get("references", [])],
+    )
+
+
+def _registered_to_json(registered: RegisteredSchema) -> dict:
+    return {
+        "id": registered.schema_id,
+        "subject": registered.subject,
+        "version": registered.version,
+        **_schema_to_json(registered.schema),
+    }
+
+
+def _registered_from_json(data: dict) -> RegisteredSchema:
+    return RegisteredSchema(data["id"], _schema_from_json(data), data["subject"], data["version"])
+
+
+def _lookup_key(data: dict) -> Tuple[str, str, bool]:
+    return data["subject"], data["schema"], data["normalize"]
+
+
+class CachedSchemaRegistryClient(SchemaRegistryClient):
+    """
+    Keeps every schema, subject version, lookup and registration it has fetched, in memory and,
+    with `snapshot_path`, in a local JSON file which is reloaded on startup, e.g. `state/schema-registry.json`.
+
+    `warm_up()` fetches known subjects and schema ids upfront.
+    Latest versions are cached too, `refresh()` updates them, every `refresh_interval` seconds
+    in a background thread if set, so new schema versions are picked up without a restart.
+
+    :param conf: The `SchemaRegistryClient` configuration.
+    :param snapshot_path: Where to persist the cached schemas.
+    :param refresh_interval: Seconds between background refreshes of the latest versions, disabled if omitted.
+    """
+
+    def __init__(
+        self,
+        conf: dict,
+        snapshot_path: Union[None, str, Path] = None,
+        refresh_interval: Optional[float] = None,
+    ):
+        super().__init__(conf)
+        self._snapshot_path = Path(snapshot_path) if snapshot_path is not None else None
+        self._lock = threading.RLock()
+        self._schemas: Dict[int, Schema] = {}
+        self._versions: Dict[Tuple[str, int], RegisteredSchema] = {}
+        self._latest: Dict[str, RegisteredSchema] = {}
+        self._lookups: Dict[Tuple[str, str, bool], RegisteredSchema] = {}
+        self._registered: Dict[Tuple[str, str, bool], int] = {}
+        if self._snapshot_path is not None and self._snapshot_path.exists():
+            self.load()
+        self._stop = threading.Event()
+        self._refresher: Optional[threading.Thread] = None
+        if refresh_interval is not None:
+            self._refresher = threading.Thread(
+                target=self._refresh_periodically, args=(refresh_interval,), name=type(self).__name__, daemon=True
+            )
+            self._refresher.start()
+
+    def get_schema(self, schema_id: int) -> Schema:
+        schema = self._schemas.get(schema_id)
+        if schema is None:
+            schema = super().get_schema(schema_id)
+            with self._lock:
+                self._schemas[schema_id] = schema
+        return schema
+
+    def get_version(self, subject_name: str, version: int) -> RegisteredSchema:
+        registered = self._versions.get((subject_name, version))
+        if registered is None:
+            registered = super().get_version(subject_name, version)
+            self._remember(registered)
+        return registered
+
+    def get_latest_version(self, subject_name: str) -> RegisteredSchema:
+        registered = self._latest.get(subject_name)
+        if registered is None:
+            registered = super().get_latest_version(subject_name)
+            self._remember(registered, latest=True)
+        return registered
+
+    def lookup_schema(self, subject_name: str, schema: Schema, normalize_schemas: bool = False) -> RegisteredSchema:
+        key = (subject_name, schema.schema_str, normalize_schemas)
+        registered = self._lookups.get(key)
+        if registered is None:
+            registered = super().lookup_schema(subject_name, schema, normalize_schemas)
+            with self._lock:
+                self._lookups[key] = registered
+                self._schemas.setdefault(registered.schema_id, schema)
+        return registered
+
+    def register_schema(self, subject_name: str, schema: Schema, normalize_schemas: bool = False) -> int:
+        key = (subject_name, schema.schema_str, normalize_schemas)
+        schema_id = self._registered.get(key)
+        if schema_id is None:
+            schema_id = super().register_schema(subject_name, schema, normalize_schemas)
+            with self._lock:
+                self._registered[key] = schema_id
+                self._schemas.setdefault(schema_id, schema)
+        return schema_id
+
+    def _remember(self, registered: RegisteredSchema, latest: bool = False) -> bool:
+        """
+        Caches a subject version, returns whether it is a new latest version.
+        """
+        with self._lock:
+            self._versions[(registered.subject, registered.version)] = registered
+            self._schemas.setdefault(registered.schema_id, registered.schema)
+            if not latest:
+                return False
+            previous = self._latest.get(registered.subject)
+            self._latest[registered.subject] = registered
+            return previous is None or previous.version != registered.version
+
+    def warm_up(self, subjects: Iterable[str] = (), schema_ids: Iterable[int] = ()):
+        """
+        Fetches every version of the `subjects` and the `schema_ids` not cached yet, then saves the snapshot.
+        Subjects already known, e.g. from the snapshot, are kept up to date by `refresh()` instead.
+        """
+        for subject in subjects:
+            if subject in self._latest:
+                continue
+            for version in super().get_versions(subject):
+                self.get_version(subject, version)
+            self.get_latest_version(subject)
+        for schema_id in schema_ids:
+            self.get_schema(schema_id)
+        if self._snapshot_path is not None:
+            self.save()
+
+    def refresh(self) -> List[RegisteredSchema]:
+        """
+        Fetches the latest version of every subject whose latest version is cached.
+        Saves the snapshot if any of them has changed.
+        :return: The new latest versions.
+        """
+        updated = []
+        for subject in list(self._latest):
+            registered = super().get_latest_version(subject)
+            if self._remember(registered, latest=True):
+                logger.info(f"New version {registered.version} of subject {subject}, schema id {registered.schema_id}")
+                updated.append(registered)
+        if updated and self._snapshot_path is not None:
+            self.save()
+        return updated
+
+    def _refresh_periodically(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.refresh()
+            except Exception as exc:
+                logger.warning(f"Failed to refresh the schema registry cache: {exc}")
+
+    def save(self, path: Union[None, str, Path] = None):
+        """
+        Writes the cached schemas to `path`, the snapshot path by default. The file is replaced atomically.
+        """
+        path = Path(path or self._snapshot_path)
+        with self._lock:
+            snapshot = {
+                "schemas": [
+                    {"id": schema_id, **_schema_to_json(schema)} for schema_id, schema in self._schemas.items()
+                ],
+                "versions": [_registered_to_json(registered) for registered in self._versions.values()],
+                "latest": [_registered_to_json(registered) for registered in self._latest.values()],
+                # the registry's schema string may differ from the looked up one, e.g. normalized
+                "lookups": [
+                    {
+                        "lookup": {"subject": subject, "schema": schema_str, "normalize": normalize},
+                        **_registered_to_json(registered),
+                    }
+                    for (subject, schema_str, normalize), registered in self._lookups.items()
+                ],
+                "registered": [
+                    {"subject": subject, "schema": schema_str, "normalize": normalize, "id": schema_id}
+                    for (subject, schema_str, normalize), schema_id in self._registered.items()
+                ],
+            }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        with open(tmp_path, "wb") as file:
+            file.write(orjson.dumps(snapshot))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+
+    def load(self, path: Union[None, str, Path] = None):
+        """
+        Adds the schemas saved in `path`, the snapshot path by default, to the cache.
+        An unreadable snapshot is logged and ignored.
+        """
+        path = Path(path or self._snapshot_path)
+        try:
+            snapshot = orjson.loads(path.read_bytes())
+            schemas = {data["id"]: _schema_from_json(data) for data in snapshot.get("schemas", [])}
+            versions = [_registered_from_json(data) for data in snapshot.get("versions", [])]
+            latest = [_registered_from_json(data) for data in snapshot.get("latest", [])]
+            lookups = {
+                _lookup_key(data.get("lookup", data)): _registered_from_json(data)
+                for data in snapshot.get("lookups", [])
+            }
+            registered = {
+                (data["subject"], data["schema"], data["normalize"]): data["id"]
+                for data in snapshot.get("registered", [])
+            }
+        except (OSError, ValueError, KeyError, TypeError) as exc:
+            logger.warning(f"Ignoring unreadable schema registry snapshot {path}: {exc}")
+            return
+        with self._lock:
+            self._schemas.update(schemas)
+            self._versions.update(((version.subject, version.version), version) for version in versions)
+            self._latest.update((version.subject, version) for version in latest)
+            self._lookups.update(lookups)
+            self._registered.update(registered)
+
+    def close(self):
+        """
+        Stops the background refresh.
+        """
+        self._stop.set()
+        if self._refresher is not None:
+            self._refresher.join()
+
+    def __exit__(self, *args):
+        self.close()
+        super().__exit__(*args)
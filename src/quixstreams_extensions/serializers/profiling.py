@@ -0,0 +1,186 @@
+"""
+Per-step profiling of composed serializers.
+
+`composed(..., profile=True)` (or the `QUIXSTREAMS_EXTENSIONS_PROFILE` environment variable) times every step
+of the chain. `profile=0.01` times one call out of a hundred only, the other calls run the regular compiled chain,
+so profiling can stay enabled in production.
+"""
+
+import os
+from collections import deque
+from time import perf_counter
+from typing import Any, Callable, List, Optional, Sequence, Union
+
+ENV_VARIABLE = "QUIXSTREAMS_EXTENSIONS_PROFILE"
+
+# latencies kept per step to compute percentiles
+RESERVOIR_SIZE = 4096
+
+
+def sample_rate(profile: Union[None, bool, float]) -> float:
+    """
+    Turns the `profile` argument of `composed()` into a sample rate, 0 meaning profiling is off.
+    When `profile` is None, `QUIXSTREAMS_EXTENSIONS_PROFILE` is read: `1`/`true` profiles every call,
+    a number between 0 and 1 is a sample rate.
+    :raises: ValueError: If the sample rate isn't between 0 and 1.
+    """
+    if profile is None:
+        value = os.environ.get(ENV_VARIABLE, "").strip().lower()
+        if value in ("", "false", "no", "off"):
+            profile = False
+        elif value in ("true", "yes", "on"):
+            profile = True
+        else:
+            profile = float(value)
+    rate = float(profile)
+    if not 0 <= rate <= 1:
+        raise ValueError(f"Profile sample rate must be between 0 and 1, got {rate}")
+    return rate
+
+
+class StepStats:
+    """
+    Timings of a single step, over the sampled calls.
+    Batch calls count once per value, with the per-value average as latency.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.exceptions = 0
+        self.seconds = 0.0
+        self._latencies: deque = deque(maxlen=RESERVOIR_SIZE)
+
+    def record(self, seconds: float, count: int = 1):
+        self.calls += count
+        self.seconds += seconds
+        self._latencies.append(seconds / count if count else seconds)
+
+    @property
+    def mean(self) -> float:
+        return self.seconds / self.calls if self.calls else 0.0
+
+    def percentile(self, percent: float) -> float:
+        """
+        Latency in seconds under which `percent`% of the latest sampled calls took.
+        """
+        if not self._latencies:
+            return 0.0
+        latencies = sorted(self._latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percent / 100))]
+
+    def reset(self):
+        self.calls = self.exceptions = 0
+        self.seconds = 0.0
+        self._latencies.clear()
+
+
+class Profile:
+    """
+    Per-step statistics of a composed serializer.
+    `calls` and `errors` count every call, the steps only the sampled ones.
+    """
+
+    def __init__(self, names: Sequence[str], rate: float):
+        self.rate = rate
+        self.steps = [StepStats(name) for name in names]
+        self.calls = 0
+        self.errors = 0
+
+    def reset(self):
+        self.calls = self.errors = 0
+        for step in self.steps:
+            step.reset()
+
+    def timed(self, idx: int, fn: Callable) -> Callable:
+        stats = self.steps[idx]
+
+        def call(*args: Any) -> Any:
+            started = perf_counter()
+            try:
+                return fn(*args)
+            except BaseException:
+                stats.exceptions += 1
+                raise
+            finally:
+                stats.record(perf_counter() - started)
+
+        return call
+
+    def timed_many(self, idx: int, many: Callable) -> Callable:
+        stats = self.steps[idx]
+
+        def call(values: List[Any], ctxs: Sequence[Any]) -> List[Any]:
+            started = perf_counter()
+            try:
+                return many(values, ctxs)
+            except BaseException:
+                stats.exceptions += 1
+                raise
+            finally:
+                stats.record(perf_counter() - started, len(values))
+
+        return call
+
+    def sampled(self, fast: Callable, timed: Callable) -> Callable:
+        """
+        Calls `timed` once every `1 / rate` calls and `fast` otherwise, counting calls and errors of both.
+        """
+        every = max(1, round(1 / self.rate))
+        countdown = 0
+
+        def call(*args: Any) -> Any:
+            nonlocal countdown
+            self.calls += 1
+            if countdown:
+                countdown -= 1
+                fn = fast
+            else:
+                countdown = every - 1
+                fn = timed
+            try:
+                return fn(*args)
+            except BaseException:
+                self.errors += 1
+                raise
+
+        return call
+
+    def table(self) -> str:
+        """
+        Renders the statistics as a text table, latencies in microseconds.
+        """
+        header = ("step", "calls", "errors", "total, ms", "mean, us", "p50, us", "p90, us", "p99, us")
+        rows = [
+            (
+                step.name,
+                str(step.calls),
+                str(step.exceptions),
+                f"{step.seconds * 1e3:.3f}",
+                f"{step.mean * 1e6:.1f}",
+                *(f"{step.percentile(percent) * 1e6:.1f}" for percent in (50, 90, 99)),
+            )
+            for step in self.steps
+        ]
+        widths = [max(len(row[column]) for row in [header, *rows]) for column in range(len(header))]
+        lines = [
+            " | ".join(
+                cell.ljust(width) if column == 0 else cell.rjust(width)
+                for column, (cell, width) in enumerate(zip(row, widths))
+            )
+            for row in [header, *rows]
+        ]
+        lines.insert(1, "-+-".join("-" * width for width in widths))
+        lines.append(f"{self.calls} calls, {self.errors} errors, sample rate {self.rate:g}")
+        return "\n".join(lines)
+
+    def __str__(self) -> str:
+        return self.table()
+
+
+def maybe_profile(names: Sequence[str], profile: Union[None, bool, float]) -> Optional[Profile]:
+    """
+    Makes a `Profile` for the given step names if profiling is enabled, see `sample_rate`.
+    """
+    rate = sample_rate(profile)
+    return Profile(names, rate) if rate else None
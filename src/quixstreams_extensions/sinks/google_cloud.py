@@ -1,22 +1,118 @@
-import time
-from pathlib import Path
-from typing import Optional, Callable, Any, Union, List, Tuple, Dict
-from operator import attrgetter
+from typing import Optional, Callable, Any, Union, List, Tuple, Sequence
 
+from google.api_core import exceptions as google_exceptions
 from google.cloud import firestore
-from google.cloud.firestore_v1 import CollectionReference, DocumentReference, WriteBatch
+from google.cloud.firestore_v1 import CollectionReference, DocumentReference
 from quixstreams.models import SerializationContext
-from quixstreams.sinks import BatchingSink, SinkBatch
 from quixstreams.sinks.base.item import SinkItem
-from rocksdict import Rdict, WriteBatch as RocksDictWriteBatch
 
+from quixstreams_extensions.sinks.kv import (
+    AsyncKeyValueFlatSink,
+    AsyncKeyValueNestedSink,
+    Backend,
+    BackendCapabilities,
+    KeyValueFlatSink,
+    KeyValueNestedSink,
+    Write,
+)
+from quixstreams_extensions.sinks.kv import CacheStats, KeyCache, NodeCache, node_cache  # noqa: F401 - moved to kv
+from quixstreams_extensions.sinks.metrics import SinkMetrics
 
-class GoogleFirestoreFlatSink(BatchingSink):
+# Firestore rejects batched writes of more than 500 operations
+MAX_BATCH_SIZE = 500
+
+_RETRYABLE_ERRORS = (
+    google_exceptions.Aborted,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+)
+
+
+class FirestoreBackend(Backend):
+    """
+    Writes documents with a `firestore.Client`, or a `firestore.AsyncClient` when `asynchronous`.
+    Chunks are committed as batched writes of at most 500 operations, nodes are listed with collection group queries.
+    """
+
+    retryable_errors = _RETRYABLE_ERRORS
+
+    def __init__(self, client: Union[firestore.Client, firestore.AsyncClient], asynchronous: bool = False):
+        self.client = client
+        self.capabilities = BackendCapabilities(MAX_BATCH_SIZE, supports_merge=True, supports_async=asynchronous)
+
+    def collection(self, path: str) -> CollectionReference:
+        return self.client.collection(path)
+
+    def document(self, path: str) -> DocumentReference:
+        return self.client.document(path)
+
+    def _batch(self, chunk: Sequence[Write]):
+        db_batch = self.client.batch()
+        for write in chunk:
+            if write.merge:
+                db_batch.set(write.document, write.data, merge=True)
+            else:
+                db_batch.set(write.document, write.data)
+        return db_batch
+
+    def commit(self, chunk: Sequence[Write]):
+        self._batch(chunk).commit()
+
+    async def commit_async(self, chunk: Sequence[Write]):
+        await self._batch(chunk).commit()
+
+    def _query(self, collection_name: str):
+        return self.client.collection_group(collection_name).select([])
+
+    def list_nodes(self, collection_name: str) -> List[str]:
+        """
+        Lists the paths of every document of the collections named `collection_name`, with one paged query.
+        """
+        return [snapshot.reference.path for snapshot in self._query(collection_name).stream()]
+
+    async def list_nodes_async(self, collection_name: str) -> List[str]:
+        return [snapshot.reference.path async for snapshot in self._query(collection_name).stream()]
+
+
+async def _make_async_client() -> firestore.AsyncClient:
+    # the client's channel binds to the loop it is created on
+    return firestore.AsyncClient()
+
+
+class _FirestoreClient:
+    """
+    Exposes the Firestore client of the sink's backend.
+    """
+
+    @property
+    def _db(self):
+        return self._backend.client
+
+
+class GoogleFirestoreFlatSink(_FirestoreClient, KeyValueFlatSink):
     """
     A simple key-value sink.
     It puts all data as a flat structure into a specified collection.
-    Guarantees one Firestore write per message.
+    Guarantees at most one Firestore write per message.
     Doesn't perform any Firestore reads.
+
+    With `deduplicate=True` only the last message per document in a batch is written,
+    the ones before it are not even serialized.
+    `merge` writes values as partial updates (`set(..., merge=True)`);
+    when deduplicating, values of the same document are then folded into one by the merge function,
+    `merge=True` folds them the way Firestore merges fields.
+
+    Writes are committed in chunks of at most `batch_size` (500 at most, Firestore's limit),
+    up to `max_concurrent_commits` chunks at a time. Writes to the same document are always applied in order.
+    A chunk failing with a transient error is retried up to `commit_retries` times,
+    waiting `commit_backoff` seconds before the first retry and twice as long before each next one.
+
+    With `key_cache_size`, up to that many serialized keys are kept across batches and repeated keys
+    are serialized once, see `KeyCache`.
+
+    This is `KeyValueFlatSink` with a `FirestoreBackend`.
     """
 
     def __init__(
@@ -25,38 +121,46 @@ class GoogleFirestoreFlatSink(BatchingSink):
         client: Optional[firestore.Client] = None,
         key: Optional[Callable[[SinkItem], str]] = None,
         key_serializer: Optional[Callable[[Any, SerializationContext], str]] = None,
+        key_cache_size: int = 0,
         value: Optional[Callable[[SinkItem], str]] = None,
         value_serializer: Optional[Callable[[Any, SerializationContext], dict]] = None,
+        deduplicate: bool = False,
+        merge: Union[bool, Callable[[dict, dict], dict]] = False,
+        batch_size: int = MAX_BATCH_SIZE,
+        max_concurrent_commits: int = 4,
+        commit_retries: int = 3,
+        commit_backoff: float = 0.5,
+        max_buffered_bytes: Optional[int] = None,
+        metrics: Optional[SinkMetrics] = None,
     ):
-        super().__init__()
-        self._db = client or firestore.Client()
-        self._collection = (
-            collection if isinstance(collection, CollectionReference) else self._db.collection(collection)
+        super().__init__(
+            collection=collection,
+            backend=FirestoreBackend(client or firestore.Client()),
+            key=key,
+            key_serializer=key_serializer,
+            key_cache_size=key_cache_size,
+            value=value,
+            value_serializer=value_serializer,
+            deduplicate=deduplicate,
+            merge=merge,
+            batch_size=batch_size,
+            max_concurrent_commits=max_concurrent_commits,
+            commit_retries=commit_retries,
+            commit_backoff=commit_backoff,
+            max_buffered_bytes=max_buffered_bytes,
+            metrics=metrics,
         )
-        self._key = key or attrgetter("key")
-        self._key_serializer = key_serializer
-        self._value = value or attrgetter("value")
-        self._value_serializer = value_serializer
-
-    def write(self, batch: SinkBatch):
-        db_batch = self._db.batch()
-        for item in batch:
-            ctx = SerializationContext(batch.topic, headers=item.headers)
-            key = self._key_serializer(self._key(item), ctx) if self._key_serializer else self._key(item)
-            value = self._value_serializer(self._value(item), ctx) if self._value_serializer else self._value(item)
 
-            db_batch.set(self._collection.document(key), value)
-        db_batch.commit()
 
-
-class GoogleFirestoreNestedSink(BatchingSink):
+class GoogleFirestoreNestedSink(_FirestoreClient, KeyValueNestedSink):
     """
-    A comprehensive sink that allows putting data into a nested tree-like structure.
+    A comprehensive sink that allows putting data into a nested tree-like structure of Firestore collections.
     May perform more Firestore writes than incoming messages due to serving nested structure creation.
-    Doesn't perform any Firestore reads.
+    Doesn't perform any Firestore reads, except with `rebuild_depth > 0`: then a partition's assignment
+    lists the existing nodes with collection group queries.
 
     Example:
-        Imagine you have a SinkItem like:
+        With SinkItems like:
 
         {
            "key": {"user_id": 3640832, 'store_number': 123},
@@ -65,16 +169,6 @@ class GoogleFirestoreNestedSink(BatchingSink):
            "headers": None
         }
 
-        And you would like to keep a logical structure of your data, like a tree structure:
-
-        stores
-        "123"  -> daily
-                  "2024-07-13"  ->  balance-per-user-id
-                                    "3640832"           -> {"balance": 100}
-
-        All you need is to define **collections_structure**,
-        a path to the deepest node as a list of collection items via its name and key:
-
         GoogleFirestoreNestedSink(
             [
                 ("stores", get_store_key),
@@ -85,7 +179,11 @@ class GoogleFirestoreNestedSink(BatchingSink):
             ]
         )
 
-        Where `get_store_key`, `get_day_key` and `get_user_key` are Callable[[SinkItem], str]
+        writes {"balance": 100} to `stores/123/daily/2024-07-13/balance-per-user/3640832`,
+        creating the `stores/123` and `stores/123/daily/2024-07-13` nodes the first time.
+
+    This is `KeyValueNestedSink` with a `FirestoreBackend`, see it for how nodes are cached in RocksDB
+    and rebuilt with collection group queries on rebalances.
     """
 
     def __init__(
@@ -95,79 +193,134 @@ class GoogleFirestoreNestedSink(BatchingSink):
         value: Optional[Callable[[SinkItem], dict]] = None,
         value_serializer: Optional[Callable[[Any, SerializationContext], dict]] = None,
         state_dir: str = "state",
+        node_cache_size: int = 100_000,
+        node_ttl: Optional[int] = None,
+        rebuild_depth: int = 0,
+        drop_revoked_state: bool = False,
+        deduplicate: bool = False,
+        merge: Union[bool, Callable[[dict, dict], dict]] = False,
+        batch_size: int = MAX_BATCH_SIZE,
+        max_concurrent_commits: int = 4,
+        commit_retries: int = 3,
+        commit_backoff: float = 0.5,
+        max_buffered_bytes: Optional[int] = None,
+        metrics: Optional[SinkMetrics] = None,
     ):
-        super().__init__()
-        self._collections_structure = collections_structure
-        self._db = client or firestore.Client()
-        self._value = value or attrgetter("value")
-        self._value_serializer = value_serializer
-
-        # rocks db keep track of what nodes has been already created, to reduce amount of Firestore writes
-        self._cache_db = self._init_rocksdb(str(Path(state_dir).absolute()))
-        self._cache: Dict[str, Rdict] = {}
-
-    def __del__(self):
-        if self._cache_db is not None:
-            self._cache_db.close()
-
-    @classmethod
-    def _init_rocksdb(cls, state_dir) -> Rdict:
-        attempt = 1
-        open_max_retries = 10
-        while True:
-            try:
-                db = Rdict(str((Path(state_dir) / cls.__name__).absolute()))
-                return db
-            except Exception as exc:
-                is_locked = str(exc).lower().startswith("io error")
-                if not is_locked:
-                    raise
-                if open_max_retries <= 0 or attempt >= open_max_retries:
-                    raise
-                attempt += 1
-                time.sleep(3)
-
-    def _init_column_family(self, topic: str) -> Rdict:
-        if topic not in self._cache:
-            try:
-                return self._cache_db.get_column_family(topic)
-            except Exception:
-                return self._cache_db.create_column_family(topic)
-
-    def _get_last_document(
+        super().__init__(
+            collections_structure=collections_structure,
+            backend=FirestoreBackend(client or firestore.Client()),
+            value=value,
+            value_serializer=value_serializer,
+            state_dir=state_dir,
+            node_cache_size=node_cache_size,
+            node_ttl=node_ttl,
+            rebuild_depth=rebuild_depth,
+            drop_revoked_state=drop_revoked_state,
+            deduplicate=deduplicate,
+            merge=merge,
+            batch_size=batch_size,
+            max_concurrent_commits=max_concurrent_commits,
+            commit_retries=commit_retries,
+            commit_backoff=commit_backoff,
+            max_buffered_bytes=max_buffered_bytes,
+            metrics=metrics,
+        )
+
+
+class AsyncGoogleFirestoreFlatSink(_FirestoreClient, AsyncKeyValueFlatSink):
+    """
+    `GoogleFirestoreFlatSink` committing with `firestore.AsyncClient` on a dedicated event loop,
+    see `kv._AsyncCommits` for how batches are pipelined.
+    """
+
+    def __init__(
         self,
-        batch: WriteBatch,
-        item: SinkItem,
-        rocks_db: Rdict,
-        in_mem_cache: dict,
-        rocks_db_batch: RocksDictWriteBatch,
-    ) -> DocumentReference:
-        cache_key = ""
-        last_document_ref = self._db
-        for collection_name, document_key_cb in self._collections_structure:
-            document_key = document_key_cb(item)
-            cache_key += f"/{collection_name}/{document_key}"
-            last_document_ref = self._db.document(cache_key[1:])
-            if cache_key not in in_mem_cache and cache_key not in rocks_db:
-                # no worries if it exists in Firestore, we need to populate the cache
-                batch.set(last_document_ref, {".tap": True})
-                in_mem_cache[cache_key] = True
-                rocks_db_batch[cache_key] = True
-        return last_document_ref
-
-    def write(self, batch: SinkBatch):
-        db_batch = self._db.batch()
-        if batch.topic not in self._cache:
-            self._cache[batch.topic] = self._init_column_family(batch.topic)
-        in_mem_cache = {}
-        wb = RocksDictWriteBatch()
-        for item in batch:
-            if self._value_serializer:
-                ctx = SerializationContext(batch.topic, headers=item.headers)
-                value = self._value_serializer(self._value(item), ctx)
-            else:
-                value = self._value(item)
-            document_ref = self._get_last_document(db_batch, item, self._cache[batch.topic], in_mem_cache, wb)
-            db_batch.set(document_ref, value)
-        db_batch.commit()
-        self._cache_db.write(wb)
+        collection: Union[str, CollectionReference],
+        client: Optional[firestore.AsyncClient] = None,
+        key: Optional[Callable[[SinkItem], str]] = None,
+        key_serializer: Optional[Callable[[Any, SerializationContext], str]] = None,
+        key_cache_size: int = 0,
+        value: Optional[Callable[[SinkItem], str]] = None,
+        value_serializer: Optional[Callable[[Any, SerializationContext], dict]] = None,
+        deduplicate: bool = False,
+        merge: Union[bool, Callable[[dict, dict], dict]] = False,
+        batch_size: int = MAX_BATCH_SIZE,
+        max_in_flight: int = 4,
+        commit_retries: int = 3,
+        commit_backoff: float = 0.5,
+        max_buffered_bytes: Optional[int] = None,
+        max_in_flight_bytes: Optional[int] = None,
+        backpressure_delay: float = 5.0,
+        metrics: Optional[SinkMetrics] = None,
+    ):
+        super().__init__(
+            collection=collection,
+            backend=FirestoreBackend(client or self._run(_make_async_client()).result(), asynchronous=True),
+            key=key,
+            key_serializer=key_serializer,
+            key_cache_size=key_cache_size,
+            value=value,
+            value_serializer=value_serializer,
+            deduplicate=deduplicate,
+            merge=merge,
+            batch_size=batch_size,
+            max_in_flight=max_in_flight,
+            commit_retries=commit_retries,
+            commit_backoff=commit_backoff,
+            max_buffered_bytes=max_buffered_bytes,
+            max_in_flight_bytes=max_in_flight_bytes,
+            backpressure_delay=backpressure_delay,
+            metrics=metrics,
+        )
+
+
+class AsyncGoogleFirestoreNestedSink(_FirestoreClient, AsyncKeyValueNestedSink):
+    """
+    `GoogleFirestoreNestedSink` committing with `firestore.AsyncClient` on a dedicated event loop,
+    see `kv._AsyncCommits` for how batches are pipelined.
+    Nodes being created by a pending batch aren't created again by the next ones.
+    """
+
+    def __init__(
+        self,
+        collections_structure: List[Tuple[str, Callable[[SinkItem], str]]],
+        client: Optional[firestore.AsyncClient] = None,
+        value: Optional[Callable[[SinkItem], dict]] = None,
+        value_serializer: Optional[Callable[[Any, SerializationContext], dict]] = None,
+        state_dir: str = "state",
+        node_cache_size: int = 100_000,
+        node_ttl: Optional[int] = None,
+        rebuild_depth: int = 0,
+        drop_revoked_state: bool = False,
+        deduplicate: bool = False,
+        merge: Union[bool, Callable[[dict, dict], dict]] = False,
+        batch_size: int = MAX_BATCH_SIZE,
+        max_in_flight: int = 4,
+        commit_retries: int = 3,
+        commit_backoff: float = 0.5,
+        max_buffered_bytes: Optional[int] = None,
+        max_in_flight_bytes: Optional[int] = None,
+        backpressure_delay: float = 5.0,
+        metrics: Optional[SinkMetrics] = None,
+    ):
+        super().__init__(
+            collections_structure=collections_structure,
+            backend=FirestoreBackend(client or self._run(_make_async_client()).result(), asynchronous=True),
+            value=value,
+            value_serializer=value_serializer,
+            state_dir=state_dir,
+            node_cache_size=node_cache_size,
+            node_ttl=node_ttl,
+            rebuild_depth=rebuild_depth,
+            drop_revoked_state=drop_revoked_state,
+            deduplicate=deduplicate,
+            merge=merge,
+            batch_size=batch_size,
+            max_in_flight=max_in_flight,
+            commit_retries=commit_retries,
+            commit_backoff=commit_backoff,
+            max_buffered_bytes=max_buffered_bytes,
+            max_in_flight_bytes=max_in_flight_bytes,
+            backpressure_delay=backpressure_delay,
+            metrics=metrics,
+        )
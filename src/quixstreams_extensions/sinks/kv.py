@@ -0,0 +1,1170 @@
+"""
+A key-value sink core, independent of the store it writes to.
+
+Sinks turn batches of messages into writes of documents addressed by a path, like `users/42`
+or `stores/123/daily/2024-07-13`: they extract and serialize keys and values, deduplicate and merge writes,
+create the nodes of nested paths once, and commit the writes in chunks, retrying transient errors.
+
+A `Backend` applies chunks of writes to a store. Its `BackendCapabilities` drive how the sinks batch them:
+chunks hold at most `max_batch_size` writes, at most `max_concurrent_commits` of them are committed at a time,
+merging writes is rejected without `supports_merge`, and only `supports_async` backends can be committed
+on an event loop by the async sinks.
+
+`FirestoreBackend` (see `google_cloud`) and `SQLiteBackend` (see `local`) implement it.
+"""
+
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from operator import attrgetter
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple, Type, Union
+
+from quixstreams.models import SerializationContext
+from quixstreams.sinks import BatchingSink, SinkBackpressureError, SinkBatch
+from quixstreams.sinks.base.item import SinkItem
+from rocksdict import Rdict, WriteBatch as RocksDictWriteBatch
+
+from quixstreams_extensions.serializers.composer import call_many
+from quixstreams_extensions.sinks.metrics import NOOP, SinkMetrics
+from quixstreams_extensions.sinks.state import open_state_store
+
+logger = logging.getLogger(__name__)
+
+# what a buffered message holds besides its key and value: the `SinkItem`, its headers, timestamp and offset
+_ITEM_OVERHEAD = 150
+
+
+class BackendCapabilities(NamedTuple):
+    """
+    What a backend supports, which drives how the sinks batch their writes.
+
+    :param max_batch_size: Most writes the backend commits at once, the limit and default of `batch_size`.
+    :param supports_merge: Whether writes can be merged into existing documents, required by `merge`.
+    :param supports_async: Whether the backend commits with coroutines, required by the async sinks.
+    :param max_concurrent_commits: Most chunks worth committing at a time, e.g. one for single-writer stores,
+        unbounded if None.
+    """
+
+    max_batch_size: int
+    supports_merge: bool = True
+    supports_async: bool = False
+    max_concurrent_commits: Optional[int] = None
+
+
+class Write(NamedTuple):
+    """
+    A write of `data` into the document `document`, merged into the existing fields with `merge`.
+    """
+
+    document: Any
+    data: dict
+    merge: bool = False
+
+
+class Backend(ABC):
+    """
+    A key-value store the sinks write documents into.
+
+    Documents are addressed by paths alternating collection names and keys, like `stores/123/users/42`.
+    References returned by `document()` are what `commit()` gets back in `Write.document`
+    and must expose that path as `.path`.
+    """
+
+    capabilities: BackendCapabilities
+    # transient errors of `commit()`, retried with a backoff
+    retryable_errors: Tuple[Type[BaseException], ...] = ()
+
+    @abstractmethod
+    def collection(self, path: str) -> Any:
+        """
+        Returns a reference to the collection at `path`, whose `.document(key)` returns the references of its documents.
+        """
+
+    @abstractmethod
+    def document(self, path: str) -> Any:
+        """
+        Returns a reference to the document at `path`.
+        """
+
+    @abstractmethod
+    def commit(self, chunk: Sequence[Write]):
+        """
+        Applies a chunk of at most `max_batch_size` writes, in order and atomically.
+        """
+
+    async def commit_async(self, chunk: Sequence[Write]):
+        """
+        Like `commit()`, to be implemented by `supports_async` backends.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def list_nodes(self, collection_name: str) -> List[str]:
+        """
+        Lists the paths of every document of the collections named `collection_name`, whatever their parents.
+        """
+
+    async def list_nodes_async(self, collection_name: str) -> List[str]:
+        """
+        Like `list_nodes()`, to be implemented by `supports_async` backends.
+        """
+        raise NotImplementedError
+
+
+def _serialization_contexts(topic: str, items: List[SinkItem]) -> List[SerializationContext]:
+    """
+    Builds a context per item. Items without headers share a single context,
+    which lets batch-aware serializers process them in one go.
+    """
+    shared = SerializationContext(topic)
+    return [SerializationContext(topic, headers=item.headers) if item.headers else shared for item in items]
+
+
+class CacheStats(NamedTuple):
+    hits: int
+    store_hits: int
+    misses: int
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.store_hits + self.misses
+        return (self.hits + self.store_hits) / lookups if lookups else 0.0
+
+
+class NodeCache:
+    """
+    A thread-safe, size-bounded set of nodes known to exist in the store, least recently used ones evicted first.
+    Sits in front of the RocksDB cache of the nested sinks and survives across batches.
+
+    `hits` counts nodes found in memory, `store_hits` nodes found in RocksDB only and `misses` unknown nodes.
+    """
+
+    def __init__(self, max_size: int):
+        if max_size < 0:
+            raise ValueError("max_size must not be negative")
+        self.max_size = max_size
+        self._nodes: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = self._store_hits = self._misses = 0
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    @property
+    def stats(self) -> CacheStats:
+        return CacheStats(self._hits, self._store_hits, self._misses)
+
+    def contains(self, topic: str, path: str, store: Optional[Rdict] = None) -> bool:
+        """
+        Checks whether a node is known, looking it up in `store` when it isn't in memory.
+
+        :param topic: topic the node has been created for
+        :param path: path of the node
+        :param store: RocksDB column family of the topic
+        """
+        key = (topic, path)
+        with self._lock:
+            if key in self._nodes:
+                self._nodes.move_to_end(key)
+                self._hits += 1
+                return True
+        if store is not None and path in store:
+            self._store_hits += 1
+            self.add(topic, [path])
+            return True
+        self._misses += 1
+        return False
+
+    def add(self, topic: str, paths: Sequence[str]):
+        """
+        Remembers nodes, to be called once they have been committed to the store.
+        """
+        with self._lock:
+            for path in paths:
+                self._nodes[(topic, path)] = None
+                self._nodes.move_to_end((topic, path))
+            while len(self._nodes) > self.max_size:
+                self._nodes.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._nodes.clear()
+
+
+_node_caches: Dict[str, NodeCache] = {}
+_node_caches_lock = threading.Lock()
+
+
+def node_cache(state_path: str, max_size: int) -> NodeCache:
+    """
+    Returns the process-wide node cache of a RocksDB state, creating it with `max_size` on first use.
+    """
+    with _node_caches_lock:
+        if state_path not in _node_caches:
+            _node_caches[state_path] = NodeCache(max_size)
+        return _node_caches[state_path]
+
+
+class KeyCache:
+    """
+    A size-bounded table of serialized keys per topic, least recently used ones evicted first,
+    for topics where the same keys come again and again, like compacted ones.
+
+    Keys missing from the table are serialized in one `call_many` per batch, each distinct key once,
+    sharing a single context without headers: the key serializer must not depend on them.
+    Unhashable keys are serialized every time.
+    """
+
+    def __init__(self, max_size: int):
+        if max_size < 1:
+            raise ValueError("max_size must be at least one")
+        self.max_size = max_size
+        self._keys: "OrderedDict[Tuple[str, Any], Any]" = OrderedDict()
+        self._hits = self._misses = 0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @property
+    def stats(self) -> CacheStats:
+        return CacheStats(self._hits, 0, self._misses)
+
+    def serialize(
+        self, topic: str, keys: List[Any], serializer: Callable[[Any, SerializationContext], Any]
+    ) -> List[Any]:
+        """
+        Returns the serialized keys, in the order of `keys`.
+        """
+        serialized: List[Any] = [None] * len(keys)
+        missing: Dict[Tuple[str, Any], List[int]] = {}
+        uncacheable: List[int] = []
+        for idx, key in enumerate(keys):
+            cache_key = (topic, key)
+            try:
+                known = cache_key in self._keys
+            except TypeError:
+                uncacheable.append(idx)
+                continue
+            if known:
+                self._keys.move_to_end(cache_key)
+                serialized[idx] = self._keys[cache_key]
+            else:
+                missing.setdefault(cache_key, []).append(idx)
+        # keys repeated within the batch are serialized once, they count as hits
+        self._hits += len(keys) - len(missing) - len(uncacheable)
+        self._misses += len(missing) + len(uncacheable)
+        if missing or uncacheable:
+            ctx = SerializationContext(topic)
+            indexes = [positions[0] for positions in missing.values()] + uncacheable
+            results = call_many(serializer, [keys[idx] for idx in indexes], [ctx] * len(indexes))
+            for (cache_key, positions), result in zip(missing.items(), results):
+                self._keys[cache_key] = result
+                for idx in positions:
+                    serialized[idx] = result
+            for idx, result in zip(uncacheable, results[len(missing) :]):
+                serialized[idx] = result
+            while len(self._keys) > self.max_size:
+                self._keys.popitem(last=False)
+        return serialized
+
+    def clear(self):
+        self._keys.clear()
+
+
+def _size_of(value: Any) -> int:
+    """
+    Approximates the memory held by a key or a value: the size of the object itself, plus the sizes of the items
+    of containers and of the fields of objects. Strings shared between values, like dict keys, are counted every time.
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        return size + sum(_size_of(key) + _size_of(item) for key, item in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return size + sum(map(_size_of, value))
+    fields = getattr(value, "__dict__", None)
+    return size + _size_of(fields) if fields is not None else size
+
+
+def _merge_fields(older: dict, newer: dict) -> dict:
+    """
+    Merges two values the way Firestore's `set(..., merge=True)` does: nested maps are merged, other fields replaced.
+    """
+    merged = dict(older)
+    for field, value in newer.items():
+        previous = merged.get(field)
+        merged[field] = (
+            _merge_fields(previous, value) if isinstance(previous, dict) and isinstance(value, dict) else value
+        )
+    return merged
+
+
+def _waves(chunks: Sequence[Sequence[Write]]) -> List[List[Sequence[Write]]]:
+    """
+    Groups chunks into waves that can be committed concurrently.
+    A chunk writing a document already written by an earlier chunk is put in a later wave,
+    so writes to the same document are always applied in order.
+    """
+    waves: List[List[Sequence[Write]]] = []
+    last_wave: Dict[Any, int] = {}
+    for chunk in chunks:
+        paths = {write.document.path for write in chunk}
+        wave = max((last_wave[path] + 1 for path in paths if path in last_wave), default=0)
+        for path in paths:
+            last_wave[path] = wave
+        if wave == len(waves):
+            waves.append([])
+        waves[wave].append(chunk)
+    return waves
+
+
+class _KeyValueSink(BatchingSink):
+    """
+    Serializes values into document writes, optionally keeping only the last write per document,
+    and commits them in chunks of at most `batch_size` operations, up to `max_concurrent_commits` at a time,
+    retrying each chunk with an exponential backoff on the backend's transient errors.
+
+    `batch_size` defaults to, and can't exceed, the backend's `max_batch_size`.
+    `max_concurrent_commits` is capped by the backend's own limit, and `merge` requires `supports_merge`.
+
+    Messages are buffered until the checkpoint by default. With `max_buffered_bytes`, the approximate size
+    of a partition's buffered keys and values is tracked, and once it reaches the limit they are written right away,
+    so memory stays bounded whatever the checkpoint interval. Their offsets are still committed at the checkpoint only.
+    """
+
+    # set by `_AsyncCommits` before initialising the sink
+    _max_in_flight_bytes: Optional[int] = None
+
+    def __init__(
+        self,
+        backend: Backend,
+        value: Optional[Callable[[SinkItem], Any]] = None,
+        value_serializer: Optional[Callable[[Any, SerializationContext], dict]] = None,
+        deduplicate: bool = False,
+        merge: Union[bool, Callable[[dict, dict], dict]] = False,
+        batch_size: Optional[int] = None,
+        max_concurrent_commits: int = 4,
+        commit_retries: int = 3,
+        commit_backoff: float = 0.5,
+        max_buffered_bytes: Optional[int] = None,
+        metrics: Optional[SinkMetrics] = None,
+    ):
+        super().__init__()
+        capabilities = backend.capabilities
+        if batch_size is None:
+            batch_size = capabilities.max_batch_size
+        if not 1 <= batch_size <= capabilities.max_batch_size:
+            raise ValueError(
+                f"batch_size must be between 1 and {capabilities.max_batch_size}, the limit of {type(backend).__name__}"
+            )
+        if merge and not capabilities.supports_merge:
+            raise ValueError(f"{type(backend).__name__} doesn't support merging writes")
+        if max_concurrent_commits < 1:
+            raise ValueError("max_concurrent_commits must be at least one")
+        if max_buffered_bytes is not None and max_buffered_bytes < 1:
+            raise ValueError("max_buffered_bytes must be at least one")
+        self._backend = backend
+        self._value = value or attrgetter("value")
+        self._value_serializer = value_serializer
+        self._deduplicate = deduplicate
+        self._merge: Optional[Callable[[dict, dict], dict]] = _merge_fields if merge is True else (merge or None)
+        self._batch_size = batch_size
+        self._max_concurrent_commits = min(
+            max_concurrent_commits, capabilities.max_concurrent_commits or max_concurrent_commits
+        )
+        self._commit_retries = commit_retries
+        self._commit_backoff = commit_backoff
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._metrics = metrics or NOOP
+        self._name = type(self).__name__
+        self._max_buffered_bytes = max_buffered_bytes
+        self._tracks_bytes = max_buffered_bytes is not None or self._max_in_flight_bytes is not None
+        self._buffered: Dict[Tuple[str, int], int] = {}
+
+    @property
+    def backend(self) -> Backend:
+        return self._backend
+
+    @property
+    def buffered_bytes(self) -> int:
+        """
+        The approximate size of the messages buffered for every partition, if tracked.
+        """
+        return sum(self._buffered.values())
+
+    def add(
+        self,
+        value: Any,
+        key: Any,
+        timestamp: int,
+        headers: List[Tuple[str, Any]],
+        topic: str,
+        partition: int,
+        offset: int,
+    ):
+        super().add(value, key, timestamp, headers, topic, partition, offset)
+        if self._tracks_bytes:
+            tp = (topic, partition)
+            buffered = self._buffered[tp] = self._buffered.get(tp, 0) + _ITEM_OVERHEAD + _size_of(key) + _size_of(value)
+            if self._max_buffered_bytes is not None and buffered >= self._max_buffered_bytes:
+                self._write_partial(topic, partition)
+
+    def _write_partial(self, topic: str, partition: int):
+        """
+        Writes the messages buffered for a partition ahead of the checkpoint, which will commit their offsets.
+        """
+        batch = self._batches.pop((topic, partition))
+        self._buffered.pop((topic, partition), None)
+        self.write(batch)
+
+    def flush(self, topic: str, partition: int):
+        self._buffered.pop((topic, partition), None)
+        super().flush(topic, partition)
+
+    def on_paused(self, topic: str, partition: int):
+        self._buffered.pop((topic, partition), None)
+        super().on_paused(topic, partition)
+
+    def _timed(self, topic: str, phase: str, fn: Callable, *args):
+        if not self._metrics.enabled:
+            return fn(*args)
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self._metrics.observe_phase(self._name, topic, phase, time.perf_counter() - started)
+
+    def _values(self, items: List[SinkItem], ctxs: List[SerializationContext]) -> List[Any]:
+        values = [self._value(item) for item in items]
+        if self._value_serializer:
+            values = call_many(self._value_serializer, values, ctxs)
+        return values
+
+    def _writes(
+        self,
+        topic: str,
+        documents: List[Any],
+        items: List[SinkItem],
+        ctxs: List[SerializationContext],
+    ) -> List[Write]:
+        """
+        Serializes the values of `items` into writes of the matching `documents`.
+        When deduplicating, values superseded by a later item of the same document are not even serialized,
+        unless there is a merge function to fold them into the last one.
+        """
+        if self._deduplicate:
+            # items of a batch come in offset order, so the last one per document wins
+            positions: Dict[str, List[int]] = {}
+            for idx, document in enumerate(documents):
+                positions.setdefault(document.path, []).append(idx)
+            groups = list(positions.values())
+            if self._merge is None:
+                groups = [group[-1:] for group in groups]
+        else:
+            groups = [[idx] for idx in range(len(items))]
+
+        selected = [idx for group in groups for idx in group]
+        if self._deduplicate:
+            items = [items[idx] for idx in selected]
+            ctxs = [ctxs[idx] for idx in selected]
+        values = self._timed(topic, "serialize", self._values, items, ctxs)
+
+        merge = self._merge is not None
+        if len(selected) == len(groups):
+            return [Write(documents[group[0]], value, merge) for group, value in zip(groups, values)]
+        writes = []
+        values_iter = iter(values)
+        for group in groups:
+            data = next(values_iter)
+            for _ in group[1:]:
+                data = self._merge(data, next(values_iter))
+            writes.append(Write(documents[group[0]], data, merge))
+        return writes
+
+    def _retry_delay(self, attempt: int, chunk: Sequence[Write], exc: Exception) -> Optional[float]:
+        """
+        Returns how long to wait before retrying a failed chunk, or None if it shouldn't be retried anymore.
+        """
+        if attempt >= self._commit_retries:
+            return None
+        delay = self._commit_backoff * 2**attempt
+        self._metrics.observe_retry(self._name, exc)
+        logger.warning(
+            f"Retrying {type(self._backend).__name__} commit of {len(chunk)} writes in {delay}s, "
+            f"attempt {attempt + 1}: {exc}"
+        )
+        return delay
+
+    def _commit_chunk(self, chunk: Sequence[Write]):
+        attempt = 0
+        while True:
+            try:
+                self._backend.commit(chunk)
+                return
+            except self._backend.retryable_errors as exc:
+                delay = self._retry_delay(attempt, chunk, exc)
+                if delay is None:
+                    raise
+                attempt += 1
+                time.sleep(delay)
+
+    def _chunks(self, writes: List[Write]) -> List[List[Write]]:
+        return [writes[idx : idx + self._batch_size] for idx in range(0, len(writes), self._batch_size)]
+
+    def _commit(self, writes: List[Write]):
+        for wave in _waves(self._chunks(writes)):
+            if len(wave) == 1 or self._max_concurrent_commits == 1:
+                for chunk in wave:
+                    self._commit_chunk(chunk)
+                continue
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    self._max_concurrent_commits, thread_name_prefix=type(self).__name__
+                )
+            # wait for every chunk before raising, so a failed flush leaves no commit running behind
+            done, _ = wait([self._executor.submit(self._commit_chunk, chunk) for chunk in wave])
+            for future in done:
+                future.result()
+
+    @abstractmethod
+    def _prepare(self, batch: SinkBatch) -> Tuple[List[Write], List[str]]:
+        """
+        Turns a batch into the writes to commit and the cache keys of the nodes they create.
+        """
+
+    def close(self):
+        """
+        Releases the sink's resources, to be called when the application stops.
+        The backend is left open, it may be shared with other sinks.
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def on_assigned(self, topic: str, partition: int):
+        """
+        Called when the consumer is assigned a partition, see `notify_rebalances`.
+        """
+
+    def on_revoked(self, topic: str, partition: int):
+        """
+        Called when a partition is revoked from the consumer or lost, see `notify_rebalances`.
+        Drops what is left of the partition's messages, the checkpoint has been committed already.
+        """
+        self.on_paused(topic, partition)
+
+    def _committed(self, topic: str, partition: int, created: List[str]):
+        """
+        Called once the writes of a batch have been committed.
+        """
+
+    def _plan(self, batch: SinkBatch) -> Tuple[List[Write], List[str]]:
+        writes, created = self._prepare(batch)
+        if self._metrics.enabled:
+            self._metrics.observe_batch(self._name, batch.topic, batch.size, len(writes))
+        return writes, created
+
+    def write(self, batch: SinkBatch):
+        writes, created = self._plan(batch)
+        self._timed(batch.topic, "commit", self._commit, writes)
+        self._committed(batch.topic, batch.partition, created)
+
+
+class KeyValueFlatSink(_KeyValueSink):
+    """
+    A simple key-value sink.
+    It puts all data as a flat structure into a collection of the backend,
+    given by its path or by a reference returned by the backend.
+    Guarantees at most one write per message and doesn't perform any reads.
+
+    With `deduplicate=True` only the last message per document in a batch is written,
+    the ones before it are not even serialized.
+    `merge` writes values as partial updates of the existing documents;
+    when deduplicating, values of the same document are then folded into one by the merge function,
+    `merge=True` folds them the way Firestore merges fields.
+
+    Writes are committed in chunks of at most `batch_size`, up to `max_concurrent_commits` chunks at a time.
+    Writes to the same document are always applied in order.
+    A chunk failing with a transient error is retried up to `commit_retries` times,
+    waiting `commit_backoff` seconds before the first retry and twice as long before each next one.
+
+    With `key_cache_size`, up to that many serialized keys are kept across batches and repeated keys
+    are serialized once, see `KeyCache`.
+    """
+
+    def __init__(
+        self,
+        collection: Any,
+        backend: Backend,
+        key: Optional[Callable[[SinkItem], str]] = None,
+        key_serializer: Optional[Callable[[Any, SerializationContext], str]] = None,
+        key_cache_size: int = 0,
+        value: Optional[Callable[[SinkItem], str]] = None,
+        value_serializer: Optional[Callable[[Any, SerializationContext], dict]] = None,
+        deduplicate: bool = False,
+        merge: Union[bool, Callable[[dict, dict], dict]] = False,
+        batch_size: Optional[int] = None,
+        max_concurrent_commits: int = 4,
+        commit_retries: int = 3,
+        commit_backoff: float = 0.5,
+        max_buffered_bytes: Optional[int] = None,
+        metrics: Optional[SinkMetrics] = None,
+    ):
+        super().__init__(
+            backend=backend,
+            value=value,
+            value_serializer=value_serializer,
+            deduplicate=deduplicate,
+            merge=merge,
+            batch_size=batch_size,
+            max_concurrent_commits=max_concurrent_commits,
+            commit_retries=commit_retries,
+            commit_backoff=commit_backoff,
+            max_buffered_bytes=max_buffered_bytes,
+            metrics=metrics,
+        )
+        self._collection = backend.collection(collection) if isinstance(collection, str) else collection
+        self._key = key or attrgetter("key")
+        self._key_serializer = key_serializer
+        self._key_cache = KeyCache(key_cache_size) if key_serializer and key_cache_size else None
+
+    @property
+    def key_cache(self) -> Optional[KeyCache]:
+        return self._key_cache
+
+    def _keys(self, topic: str, items: List[SinkItem], ctxs: List[SerializationContext]) -> List[str]:
+        keys = [self._key(item) for item in items]
+        if self._key_cache is not None:
+            return self._key_cache.serialize(topic, keys, self._key_serializer)
+        if self._key_serializer:
+            keys = call_many(self._key_serializer, keys, ctxs)
+        return keys
+
+    def _prepare(self, batch: SinkBatch) -> Tuple[List[Write], List[str]]:
+        items = list(batch)
+        ctxs = _serialization_contexts(batch.topic, items)
+        keys = self._timed(batch.topic, "key", self._keys, batch.topic, items, ctxs)
+        documents = [self._collection.document(key) for key in keys]
+        return self._writes(batch.topic, documents, items, ctxs), []
+
+
+class KeyValueNestedSink(_KeyValueSink):
+    """
+    A comprehensive sink that allows putting data into a nested tree-like structure.
+    May perform more writes than incoming messages due to serving nested structure creation.
+    Doesn't perform any reads, except with `rebuild_depth > 0`: then a partition's assignment
+    lists the existing nodes with `list_nodes`.
+
+    Example:
+        Imagine you have a SinkItem like:
+
+        {
+           "key": {"user_id": 3640832, 'store_number': 123},
+           "value": {"balance": 100},
+           "timestamp": 1720828800000,
+           "headers": None
+        }
+
+        And you would like to keep a logical structure of your data, like a tree structure:
+
+        stores
+        "123"  -> daily
+                  "2024-07-13"  ->  balance-per-user-id
+                                    "3640832"           -> {"balance": 100}
+
+        All you need is to define **collections_structure**,
+        a path to the deepest node as a list of collection items via its name and key:
+
+        KeyValueNestedSink(
+            [
+                ("stores", get_store_key),
+
+                ("daily", get_day_key),
+
+                ("balance-per-user", get_user_key),
+            ],
+            backend,
+        )
+
+        Where `get_store_key`, `get_day_key` and `get_user_key` are Callable[[SinkItem], str]
+
+    Writes, including the nodes creation, are committed in chunks like in `KeyValueFlatSink`,
+    `deduplicate` and `merge` apply to the deepest documents the same way.
+
+    Created nodes are cached in two tiers: an in-memory LRU of `node_cache_size` nodes,
+    shared by the sinks of the process using the same `state_dir`, in front of RocksDB.
+    RocksDB is the `StateStore` of `state_dir`, shared by the sinks of the process too,
+    with a column family per sink, topic and partition. Call `close()` when the application stops to release it.
+    With `node_ttl` (seconds), RocksDB drops nodes older than that during compactions,
+    so e.g. daily-partitioned trees don't accumulate forever.
+    A node dropped from both tiers is just created again.
+    The sinks sharing a `state_dir` must use the same `node_ttl`.
+    The per-sink databases of earlier versions, `state_dir/<sink class name>`, are not read.
+
+    Nodes are kept per partition in RocksDB. With `rebuild_depth`, a newly assigned partition without any
+    is warmed up by listing the existing nodes of the first `rebuild_depth` levels, one `list_nodes` query
+    per level, e.g. `rebuild_depth=2` lists every store and day but no user. With `drop_revoked_state`,
+    the nodes of a revoked partition are dropped instead of kept for when the partition comes back.
+    Both need the sink to be notified of rebalances, see `notify_rebalances`.
+    """
+
+    def __init__(
+        self,
+        collections_structure: List[Tuple[str, Callable[[SinkItem], str]]],
+        backend: Backend,
+        value: Optional[Callable[[SinkItem], dict]] = None,
+        value_serializer: Optional[Callable[[Any, SerializationContext], dict]] = None,
+        state_dir: str = "state",
+        node_cache_size: int = 100_000,
+        node_ttl: Optional[int] = None,
+        rebuild_depth: int = 0,
+        drop_revoked_state: bool = False,
+        deduplicate: bool = False,
+        merge: Union[bool, Callable[[dict, dict], dict]] = False,
+        batch_size: Optional[int] = None,
+        max_concurrent_commits: int = 4,
+        commit_retries: int = 3,
+        commit_backoff: float = 0.5,
+        max_buffered_bytes: Optional[int] = None,
+        metrics: Optional[SinkMetrics] = None,
+    ):
+        super().__init__(
+            backend=backend,
+            value=value,
+            value_serializer=value_serializer,
+            deduplicate=deduplicate,
+            merge=merge,
+            batch_size=batch_size,
+            max_concurrent_commits=max_concurrent_commits,
+            commit_retries=commit_retries,
+            commit_backoff=commit_backoff,
+            max_buffered_bytes=max_buffered_bytes,
+            metrics=metrics,
+        )
+        if not 0 <= rebuild_depth <= len(collections_structure):
+            raise ValueError("rebuild_depth must be between 0 and the depth of collections_structure")
+        self._collections_structure = collections_structure
+        self._rebuild_depth = rebuild_depth
+        self._drop_revoked_state = drop_revoked_state
+
+        # rocks db keep track of what nodes has been already created, to reduce amount of writes
+        self._state = open_state_store(state_dir, node_ttl)
+        self._node_cache = node_cache(self._state.path, node_cache_size)
+        legacy_path = Path(state_dir) / self._name
+        if legacy_path.is_dir():
+            logger.warning(
+                f"Ignoring the node cache of an earlier version at {legacy_path.absolute()}, "
+                f"nodes are written again once, delete it once upgraded"
+            )
+
+    def close(self):
+        super().close()
+        self._state.close()
+
+    @property
+    def node_cache(self) -> NodeCache:
+        return self._node_cache
+
+    def _column_family(self, topic: str, partition: int) -> str:
+        return f"{self._name}:{topic}:{partition}"
+
+    def _list_nodes(self, collection_name: str) -> List[str]:
+        return self._backend.list_nodes(collection_name)
+
+    def on_assigned(self, topic: str, partition: int):
+        """
+        With `rebuild_depth`, fills an empty RocksDB column family of the partition with the nodes
+        of the first `rebuild_depth` levels existing in the store, listed level by level,
+        instead of writing them again as the partition's messages come.
+        """
+        if not self._rebuild_depth:
+            return
+        rocks_db = self._state.column_family(self._column_family(topic, partition))
+        if next(iter(rocks_db.keys()), None) is not None:
+            return
+        wb = RocksDictWriteBatch()
+        wb.set_default_column_family(self._state.handle(self._column_family(topic, partition)))
+        nodes = 0
+        names = [collection_name for collection_name, _ in self._collections_structure]
+        for depth in range(1, self._rebuild_depth + 1):
+            for path in self._list_nodes(names[depth - 1]):
+                parts = path.split("/")
+                # collection groups match any collection of that name, keep the ones of this tree
+                if len(parts) == 2 * depth and parts[::2] == names[:depth]:
+                    wb[f"/{path}"] = True
+                    nodes += 1
+        self._state.write(wb)
+        logger.info(
+            f"Rebuilt the node cache of {topic}[{partition}] with {nodes} nodes listed from "
+            f"{type(self._backend).__name__}"
+        )
+
+    def on_revoked(self, topic: str, partition: int):
+        """
+        Keeps the partition's RocksDB column family for when the partition comes back,
+        or drops it with `drop_revoked_state`.
+        """
+        super().on_revoked(topic, partition)
+        if self._drop_revoked_state:
+            self._state.drop_column_family(self._column_family(topic, partition))
+
+    def _is_known(self, topic: str, cache_key: str, rocks_db: Rdict) -> bool:
+        return self._node_cache.contains(topic, cache_key, rocks_db)
+
+    def _get_documents(
+        self, writes: List[Write], created: List[str], items: List[SinkItem], topic: str, rocks_db: Rdict
+    ) -> List[Any]:
+        """
+        Resolves the deepest document of every item, walking a prefix tree of the batch's paths,
+        so every node shared by several items is built and checked against the cache once per batch.
+        Adds writes creating the unknown nodes and collects their cache keys into `created`.
+        """
+        # document key -> (cache key, reference, children) per level
+        root: Dict[str, Tuple[str, Any, dict]] = {}
+        documents = []
+        lookups = 0
+        for item in items:
+            children, cache_key = root, ""
+            for collection_name, document_key_cb in self._collections_structure:
+                document_key = document_key_cb(item)
+                node = children.get(document_key)
+                if node is None:
+                    node_key = f"{cache_key}/{collection_name}/{document_key}"
+                    document_ref = self._backend.document(node_key[1:])
+                    lookups += 1
+                    if not self._is_known(topic, node_key, rocks_db):
+                        # no worries if it exists in the store, we need to populate the cache
+                        writes.append(Write(document_ref, {".tap": True}))
+                        created.append(node_key)
+                    node = children[document_key] = (node_key, document_ref, {})
+                cache_key, document_ref, children = node
+            documents.append(document_ref)
+        if self._metrics.enabled:
+            self._metrics.observe_cache(self._name, topic, lookups - len(created), len(created))
+        return documents
+
+    def _prepare(self, batch: SinkBatch) -> Tuple[List[Write], List[str]]:
+        writes: List[Write] = []
+        rocks_db = self._state.column_family(self._column_family(batch.topic, batch.partition))
+        # nodes created by this batch, cached only once committed
+        created: List[str] = []
+        items = list(batch)
+        documents = self._timed(
+            batch.topic, "nodes", self._get_documents, writes, created, items, batch.topic, rocks_db
+        )
+        writes.extend(self._writes(batch.topic, documents, items, _serialization_contexts(batch.topic, items)))
+        return writes, created
+
+    def _committed(self, topic: str, partition: int, created: List[str]):
+        if created:
+            wb = RocksDictWriteBatch()
+            wb.set_default_column_family(self._state.handle(self._column_family(topic, partition)))
+            for cache_key in created:
+                wb[cache_key] = True
+            self._timed(topic, "rocksdb", self._state.write, wb)
+            self._node_cache.add(topic, created)
+
+
+class _AsyncCommits:
+    """
+    Commits writes with the backend's coroutines on a dedicated event loop, instead of blocking the consumer.
+    Requires a `supports_async` backend.
+
+    A topic partition's batch reaching `batch_size` messages is handed over to the loop right away,
+    so the next messages are accumulated while it commits.
+    At most `max_in_flight` chunks are committed at a time and at most `max_in_flight` batches are pending,
+    adding more messages waits for the oldest pending batch otherwise.
+    `flush()` returns, letting the offsets be committed, only once every batch of the partition has been committed.
+
+    With `max_in_flight_bytes`, a partition whose batch would take the size of the pending batches beyond that
+    signals backpressure: its messages are dropped until the checkpoint, where `flush()` raises `SinkBackpressureError`.
+    The application then pauses the partition for `backpressure_delay` seconds and consumes it again
+    from the last committed offset, rewriting the documents already written since.
+    """
+
+    _batches: Dict[Tuple[str, int], SinkBatch]
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _start_loop(
+        self, backend: Backend, max_in_flight: int, max_in_flight_bytes: Optional[int], backpressure_delay: float
+    ):
+        capabilities = backend.capabilities
+        if not capabilities.supports_async:
+            raise ValueError(f"{type(backend).__name__} doesn't support async commits")
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least one")
+        if max_in_flight_bytes is not None and max_in_flight_bytes < 1:
+            raise ValueError("max_in_flight_bytes must be at least one")
+        self._max_in_flight = max_in_flight
+        self._max_in_flight_bytes = max_in_flight_bytes
+        self._backpressure_delay = backpressure_delay
+        # pending batch -> its approximate size
+        self._in_flight_sizes: Dict[Future, int] = {}
+        self._backpressured: set = set()
+        self._semaphore = self._run(
+            self._make_semaphore(min(max_in_flight, capabilities.max_concurrent_commits or max_in_flight))
+        ).result()
+        self._in_flight: Dict[Tuple[str, int], List[Future]] = {}
+        # document path -> the last chunk writing it, so writes to a document are committed in order
+        self._last_writes: Dict[Any, asyncio.Future] = {}
+
+    def _run(self, coroutine) -> Future:
+        """
+        Runs a coroutine on the sink's event loop, started on first use,
+        so e.g. clients binding to the loop they are created on can be created before the sink.
+        """
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            threading.Thread(target=self._loop.run_forever, name=type(self).__name__, daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    async def _make_semaphore(self, concurrency: int) -> asyncio.Semaphore:
+        return asyncio.Semaphore(concurrency)
+
+    async def _commit_chunk_async(self, chunk: Sequence[Write], after: List[asyncio.Future]):
+        if after:
+            await asyncio.wait(after)
+        attempt = 0
+        async with self._semaphore:
+            while True:
+                try:
+                    await self._backend.commit_async(chunk)
+                    return
+                except self._backend.retryable_errors as exc:
+                    delay = self._retry_delay(attempt, chunk, exc)
+                    if delay is None:
+                        raise
+                    attempt += 1
+                    await asyncio.sleep(delay)
+
+    def _forget(self, task: asyncio.Future, paths: set):
+        for path in paths:
+            if self._last_writes.get(path) is task:
+                del self._last_writes[path]
+
+    async def _commit_async(self, topic: str, partition: int, writes: List[Write], created: List[str]):
+        tasks = []
+        for chunk in self._chunks(writes):
+            paths = {write.document.path for write in chunk}
+            after = list({self._last_writes[path] for path in paths if path in self._last_writes})
+            task = asyncio.ensure_future(self._commit_chunk_async(chunk, after))
+            for path in paths:
+                self._last_writes[path] = task
+            task.add_done_callback(lambda done, paths=paths: self._forget(done, paths))
+            tasks.append(task)
+        try:
+            started = time.perf_counter()
+            # wait for every chunk before raising, so a failed batch leaves no commit running behind
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            if self._metrics.enabled:
+                self._metrics.observe_phase(self._name, topic, "commit", time.perf_counter() - started)
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+            self._committed(topic, partition, created)
+        finally:
+            self._settled(topic, partition, created)
+
+    def _settled(self, topic: str, partition: int, created: List[str]):
+        """
+        Called once the writes of a batch are done committing, successfully or not.
+        """
+
+    def _submit(self, batch: SinkBatch, size: int = 0):
+        pending = [future for futures in self._in_flight.values() for future in futures if not future.done()]
+        if len(pending) >= self._max_in_flight:
+            wait(pending, return_when=FIRST_COMPLETED)
+        writes, created = self._plan(batch)
+        future = self._run(self._commit_async(batch.topic, batch.partition, writes, created))
+        self._in_flight.setdefault((batch.topic, batch.partition), []).append(future)
+        if size:
+            self._in_flight_sizes[future] = size
+
+    @property
+    def in_flight_bytes(self) -> int:
+        """
+        The approximate size of the batches being committed, if tracked.
+        """
+        for future in [future for future in self._in_flight_sizes if future.done()]:
+            del self._in_flight_sizes[future]
+        return sum(self._in_flight_sizes.values())
+
+    def _write_partial(self, topic: str, partition: int):
+        tp = (topic, partition)
+        batch = self._batches.pop(tp)
+        size = self._buffered.pop(tp, 0)
+        if self._max_in_flight_bytes is not None:
+            in_flight_bytes = self.in_flight_bytes
+            if in_flight_bytes and in_flight_bytes + size > self._max_in_flight_bytes:
+                logger.warning(
+                    f"{in_flight_bytes} bytes are being committed to {type(self._backend).__name__}, "
+                    f"dropping {topic}[{partition}] until the checkpoint pauses it"
+                )
+                self._backpressured.add(tp)
+                return
+        self._submit(batch, size)
+
+    def add(
+        self,
+        value: Any,
+        key: Any,
+        timestamp: int,
+        headers: List[Tuple[str, Any]],
+        topic: str,
+        partition: int,
+        offset: int,
+    ):
+        if (topic, partition) in self._backpressured:
+            # consumed again once the partition resumes
+            return
+        super().add(value, key, timestamp, headers, topic, partition, offset)
+        batch = self._batches.get((topic, partition))
+        if batch is not None and batch.size >= self._batch_size:
+            self._write_partial(topic, partition)
+
+    def flush(self, topic: str, partition: int):
+        tp = (topic, partition)
+        batch = self._batches.pop(tp, None)
+        size = self._buffered.pop(tp, 0)
+        try:
+            if batch is not None:
+                self._submit(batch, size)
+        finally:
+            futures = self._in_flight.pop(tp, [])
+            wait(futures)
+        for future in futures:
+            future.result()
+        if tp in self._backpressured:
+            self._backpressured.discard(tp)
+            raise SinkBackpressureError(retry_after=self._backpressure_delay, topic=topic, partition=partition)
+
+    def on_paused(self, topic: str, partition: int):
+        super().on_paused(topic, partition)
+        self._backpressured.discard((topic, partition))
+        # the pending batches keep committing, but their offsets won't be
+        self._in_flight.pop((topic, partition), None)
+
+    def close(self):
+        """
+        Stops the event loop, pending commits are abandoned.
+        """
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        super().close()
+
+
+class AsyncKeyValueFlatSink(_AsyncCommits, KeyValueFlatSink):
+    """
+    `KeyValueFlatSink` committing with the backend's coroutines on a dedicated event loop,
+    see `_AsyncCommits` for how batches are pipelined.
+    """
+
+    def __init__(
+        self,
+        collection: Any,
+        backend: Backend,
+        key: Optional[Callable[[SinkItem], str]] = None,
+        key_serializer: Optional[Callable[[Any, SerializationContext], str]] = None,
+        key_cache_size: int = 0,
+        value: Optional[Callable[[SinkItem], str]] = None,
+        value_serializer: Optional[Callable[[Any, SerializationContext], dict]] = None,
+        deduplicate: bool = False,
+        merge: Union[bool, Callable[[dict, dict], dict]] = False,
+        batch_size: Optional[int] = None,
+        max_in_flight: int = 4,
+        commit_retries: int = 3,
+        commit_backoff: float = 0.5,
+        max_buffered_bytes: Optional[int] = None,
+        max_in_flight_bytes: Optional[int] = None,
+        backpressure_delay: float = 5.0,
+        metrics: Optional[SinkMetrics] = None,
+    ):
+        self._start_loop(backend, max_in_flight, max_in_flight_bytes, backpressure_delay)
+        super().__init__(
+            collection=collection,
+            backend=backend,
+            key=key,
+            key_serializer=key_serializer,
+            key_cache_size=key_cache_size,
+            value=value,
+            value_serializer=value_serializer,
+            deduplicate=deduplicate,
+            merge=merge,
+            batch_size=batch_size,
+            max_concurrent_commits=max_in_flight,
+            commit_retries=commit_retries,
+            commit_backoff=commit_backoff,
+            max_buffered_bytes=max_buffered_bytes,
+            metrics=metrics,
+        )
+
+
+class AsyncKeyValueNestedSink(_AsyncCommits, KeyValueNestedSink):
+    """
+    `KeyValueNestedSink` committing with the backend's coroutines on a dedicated event loop,
+    see `_AsyncCommits` for how batches are pipelined.
+    Nodes being created by a pending batch aren't created again by the next ones.
+    """
+
+    def __init__(
+        self,
+        collections_structure: List[Tuple[str, Callable[[SinkItem], str]]],
+        backend: Backend,
+        value: Optional[Callable[[SinkItem], dict]] = None,
+        value_serializer: Optional[Callable[[Any, SerializationContext], dict]] = None,
+        state_dir: str = "state",
+        node_cache_size: int = 100_000,
+        node_ttl: Optional[int] = None,
+        rebuild_depth: int = 0,
+        drop_revoked_state: bool = False,
+        deduplicate: bool = False,
+        merge: Union[bool, Callable[[dict, dict], dict]] = False,
+        batch_size: Optional[int] = None,
+        max_in_flight: int = 4,
+        commit_retries: int = 3,
+        commit_backoff: float = 0.5,
+        max_buffered_bytes: Optional[int] = None,
+        max_in_flight_bytes: Optional[int] = None,
+        backpressure_delay: float = 5.0,
+        metrics: Optional[SinkMetrics] = None,
+    ):
+        self._start_loop(backend, max_in_flight, max_in_flight_bytes, backpressure_delay)
+        self._pending_nodes: set = set()
+        super().__init__(
+            collections_structure=collections_structure,
+            backend=backend,
+            value=value,
+            value_serializer=value_serializer,
+            state_dir=state_dir,
+            node_cache_size=node_cache_size,
+            node_ttl=node_ttl,
+            rebuild_depth=rebuild_depth,
+            drop_revoked_state=drop_revoked_state,
+            deduplicate=deduplicate,
+            merge=merge,
+            batch_size=batch_size,
+            max_concurrent_commits=max_in_flight,
+            commit_retries=commit_retries,
+            commit_backoff=commit_backoff,
+            max_buffered_bytes=max_buffered_bytes,
+            metrics=metrics,
+        )
+
+    def _is_known(self, topic: str, cache_key: str, rocks_db: Rdict) -> bool:
+        return (topic, cache_key) in self._pending_nodes or super()._is_known(topic, cache_key, rocks_db)
+
+    def _prepare(self, batch: SinkBatch) -> Tuple[List[Write], List[str]]:
+        writes, created = super()._prepare(batch)
+        self._pending_nodes.update((batch.topic, cache_key) for cache_key in created)
+        return writes, created
+
+    def _settled(self, topic: str, partition: int, created: List[str]):
+        self._pending_nodes.difference_update((topic, cache_key) for cache_key in created)
+
+    def _list_nodes(self, collection_name: str) -> List[str]:
+        return self._run(self._backend.list_nodes_async(collection_name)).result()
@@ -0,0 +1,132 @@
+"""
+A local backend of the key-value sinks, see `kv`.
+
+`SQLiteBackend` keeps documents in an SQLite database, a file or memory, with Firestore's semantics:
+chunks are committed atomically, merges fold nested maps like `set(..., merge=True)` and nodes are listed
+like collection group queries. It lets the sinks run offline, e.g. to benchmark them or in integration tests,
+or to keep a queryable local copy of a topic.
+"""
+
+import pickle
+import sqlite3
+import threading
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from quixstreams_extensions.sinks.kv import Backend, BackendCapabilities, Write, _merge_fields
+
+_SCHEMA = """
+PRAGMA journal_mode = WAL;
+PRAGMA synchronous = NORMAL;
+CREATE TABLE IF NOT EXISTS documents (
+    path TEXT PRIMARY KEY,
+    collection TEXT NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_collection ON documents (collection);
+"""
+
+
+class LocalDocument(NamedTuple):
+    path: str
+
+
+class LocalCollection(NamedTuple):
+    path: str
+
+    def document(self, key: str) -> LocalDocument:
+        return LocalDocument(f"{self.path}/{key}")
+
+
+def _collection_name(path: str) -> str:
+    return path.rsplit("/", 2)[-2]
+
+
+class SQLiteBackend(Backend):
+    """
+    Stores every document as a row of `documents`, its path as the primary key and its fields pickled,
+    with the name of its collection indexed for `list_nodes`.
+
+    Commits are serialized, SQLite having a single writer, so the sinks commit one chunk at a time.
+    The database is journaled ahead of writes and synced at checkpoints only: a crash of the machine may lose
+    the last commits, but not corrupt the database.
+    `max_batch_size` defaults to Firestore's limit, for the sinks to chunk writes the same way.
+
+    :param path: Path of the database file, in memory by default.
+    :param max_batch_size: Most writes committed in one transaction.
+    """
+
+    def __init__(self, path: str = ":memory:", max_batch_size: int = 500):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least one")
+        self.path = path
+        self.capabilities = BackendCapabilities(max_batch_size, supports_merge=True, max_concurrent_commits=1)
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def collection(self, path: str) -> LocalCollection:
+        return LocalCollection(path)
+
+    def document(self, path: str) -> LocalDocument:
+        return LocalDocument(path)
+
+    def _row(self, path: str, data: dict) -> Tuple[str, str, bytes]:
+        return path, _collection_name(path), pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+
+    def commit(self, chunk: Sequence[Write]):
+        with self._lock:
+            cursor = self._connection.cursor()
+            cursor.execute("BEGIN")
+            try:
+                if any(write.merge for write in chunk):
+                    for write in chunk:
+                        data = write.data
+                        if write.merge:
+                            existing = cursor.execute(
+                                "SELECT data FROM documents WHERE path = ?", (write.document.path,)
+                            ).fetchone()
+                            if existing is not None:
+                                data = _merge_fields(pickle.loads(existing[0]), data)
+                        cursor.execute(
+                            "INSERT OR REPLACE INTO documents VALUES (?, ?, ?)", self._row(write.document.path, data)
+                        )
+                else:
+                    cursor.executemany(
+                        "INSERT OR REPLACE INTO documents VALUES (?, ?, ?)",
+                        [self._row(write.document.path, write.data) for write in chunk],
+                    )
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+            cursor.execute("COMMIT")
+
+    def list_nodes(self, collection_name: str) -> List[str]:
+        with self._lock:
+            rows = self._connection.execute("SELECT path FROM documents WHERE collection = ?", (collection_name,))
+            return [path for (path,) in rows]
+
+    def get(self, path: str) -> Optional[dict]:
+        """
+        Returns the fields of the document at `path`, or None if there is no such document.
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT data FROM documents WHERE path = ?", (path,)).fetchone()
+        return pickle.loads(row[0]) if row is not None else None
+
+    def documents(self, prefix: str = "") -> Dict[str, dict]:
+        """
+        Returns every document whose path starts with `prefix`, by path.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT path, data FROM documents WHERE substr(path, 1, ?) = ? ORDER BY path", (len(prefix), prefix)
+            ).fetchall()
+        return {path: pickle.loads(data) for path, data in rows}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT count(*) FROM documents").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,177 @@
+"""
+Instrumentation of the Firestore and key-value sinks.
+
+A sink reports to a `SinkMetrics`:
+- how long every phase of a batch takes: `key` (key extraction and serialization), `serialize` (values),
+  `nodes` (nested sink paths and node-cache lookups), `commit` (Firestore or another backend)
+  and `rocksdb` (node-cache persistence),
+- batch sizes and how many writes they turned into, i.e. the write amplification of the nested sink,
+- node-cache hits and misses,
+- commit retries.
+
+The default `NoopSinkMetrics` is disabled, sinks then don't even read the clock.
+`PrometheusSinkMetrics` and `OpenTelemetrySinkMetrics` adapt it to `prometheus_client` and `opentelemetry`,
+which have to be installed separately.
+"""
+
+import time
+from typing import Any, Optional, Protocol
+
+PHASES = ("key", "serialize", "nodes", "commit", "rocksdb")
+
+
+class SinkMetrics(Protocol):
+    enabled: bool
+
+    def observe_phase(self, sink: str, topic: str, phase: str, seconds: float) -> None: ...
+
+    def observe_batch(self, sink: str, topic: str, messages: int, writes: int) -> None: ...
+
+    def observe_cache(self, sink: str, topic: str, hits: int, misses: int) -> None: ...
+
+    def observe_retry(self, sink: str, error: BaseException) -> None: ...
+
+
+class NoopSinkMetrics:
+    """
+    Records nothing, the default of every sink.
+    """
+
+    enabled = False
+
+    def observe_phase(self, sink: str, topic: str, phase: str, seconds: float) -> None:
+        pass
+
+    def observe_batch(self, sink: str, topic: str, messages: int, writes: int) -> None:
+        pass
+
+    def observe_cache(self, sink: str, topic: str, hits: int, misses: int) -> None:
+        pass
+
+    def observe_retry(self, sink: str, error: BaseException) -> None:
+        pass
+
+
+NOOP = NoopSinkMetrics()
+
+
+class PrometheusSinkMetrics:
+    """
+    Exposes the sink metrics with `prometheus_client`:
+
+    - `<namespace>_sink_phase_seconds` histogram, labelled by sink, topic and phase
+    - `<namespace>_sink_batch_messages` histogram, labelled by sink and topic
+    - `<namespace>_sink_messages_total` and `<namespace>_sink_writes_total` counters,
+      their ratio is the write amplification
+    - `<namespace>_sink_node_cache_hits_total` and `<namespace>_sink_node_cache_misses_total` counters
+    - `<namespace>_sink_commit_retries_total` counter, labelled by sink and error
+    """
+
+    enabled = True
+
+    def __init__(self, registry: Optional[Any] = None, namespace: str = "quixstreams_extensions"):
+        """
+        :param registry: `prometheus_client.CollectorRegistry`, the default registry if omitted
+        :param namespace: prefix of the metric names
+        """
+        import prometheus_client
+
+        options = {"namespace": namespace, "registry": registry or prometheus_client.REGISTRY}
+        self._phase_seconds = prometheus_client.Histogram(
+            "sink_phase_seconds", "Time spent in a phase of a sink batch", ["sink", "topic", "phase"], **options
+        )
+        self._batch_messages = prometheus_client.Histogram(
+            "sink_batch_messages",
+            "Messages per sink batch",
+            ["sink", "topic"],
+            buckets=(1, 10, 50, 100, 500, 1_000, 5_000, 10_000, 50_000, float("inf")),
+            **options,
+        )
+        self._messages = prometheus_client.Counter(
+            "sink_messages", "Messages written by a sink", ["sink", "topic"], **options
+        )
+        self._writes = prometheus_client.Counter(
+            "sink_writes", "Firestore writes issued by a sink", ["sink", "topic"], **options
+        )
+        self._cache_hits = prometheus_client.Counter(
+            "sink_node_cache_hits", "Nodes found in the node cache", ["sink", "topic"], **options
+        )
+        self._cache_misses = prometheus_client.Counter(
+            "sink_node_cache_misses", "Nodes missing from the node cache", ["sink", "topic"], **options
+        )
+        self._retries = prometheus_client.Counter(
+            "sink_commit_retries", "Retried Firestore commits", ["sink", "error"], **options
+        )
+
+    def observe_phase(self, sink: str, topic: str, phase: str, seconds: float) -> None:
+        self._phase_seconds.labels(sink, topic, phase).observe(seconds)
+
+    def observe_batch(self, sink: str, topic: str, messages: int, writes: int) -> None:
+        self._batch_messages.labels(sink, topic).observe(messages)
+        self._messages.labels(sink, topic).inc(messages)
+        self._writes.labels(sink, topic).inc(writes)
+
+    def observe_cache(self, sink: str, topic: str, hits: int, misses: int) -> None:
+        self._cache_hits.labels(sink, topic).inc(hits)
+        self._cache_misses.labels(sink, topic).inc(misses)
+
+    def observe_retry(self, sink: str, error: BaseException) -> None:
+        self._retries.labels(sink, type(error).__name__).inc()
+
+
+class OpenTelemetrySinkMetrics:
+    """
+    Records the sink metrics with an OpenTelemetry meter, under the same names as `PrometheusSinkMetrics`
+    in dotted form (`sink.phase.duration`, `sink.batch.messages`, `sink.messages`, `sink.writes`,
+    `sink.node_cache.hits`, `sink.node_cache.misses`, `sink.commit.retries`).
+    With a tracer, every phase is also recorded as a span.
+    """
+
+    enabled = True
+
+    def __init__(self, meter: Optional[Any] = None, tracer: Optional[Any] = None):
+        """
+        :param meter: `opentelemetry.metrics.Meter`, a meter of the global provider if omitted
+        :param tracer: `opentelemetry.trace.Tracer` to record phases as spans with
+        """
+        if meter is None:
+            from opentelemetry import metrics
+
+            meter = metrics.get_meter(__name__)
+        self._tracer = tracer
+        self._phase_duration = meter.create_histogram(
+            "sink.phase.duration", unit="s", description="Time spent in a phase of a sink batch"
+        )
+        self._batch_messages = meter.create_histogram("sink.batch.messages", description="Messages per sink batch")
+        self._messages = meter.create_counter("sink.messages", description="Messages written by a sink")
+        self._writes = meter.create_counter("sink.writes", description="Firestore writes issued by a sink")
+        self._cache_hits = meter.create_counter("sink.node_cache.hits", description="Nodes found in the node cache")
+        self._cache_misses = meter.create_counter(
+            "sink.node_cache.misses", description="Nodes missing from the node cache"
+        )
+        self._retries = meter.create_counter("sink.commit.retries", description="Retried Firestore commits")
+
+    def observe_phase(self, sink: str, topic: str, phase: str, seconds: float) -> None:
+        attributes = {"sink": sink, "topic": topic, "phase": phase}
+        self._phase_duration.record(seconds, attributes)
+        if self._tracer is not None:
+            # the phase has just ended, the span is recorded after the fact
+            end_time = time.time_ns()
+            span = self._tracer.start_span(
+                f"{sink}.{phase}", start_time=end_time - int(seconds * 1e9), attributes=attributes
+            )
+            span.end(end_time=end_time)
+
+    def observe_batch(self, sink: str, topic: str, messages: int, writes: int) -> None:
+        attributes = {"sink": sink, "topic": topic}
+        self._batch_messages.record(messages, attributes)
+        self._messages.add(messages, attributes)
+        self._writes.add(writes, attributes)
+
+    def observe_cache(self, sink: str, topic: str, hits: int, misses: int) -> None:
+        attributes = {"sink": sink, "topic": topic}
+        self._cache_hits.add(hits, attributes)
+        self._cache_misses.add(misses, attributes)
+
+    def observe_retry(self, sink: str, error: BaseException) -> None:
+        self._retries.add(1, {"sink": sink, "error": type(error).__name__})
@@ -0,0 +1,330 @@
+"""
+A sink writing messages to Parquet files, locally or to any fsspec filesystem (`gs://`, `s3://`, `memory://`, ...).
+"""
+
+import logging
+import os
+import time
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from enum import Enum
+from operator import attrgetter
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type, Union, get_args, get_origin
+
+import fsspec
+import orjson
+import pyarrow as pa
+import pyarrow.parquet as pq
+from quixstreams.models import SerializationContext
+from quixstreams.sinks import BatchingSink, SinkBatch
+from quixstreams.sinks.base.item import SinkItem
+
+from quixstreams_extensions.serializers.composer import call_many
+
+try:
+    from pydantic import BaseModel
+except ImportError:  # pydantic is an optional extra, needed to derive a schema from a model only
+    BaseModel = None
+
+logger = logging.getLogger(__name__)
+
+_AVRO_PRIMITIVES = {
+    "null": pa.null(),
+    "boolean": pa.bool_(),
+    "int": pa.int32(),
+    "long": pa.int64(),
+    "float": pa.float32(),
+    "double": pa.float64(),
+    "bytes": pa.binary(),
+    "string": pa.string(),
+}
+_AVRO_LOGICAL_TYPES = {
+    "date": pa.date32(),
+    "time-millis": pa.time32("ms"),
+    "time-micros": pa.time64("us"),
+    "timestamp-millis": pa.timestamp("ms", tz="UTC"),
+    "timestamp-micros": pa.timestamp("us", tz="UTC"),
+    "local-timestamp-millis": pa.timestamp("ms"),
+    "local-timestamp-micros": pa.timestamp("us"),
+    "uuid": pa.string(),
+}
+
+
+def _avro_type(schema: Any, named: Dict[str, pa.DataType], namespace: Optional[str] = None) -> Tuple[pa.DataType, bool]:
+    """
+    Converts an Avro type to an Arrow type, returns it with whether it is nullable.
+    Named types are kept in `named` by name and full name, the enclosing `namespace` being inherited.
+    """
+    if isinstance(schema, list):
+        types = [member for member in schema if member != "null"]
+        if len(types) != 1:
+            raise ValueError(f"Only unions of a type with null are supported, got {schema}")
+        return _avro_type(types[0], named, namespace)[0], len(types) != len(schema)
+    if isinstance(schema, str):
+        if schema in _AVRO_PRIMITIVES:
+            return _AVRO_PRIMITIVES[schema], schema == "null"
+        if schema in named:
+            return named[schema], False
+        raise ValueError(f"Unknown Avro type {schema}")
+
+    logical_type = schema.get("logicalType")
+    if logical_type == "decimal":
+        return pa.decimal128(schema["precision"], schema.get("scale", 0)), False
+    if logical_type in _AVRO_LOGICAL_TYPES:
+        return _AVRO_LOGICAL_TYPES[logical_type], False
+
+    avro_type = schema["type"]
+    namespace = schema.get("namespace", namespace)
+    if avro_type == "record":
+        arrow_type = pa.struct(
+            [pa.field(field["name"], *_avro_type(field["type"], named, namespace)) for field in schema["fields"]]
+        )
+    elif avro_type == "enum":
+        arrow_type = pa.string()
+    elif avro_type == "fixed":
+        arrow_type = pa.binary(schema["size"])
+    elif avro_type == "array":
+        arrow_type = pa.list_(pa.field("item", *_avro_type(schema["items"], named, namespace)))
+    elif avro_type == "map":
+        arrow_type = pa.map_(pa.string(), pa.field("value", *_avro_type(schema["values"], named, namespace)))
+    else:
+        return _avro_type(avro_type, named, namespace)
+    if "name" in schema:
+        named[schema["name"]] = arrow_type
+        if namespace:
+            named[f"{namespace}.{schema['name']}"] = arrow_type
+    return arrow_type, False
+
+
+def _python_type(annotation: Any) -> Tuple[pa.DataType, bool]:
+    """
+    Converts a type annotation of a Pydantic model without an Avro schema to an Arrow type, with its nullability.
+    """
+    origin, args = get_origin(annotation), get_args(annotation)
+    if origin is Union or type(annotation).__name__ == "UnionType":
+        types = [arg for arg in args if arg is not type(None)]
+        if len(types) != 1:
+            raise ValueError(f"Only optional types are supported, got {annotation}")
+        return _python_type(types[0])[0], True
+    if origin in (list, List, tuple, set, frozenset):
+        return pa.list_(pa.field("item", *_python_type(args[0]))), False
+    if origin in (dict, Dict):
+        return pa.map_(pa.string(), pa.field("value", *_python_type(args[1]))), False
+    if isinstance(annotation, type):
+        if BaseModel is not None and issubclass(annotation, BaseModel):
+            return pa.struct(_model_fields(annotation)), False
+        if issubclass(annotation, Enum):
+            return pa.string(), False
+        for python_type, arrow_type in (
+            (bool, pa.bool_()),
+            (int, pa.int64()),
+            (float, pa.float64()),
+            (str, pa.string()),
+            (bytes, pa.binary()),
+            (datetime, pa.timestamp("us")),
+            (date, pa.date32()),
+            (Decimal, pa.decimal128(38, 18)),
+        ):
+            if issubclass(annotation, python_type):
+                return arrow_type, False
+    raise ValueError(f"Unsupported type {annotation}")
+
+
+def _model_fields(model_class: Type["BaseModel"]) -> List[pa.Field]:
+    return [
+        pa.field(info.alias or name, *_python_type(info.annotation)) for name, info in model_class.model_fields.items()
+    ]
+
+
+def arrow_schema(source: Union[pa.Schema, dict, str, Any, Type["BaseModel"]]) -> pa.Schema:
+    """
+    Derives an Arrow schema from an Avro record schema (a dict, a JSON string or a confluent `Schema`),
+    or from a Pydantic model, using its `avro_schema()` if it has one (e.g. `pydantic-avro` models).
+    """
+    if isinstance(source, pa.Schema):
+        return source
+    if isinstance(source, type) and BaseModel is not None and issubclass(source, BaseModel):
+        if not hasattr(source, "avro_schema"):
+            return pa.schema(_model_fields(source))
+        source = source.avro_schema()
+    if hasattr(source, "schema_str"):
+        source = source.schema_str
+    if isinstance(source, str):
+        source = orjson.loads(source)
+    record_type, _ = _avro_type(source, {})
+    if not pa.types.is_struct(record_type):
+        raise ValueError("The schema must describe a record")
+    return pa.schema(list(record_type))
+
+
+class _ParquetFile:
+    """
+    A Parquet file being written. Local files are written under a temporary name and renamed once closed,
+    other filesystems expose the file only once its upload completes on close.
+    """
+
+    def __init__(self, fs: fsspec.AbstractFileSystem, path: str, schema: pa.Schema, compression: str):
+        self.path = path
+        self._fs = fs
+        self._local = "file" in (fs.protocol if isinstance(fs.protocol, tuple) else (fs.protocol,))
+        self._tmp_path = f"{path.rsplit('/', 1)[0]}/.{path.rsplit('/', 1)[1]}.inprogress" if self._local else path
+        fs.makedirs(path.rsplit("/", 1)[0], exist_ok=True)
+        self._file = fs.open(self._tmp_path, "wb")
+        self._writer = pq.ParquetWriter(self._file, schema, compression=compression)
+        self.rows = 0
+        self.opened = time.monotonic()
+
+    def write(self, batch: pa.RecordBatch):
+        self._writer.write_batch(batch)
+        self.rows += batch.num_rows
+
+    def close(self):
+        self._writer.close()
+        if self._local:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._file.close()
+        if self._local:
+            self._fs.mv(self._tmp_path, self.path)
+
+    def abort(self):
+        try:
+            self._writer.close()
+            self._file.close()
+        finally:
+            if self._fs.exists(self._tmp_path):
+                self._fs.rm(self._tmp_path)
+
+
+class ParquetSink(BatchingSink):
+    """
+    Writes messages to Parquet files partitioned by topic, partition and date of the message timestamp (UTC):
+
+        <path>/topic=<topic>/partition=<partition>/date=<YYYY-MM-DD>/<first offset>.parquet
+
+    Messages are converted to Arrow and written as row groups of `row_group_size` rows as they arrive,
+    so at most `row_group_size` messages per topic partition are kept in memory.
+    A file is rolled once it holds `max_file_rows` rows or is `max_file_age` seconds old,
+    and every file is closed on `flush()`, so offsets are committed only once their files are durably closed.
+    The commit interval of the application thus bounds the age of a file too.
+
+    Values must be dicts matching the schema, e.g. produced by `avro.to_dict(...)`, or Pydantic models.
+
+    :param path: Root directory, local or any fsspec URL, e.g. `gs://bucket/events`.
+    :param schema: An Arrow schema, an Avro record schema or a Pydantic model, see `arrow_schema`.
+    :param value: Gets the value to write out of a message, its value by default.
+    :param value_serializer: Converts values to dicts, e.g. `composed(Deserializer, avro.to_dict(client))`.
+    :param row_group_size: Rows per row group.
+    :param max_file_rows: Rows after which a file is rolled.
+    :param max_file_age: Seconds after which a file is rolled, files are rolled on flush only if omitted.
+    :param compression: Parquet compression codec.
+    :param storage_options: Options of the fsspec filesystem, e.g. credentials.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        schema: Union[pa.Schema, dict, str, Any, Type["BaseModel"]],
+        value: Optional[Callable[[SinkItem], Any]] = None,
+        value_serializer: Optional[Callable[[Any, SerializationContext], dict]] = None,
+        row_group_size: int = 10_000,
+        max_file_rows: int = 1_000_000,
+        max_file_age: Optional[float] = None,
+        compression: str = "snappy",
+        storage_options: Optional[dict] = None,
+    ):
+        super().__init__()
+        if row_group_size < 1 or max_file_rows < 1:
+            raise ValueError("row_group_size and max_file_rows must be at least one")
+        self._fs, self._root = fsspec.core.url_to_fs(path, **(storage_options or {}))
+        self._root = self._root.rstrip("/")
+        self._schema = arrow_schema(schema)
+        self._value = value or attrgetter("value")
+        self._value_serializer = value_serializer
+        self._row_group_size = row_group_size
+        self._max_file_rows = max_file_rows
+        self._max_file_age = max_file_age
+        self._compression = compression
+        self._files: Dict[Tuple[str, int, str], _ParquetFile] = {}
+
+    def add(
+        self,
+        value: Any,
+        key: Any,
+        timestamp: int,
+        headers: List[Tuple[str, Any]],
+        topic: str,
+        partition: int,
+        offset: int,
+    ):
+        super().add(value, key, timestamp, headers, topic, partition, offset)
+        batch = self._batches[(topic, partition)]
+        if batch.size >= self._row_group_size:
+            del self._batches[(topic, partition)]
+            self._write_rows(batch)
+
+    def _rows(self, topic: str, items: List[SinkItem]) -> List[Any]:
+        values = [self._value(item) for item in items]
+        if self._value_serializer:
+            ctx = SerializationContext(topic)
+            values = call_many(
+                self._value_serializer,
+                values,
+                [SerializationContext(topic, headers=item.headers) if item.headers else ctx for item in items],
+            )
+        if BaseModel is not None:
+            values = [value.model_dump(by_alias=True) if isinstance(value, BaseModel) else value for value in values]
+        return values
+
+    def _file(self, topic: str, partition: int, date: str, first_offset: int) -> _ParquetFile:
+        key = (topic, partition, date)
+        file = self._files.get(key)
+        if file is not None and (
+            file.rows >= self._max_file_rows
+            or (self._max_file_age is not None and time.monotonic() - file.opened >= self._max_file_age)
+        ):
+            file.close()
+            file = None
+        if file is None:
+            path = f"{self._root}/topic={topic}/partition={partition}/date={date}/{first_offset:020d}.parquet"
+            file = self._files[key] = _ParquetFile(self._fs, path, self._schema, self._compression)
+        return file
+
+    def _write_rows(self, batch: SinkBatch):
+        by_date: Dict[str, List[SinkItem]] = {}
+        for item in batch:
+            date = datetime.fromtimestamp(item.timestamp / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
+            by_date.setdefault(date, []).append(item)
+        for date, items in by_date.items():
+            start = 0
+            while start < len(items):
+                file = self._file(batch.topic, batch.partition, date, items[start].offset)
+                # never exceed max_file_rows within a file
+                end = min(len(items), start + self._row_group_size, start + self._max_file_rows - file.rows)
+                rows = self._rows(batch.topic, items[start:end])
+                file.write(pa.RecordBatch.from_pylist(rows, schema=self._schema))
+                start = end
+
+    def _close_files(self, topic: str, partition: int, abort: bool = False):
+        for key in [key for key in self._files if key[:2] == (topic, partition)]:
+            file = self._files.pop(key)
+            if abort:
+                file.abort()
+            else:
+                file.close()
+
+    def write(self, batch: SinkBatch):
+        self._write_rows(batch)
+
+    def flush(self, topic: str, partition: int):
+        try:
+            super().flush(topic, partition)
+        except Exception:
+            self._close_files(topic, partition, abort=True)
+            raise
+        self._close_files(topic, partition)
+
+    def on_paused(self, topic: str, partition: int):
+        super().on_paused(topic, partition)
+        # the rows written since the last flush are going to be consumed again
+        self._close_files(topic, partition, abort=True)
@@ -0,0 +1,55 @@
+"""
+Notifies sinks of partition rebalances, which quixstreams doesn't do.
+
+It wraps the private rebalance callbacks of `Application`, present in the quixstreams 2.x versions
+this package depends on, and fails loudly if a quixstreams version doesn't have them.
+"""
+
+from typing import Any, List
+
+from confluent_kafka import TopicPartition
+from quixstreams import Application
+
+# the callbacks `Application` subscribes its consumer with
+_CALLBACKS = ("_on_assign", "_on_revoke", "_on_lost")
+
+
+def notify_rebalances(app: Application, *sinks: Any):
+    """
+    Calls `sink.on_assigned(topic, partition)` once the application has been assigned a partition,
+    and `sink.on_revoked(topic, partition)` once a partition has been revoked, after its checkpoint is committed,
+    or lost. To be called before `app.run()`:
+
+        sink = GoogleFirestoreNestedSink(structure, rebuild_depth=2)
+        sdf.sink(sink)
+        notify_rebalances(app, sink)
+        app.run(sdf)
+
+    :param app: The application running the sinks.
+    :param sinks: Sinks implementing `on_assigned` and `on_revoked`, like the Firestore sinks.
+    :raises: RuntimeError: If the application doesn't have the rebalance callbacks of quixstreams 2.x.
+    """
+    missing = [name for name in _CALLBACKS if not callable(getattr(app, name, None))]
+    if missing:
+        raise RuntimeError(
+            f"{type(app).__name__} has no {', '.join(missing)} rebalance callbacks, sinks can't be notified: "
+            f"this quixstreams version isn't supported, see the quixstreams dependency of quixstreams-extensions"
+        )
+    on_assign, on_revoke, on_lost = app._on_assign, app._on_revoke, app._on_lost
+
+    def assigned(consumer, topic_partitions: List[TopicPartition]):
+        on_assign(consumer, topic_partitions)
+        for tp in topic_partitions:
+            for sink in sinks:
+                sink.on_assigned(tp.topic, tp.partition)
+
+    def revoked(callback):
+        def call(consumer, topic_partitions: List[TopicPartition]):
+            callback(consumer, topic_partitions)
+            for tp in topic_partitions:
+                for sink in sinks:
+                    sink.on_revoked(tp.topic, tp.partition)
+
+        return call
+
+    app._on_assign, app._on_revoke, app._on_lost = assigned, revoked(on_revoke), revoked(on_lost)
@@ -0,0 +1,143 @@
+"""
+RocksDB state shared by the extension sinks of a process.
+
+A state directory holds a single database, opened once by the first sink using it and closed by the last one,
+with a column family per sink, topic and partition.
+"""
+
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+from rocksdict import AccessType, BlockBasedOptions, Cache, ColumnFamily, Options, Rdict, WriteBatch
+
+logger = logging.getLogger(__name__)
+
+DB_NAME = "quixstreams_extensions"
+
+
+def default_options(
+    block_cache_size: int = 64 << 20,
+    bloom_filter_bits: float = 10,
+    write_buffer_size: int = 16 << 20,
+) -> Options:
+    """
+    Options tuned for existence checks: most lookups are for keys that aren't there,
+    which whole-key bloom filters answer without reading any block.
+
+    :param block_cache_size: Bytes of the LRU cache of blocks, shared by every column family.
+    :param bloom_filter_bits: Bits per key of the bloom filters, 10 gives about 1% false positives.
+    :param write_buffer_size: Bytes of a memtable, per column family.
+    """
+    table_options = BlockBasedOptions()
+    table_options.set_block_cache(Cache(block_cache_size))
+    table_options.set_bloom_filter(bloom_filter_bits, False)
+    table_options.set_cache_index_and_filter_blocks(True)
+    table_options.set_pin_l0_filter_and_index_blocks_in_cache(True)
+    options = Options()
+    options.create_if_missing(True)
+    options.create_missing_column_families(True)
+    options.set_block_based_table_factory(table_options)
+    options.set_write_buffer_size(write_buffer_size)
+    options.set_memtable_whole_key_filtering(True)
+    options.set_memtable_prefix_bloom_ratio(0.1)
+    return options
+
+
+class StateStore:
+    """
+    A RocksDB database shared by reference, get one with `open_state_store()` and release it with `close()`.
+    Column families are created on first use, with the options of the database.
+    """
+
+    def __init__(self, path: str, ttl: Optional[int], options: Options):
+        self.path = path
+        self.ttl = ttl
+        self._options = options
+        access_type = AccessType.read_write() if ttl is None else AccessType.with_ttl(ttl)
+        # a database locked by another process fails right away, retrying wouldn't help a running consumer
+        self._db = Rdict(path, options, access_type=access_type)
+        self._column_families: Dict[str, Rdict] = {}
+        self._lock = threading.Lock()
+        self._references = 0
+
+    @property
+    def closed(self) -> bool:
+        return self._references == 0
+
+    def column_family(self, name: str) -> Rdict:
+        """
+        Returns the column family `name`, creating it if needed.
+        """
+        column_family = self._column_families.get(name)
+        if column_family is None:
+            with self._lock:
+                column_family = self._column_families.get(name)
+                if column_family is None:
+                    try:
+                        column_family = self._db.get_column_family(name)
+                    except Exception:
+                        column_family = self._db.create_column_family(name, self._options)
+                    self._column_families[name] = column_family
+        return column_family
+
+    def handle(self, name: str) -> ColumnFamily:
+        self.column_family(name)
+        return self._db.get_column_family_handle(name)
+
+    def write(self, batch: WriteBatch):
+        self._db.write(batch)
+
+    def drop_column_family(self, name: str):
+        """
+        Deletes a column family and its data, if it exists.
+        """
+        with self._lock:
+            self._column_families.pop(name, None)
+            if name in Rdict.list_cf(self.path):
+                self._db.drop_column_family(name)
+
+    def close(self):
+        """
+        Releases a reference, the database is closed once every sink using it has released it.
+        """
+        with _stores_lock:
+            if self._references == 0:
+                return
+            self._references -= 1
+            if self._references:
+                return
+            del _stores[self.path]
+        # column families hold the database open
+        self._column_families.clear()
+        self._db.close()
+        logger.debug(f"Closed state store {self.path}")
+
+
+_stores: Dict[str, StateStore] = {}
+_stores_lock = threading.Lock()
+
+
+def open_state_store(state_dir: str, ttl: Optional[int] = None, options: Optional[Options] = None) -> StateStore:
+    """
+    Returns the state store of `state_dir`, opening it if no sink of the process uses it yet.
+    Every call must be matched by a `close()` of the returned store.
+
+    To tune the database, open it with your own `options` before creating the sinks,
+    those of the first opener apply.
+
+    :param state_dir: Directory of the database.
+    :param ttl: Seconds after which keys are dropped during compactions, kept forever if omitted.
+    :param options: RocksDB options, `default_options()` if omitted.
+    :raises: ValueError: If the store is already open with another `ttl`.
+    """
+    path = str((Path(state_dir) / DB_NAME).absolute())
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = StateStore(path, ttl, options or default_options())
+        elif store.ttl != ttl:
+            raise ValueError(f"State store {path} is already open with ttl={store.ttl}")
+        store._references += 1
+    return store
@@ -0,0 +1,313 @@
+import io
+import json
+from typing import Literal, Optional
+from unittest import mock
+
+import pytest
+from confluent_kafka.serialization import MessageField, SerializationError
+from fastavro import parse_schema, schemaless_reader, schemaless_writer
+from pydantic import BaseModel, ConfigDict, ValidationError, field_validator
+from quixstreams.models import Deserializer, SerializationContext, Serializer
+
+from quixstreams_extensions.serializers.composer import composed
+from quixstreams_extensions.serializers.compositions import avro, confluent, pydantic
+
+
+def test_to_avro(mocked_schema_registry_during_serialization, schema_registry_client, schema, ctx):
+    serializer = avro.to_avro(schema_registry_client, schema)
+    assert serializer({"it": "works"}, ctx) == b"\x00\x00\x00\x00\x01\x00"
+
+
+def test_to_avro_registers_schema_once_per_topic(schema_registry_client, schema, ctx):
+    with mock.patch.object(schema_registry_client, "register_schema", return_value=1) as register_schema:
+        serializer = avro.to_avro(schema_registry_client, json.loads(schema))
+        assert serializer({"it": "works"}, ctx) == serializer({"it": "works"}, ctx) == b"\x00\x00\x00\x00\x01\x00"
+        serializer({"it": "works"}, SerializationContext("another-topic"))
+    register_schema.assert_has_calls(
+        [mock.call("any-topic-value", mock.ANY, False), mock.call("another-topic-value", mock.ANY, False)]
+    )
+    assert register_schema.call_count == 2
+
+
+def test_to_avro_registers_keys_under_key_subject(schema_registry_client, schema, ctx):
+    with mock.patch.object(schema_registry_client, "register_schema", return_value=1) as register_schema:
+        avro.to_avro(schema_registry_client, schema, field=MessageField.KEY)({"it": "works"}, ctx)
+        avro.from_instance_of(schema_registry_client, Model, schema, field=MessageField.KEY)(Model(it="works"), ctx)
+    register_schema.assert_has_calls([mock.call("any-topic-key", mock.ANY, False)] * 2)
+
+
+def test_to_avro_rejects_unknown_conf(schema_registry_client, schema):
+    with pytest.raises(ValueError):
+        avro.to_avro(schema_registry_client, schema, conf={"unknown": True})
+
+
+def test_to_dict(mocked_schema_registry_during_deserialization, schema_registry_client, ctx):
+    serializer = avro.to_dict(schema_registry_client)
+    assert serializer(b"\x00\x00\x00\x00\x01\x00", ctx) == {"it": "works"}
+
+
+def test_to_dict_with_reader_schema(mocked_schema_registry_during_deserialization, schema_registry_client, ctx):
+    reader_schema = {
+        "type": "record",
+        "name": "ExampleRecord",
+        "fields": [
+            {"name": "it", "type": {"type": "enum", "name": "ItEnum", "symbols": ["works"]}},
+            {"name": "also", "type": "string", "default": "works"},
+        ],
+    }
+    serializer = avro.to_dict(schema_registry_client, reader_schema)
+    assert serializer(b"\x00\x00\x00\x00\x01\x00", ctx) == {"it": "works", "also": "works"}
+
+
+def test_to_dict_is_compatible_with_confluent(
+    mocked_schema_registry_during_serialization,
+    mocked_schema_registry_during_deserialization,
+    schema_registry_client,
+    schema,
+    ctx,
+):
+    payload = confluent.to_avro(schema_registry_client, schema)({"it": "works"}, ctx)
+    assert avro.to_dict(schema_registry_client)(payload, ctx) == confluent.to_dict(schema_registry_client)(payload, ctx)
+
+
+@pytest.mark.parametrize("payload", (b"\x00\x00\x00\x00\x01", b"\x01\x00\x00\x00\x01\x00"))
+def test_to_dict_rejects_unframed_payload(schema_registry_client, payload, ctx):
+    with pytest.raises(SerializationError):
+        avro.to_dict(schema_registry_client)(payload, ctx)
+
+
+class Model(BaseModel):
+    it: Literal["works"]
+
+
+class ValidatedModel(BaseModel):
+    it: str
+
+    @field_validator("it")
+    @classmethod
+    def shout(cls, value: str) -> str:
+        return value.upper()
+
+
+class WiderModel(BaseModel):
+    it: str
+    also: str = "works"
+
+
+def test_to_instance_of_trusted(mocked_schema_registry_during_deserialization, schema_registry_client, ctx):
+    serializer = avro.to_instance_of(schema_registry_client, Model)
+    with mock.patch.object(Model, "model_validate") as model_validate:
+        instance = serializer(b"\x00\x00\x00\x00\x01\x00", ctx)
+    model_validate.assert_not_called()
+    assert instance == Model(it="works")
+    assert instance.model_fields_set == {"it"}
+
+
+@pytest.mark.parametrize("model_class, expected", ((ValidatedModel, "WORKS"), (WiderModel, "works")))
+def test_to_instance_of_validated(
+    mocked_schema_registry_during_deserialization, schema_registry_client, ctx, model_class, expected
+):
+    serializer = avro.to_instance_of(schema_registry_client, model_class)
+    assert serializer(b"\x00\x00\x00\x00\x01\x00", ctx).it == expected
+
+
+@pytest.mark.parametrize("model_class", (Model, WiderModel))
+def test_from_instance_of(
+    mocked_schema_registry_during_serialization, schema_registry_client, schema, ctx, model_class
+):
+    serializer = avro.from_instance_of(schema_registry_client, model_class, schema)
+    assert serializer(model_class(it="works"), ctx) == b"\x00\x00\x00\x00\x01\x00"
+
+
+@pytest.mark.parametrize("to_dict", (avro.to_dict, confluent.to_dict))
+def test_to_dict_and_to_instance_of_are_fused(
+    mocked_schema_registry_during_deserialization, schema_registry_client, ctx, to_dict
+):
+    deserializer = composed(Deserializer, to_dict(schema_registry_client), pydantic.to_instance_of(Model))
+    assert deserializer.explain().startswith(
+        "1. avro.to_instance_of(SchemaRegistryClient, Model, None)(value, ctx) <- fused"
+    )
+    assert deserializer(b"\x00\x00\x00\x00\x01\x00", ctx) == Model(it="works")
+
+
+@pytest.mark.parametrize("to_avro", (avro.to_avro, confluent.to_avro))
+@pytest.mark.parametrize("obj", (Model(it="works"), WiderModel(it="works")))
+def test_to_dict_and_to_avro_are_fused(
+    mocked_schema_registry_during_serialization, schema_registry_client, schema, ctx, to_avro, obj
+):
+    serializer = composed(Serializer, pydantic.to_dict, to_avro(schema_registry_client, schema))
+    assert len(serializer.steps) == 1
+    assert serializer(obj, ctx) == b"\x00\x00\x00\x00\x01\x00"
+
+
+class Name(BaseModel):
+    model_config = ConfigDict(str_strip_whitespace=True, str_max_length=4)
+
+    name: str
+
+
+NAME = {"type": "record", "name": "Name", "fields": [{"name": "name", "type": "string"}]}
+
+
+@pytest.mark.parametrize("to_dict", (avro.to_dict, confluent.to_dict))
+def test_to_instance_of_applies_the_model_config(schema_registry_client, register_writers, ctx, to_dict):
+    register_writers(NAME)
+    fused = composed(Deserializer, to_dict(schema_registry_client), pydantic.to_instance_of(Name))
+    unfused = composed(Deserializer, to_dict(schema_registry_client), pydantic.to_instance_of(Name), optimized=False)
+    assert len(fused.steps) == 1
+    payload = _framed(1, NAME, {"name": "  Bob  "})
+    assert fused(payload, ctx) == unfused(payload, ctx) == Name(name="Bob")
+    payload = _framed(1, NAME, {"name": "Robert"})
+    for deserializer in (fused, unfused):
+        with pytest.raises(ValidationError):
+            deserializer(payload, ctx)
+
+
+def _framed(schema_id: int, schema: dict, record: dict) -> bytes:
+    payload = io.BytesIO()
+    payload.write(b"\x00" + schema_id.to_bytes(4, "big"))
+    schemaless_writer(payload, parse_schema(schema), record)
+    return payload.getvalue()
+
+
+ADDRESS = {"type": "record", "name": "Address", "fields": [{"name": "city", "type": "string"}]}
+EVOLUTIONS = [
+    (
+        "projected",
+        {
+            "type": "record",
+            "name": "User",
+            "fields": [
+                {"name": "name", "type": "string"},
+                {"name": "age", "type": "int"},
+                {"name": "gone", "type": "string"},
+            ],
+        },
+        {
+            "type": "record",
+            "name": "User",
+            "fields": [
+                {"name": "age", "type": "double"},
+                {"name": "name", "type": "bytes"},
+                {"name": "tags", "type": {"type": "array", "items": "string"}, "default": []},
+                {"name": "country", "type": "string", "default": "FR"},
+            ],
+        },
+        {"name": "Ada", "age": 36, "gone": "x"},
+    ),
+    (
+        "projected",
+        {
+            "type": "record",
+            "name": "User",
+            "fields": [
+                {"name": "home", "type": ADDRESS},
+                {"name": "scores", "type": {"type": "map", "values": "int"}},
+                {"name": "visits", "type": {"type": "array", "items": "Address"}},
+            ],
+        },
+        {
+            "type": "record",
+            "name": "User",
+            "fields": [
+                {
+                    "name": "address",
+                    "aliases": ["home"],
+                    "type": {
+                        **ADDRESS,
+                        "fields": [*ADDRESS["fields"], {"name": "zip", "type": ["null", "string"], "default": None}],
+                    },
+                },
+                {"name": "scores", "type": {"type": "map", "values": "float"}},
+                {"name": "visits", "type": {"type": "array", "items": "Address"}},
+            ],
+        },
+        {"home": {"city": "Paris"}, "scores": {"a": 1}, "visits": [{"city": "Lyon"}]},
+    ),
+    (
+        "projected",
+        {
+            "type": "record",
+            "name": "User",
+            "fields": [{"name": "status", "type": {"type": "enum", "name": "Status", "symbols": ["ACTIVE", "BANNED"]}}],
+        },
+        {
+            "type": "record",
+            "name": "User",
+            "fields": [
+                {
+                    "name": "status",
+                    "type": {"type": "enum", "name": "Status", "symbols": ["ACTIVE", "UNKNOWN"], "default": "UNKNOWN"},
+                }
+            ],
+        },
+        {"status": "BANNED"},
+    ),
+    (
+        "resolved",
+        {"type": "record", "name": "User", "fields": [{"name": "age", "type": ["null", "int"]}]},
+        {"type": "record", "name": "User", "fields": [{"name": "age", "type": ["null", "long"]}]},
+        {"age": 36},
+    ),
+    (
+        "identical",
+        {"type": "record", "name": "User", "fields": [{"name": "age", "type": ["null", "int"]}]},
+        {"type": "record", "name": "User", "fields": [{"name": "age", "type": ["null", "int"]}]},
+        {"age": 36},
+    ),
+]
+
+
+@pytest.mark.parametrize("resolution, writer, reader, record", EVOLUTIONS)
+def test_to_dict_resolves_like_fastavro(
+    schema_registry_client, register_writers, ctx, resolution, writer, reader, record
+):
+    register_writers(writer)
+    payload = _framed(1, writer, record)
+    expected = schemaless_reader(io.BytesIO(payload[5:]), parse_schema(writer), parse_schema(reader))
+
+    assert avro.to_dict(schema_registry_client, reader)(payload, ctx) == expected
+    assert avro.reader(schema_registry_client, reader).writers == [avro.WriterVersion(1, resolution, 1)]
+
+
+V1 = {"type": "record", "name": "User", "fields": [{"name": "name", "type": "string"}, {"name": "age", "type": "int"}]}
+V2 = {
+    "type": "record",
+    "name": "User",
+    "fields": [
+        {"name": "name", "type": "string"},
+        {"name": "age", "type": "long"},
+        {"name": "email", "type": ["null", "string"], "default": None},
+    ],
+}
+
+
+class User(BaseModel):
+    name: str
+    age: int
+    email: Optional[str] = None
+
+    @classmethod
+    def avro_schema(cls) -> dict:
+        return V2
+
+
+def test_to_instance_of_decodes_writer_versions_to_the_model(schema_registry_client, register_writers, ctx):
+    register_writers(V1, V2)
+    deserializer = avro.to_instance_of(schema_registry_client, User, User)
+    payloads = [_framed(1, V1, {"name": "Ada", "age": 36}), _framed(2, V2, {"name": "Bob", "age": 7, "email": "b@x"})]
+
+    with mock.patch.object(User, "model_validate") as model_validate:
+        users = [deserializer(payload, ctx) for payload in payloads * 2]
+    model_validate.assert_not_called()
+    assert users[:2] == [User(name="Ada", age=36), User(name="Bob", age=7, email="b@x")]
+    assert [list(user.__dict__) for user in users[:2]] == [["name", "age", "email"]] * 2
+    assert avro.reader(schema_registry_client, User).writers == [
+        avro.WriterVersion(1, "projected", 2),
+        avro.WriterVersion(2, "identical", 2),
+    ]
+
+
+def test_reader_schema_requires_avro_schema(schema_registry_client):
+    with pytest.raises(ValueError):
+        avro.to_dict(schema_registry_client, Model)
@@ -1,11 +1,19 @@
 from functools import partial
+from unittest import mock
 
+import orjson
 import pytest
 from typing import List, Tuple
 
 from quixstreams.models import SerializationContext, Serializer
 
-from quixstreams_extensions.serializers.composer import composed as original_composed
+from quixstreams_extensions.serializers.composer import (
+    composed as original_composed,
+    with_batch,
+    call_many,
+    fusion,
+    origin,
+)
 
 composed = partial(original_composed, Serializer)
 
@@ -65,9 +73,8 @@ def test_compose_error_wrong_arity():
     def three_args(x: int, y: int, z: int) -> int:
         return x + y + z
 
-    serializer = composed(add_one, three_args)
     with pytest.raises(ValueError):
-        serializer(5)
+        composed(add_one, three_args)
 
 
 def test_compose_type_hints():
@@ -80,3 +87,101 @@ def test_compose_type_hints():
     serializer = composed(str_to_int, int_to_bool)
     assert serializer("hello") is False
     assert serializer("hello world") is True
+
+
+def test_compose_builtins_without_signature():
+    serializer = composed(str, str.encode)
+    assert serializer(5) == b"5"
+
+
+def test_compose_orjson_defaults_are_not_a_context():
+    serializer = composed(orjson.dumps, orjson.loads)
+    assert serializer({"it": "works"}, SerializationContext("topic")) == {"it": "works"}
+
+
+def test_compose_partial_and_bound_method():
+    class Adder:
+        def __init__(self, n: int):
+            self.n = n
+
+        def add(self, x: int, ctx: SerializationContext) -> int:
+            return x + self.n + len(ctx.topic)
+
+    def add_all(a: int, b: int, x: int) -> int:
+        return a + b + x
+
+    serializer = composed(partial(add_all, 1, 2), Adder(10).add)
+    assert serializer(3, SerializationContext("topic")) == 21  # 1 + 2 + 3 + 10 + 5
+
+
+def test_compose_callable_with_defaults():
+    def scale(x: int, ctx: SerializationContext = None, factor: int = 2) -> int:
+        return x * factor + (len(ctx.topic) if ctx else 0)
+
+    serializer = composed(scale)
+    assert serializer(3, SerializationContext("topic")) == 11
+
+
+def test_compose_resolves_arity_once(monkeypatch):
+    serializer = composed(add_one, add_topic_length)
+    monkeypatch.setattr(
+        "quixstreams_extensions.serializers.composer.signature",
+        mock.Mock(side_effect=AssertionError("signature called per message")),
+    )
+    assert serializer(1, SerializationContext("topic")) == 7
+    assert [step.takes_ctx for step in serializer.steps] == [False, True]
+
+
+def test_call_many_falls_back_to_per_item_calls():
+    context = SerializationContext("example")
+    serializer = composed(add_one, add_topic_length, multiply_by_two)
+    assert serializer.call_many([1, 2], [context, context]) == [18, 20]
+    assert composed(add_one, multiply_by_two).call_many([1, 2]) == [4, 6]
+
+
+def test_call_many_uses_batch_implementation():
+    many = mock.Mock(side_effect=lambda values, ctxs: [value * 10 for value in values])
+    times_ten = with_batch(many)(lambda x: x * 10)
+
+    serializer = composed(add_one, times_ten, add_one)
+    assert serializer.call_many([1, 2, 3]) == [21, 31, 41]
+    many.assert_called_once_with([2, 3, 4], [None, None, None])
+    assert serializer(1) == 21
+
+
+def test_call_many_helper_supports_plain_callables():
+    assert call_many(lambda value, ctx: value + 1, [1, 2]) == [2, 3]
+    assert call_many(composed(add_one), [1, 2]) == [2, 3]
+
+
+def test_fusion():
+    def to_text(x: int) -> str:
+        return str(x)
+
+    def to_number(s: str) -> int:
+        return int(s)
+
+    fusion(to_text, to_number)(lambda first, second: origin("identity")(lambda x: x))
+
+    serializer = composed(add_one, to_text, to_number, multiply_by_two)
+    assert serializer(3) == 8
+    assert len(serializer.steps) == 3
+    assert (
+        serializer.explain().splitlines()[1]
+        == "2. identity(value) <- fused test_composer.test_fusion.<locals>.to_text + test_composer.test_fusion.<locals>.to_number"
+    )
+
+    not_optimized = composed(add_one, to_text, to_number, multiply_by_two, optimized=False)
+    assert not_optimized(3) == 8
+    assert len(not_optimized.steps) == 4
+
+
+def test_fusion_may_decline():
+    def first(x: int) -> int:
+        return x
+
+    def second(x: int) -> int:
+        return x
+
+    fusion(first, second)(lambda first, second: None)
+    assert len(composed(first, second).steps) == 2
@@ -0,0 +1,80 @@
+import zlib
+
+import pytest
+from quixstreams.models import Deserializer, SerializationContext, Serializer
+
+from quixstreams_extensions.serializers.composer import composed
+from quixstreams_extensions.serializers.compositions import compression, json
+
+PAYLOAD = b'{"it": "works", "padding": "' + b"x" * 1000 + b'"}'
+MODULES = {"gzip": "gzip", "zstd": "zstandard", "lz4": "lz4"}
+
+
+@pytest.fixture(params=list(MODULES))
+def codec(request):
+    pytest.importorskip(MODULES[request.param])
+    return request.param
+
+
+def test_compress_and_decompress(codec, ctx):
+    compressed = compression.compress(codec)(PAYLOAD, ctx)
+    assert len(compressed) < len(PAYLOAD)
+    assert compression.decompress()(compressed, ctx) == PAYLOAD
+
+
+def test_codec_is_detected_from_header(codec, topic):
+    serializer = composed(Serializer, json.dumps, compression.compress(codec))
+    assert serializer.extra_headers == {"content-encoding": codec}
+    payload = serializer({"it": "works"}, SerializationContext(topic))
+
+    deserializer = composed(Deserializer, compression.decompress(), json.loads)
+    assert deserializer(payload, SerializationContext(topic, headers=[("content-encoding", codec.encode())])) == {
+        "it": "works"
+    }
+
+
+def test_uncompressed_payloads_pass_through(ctx, topic):
+    decompress = compression.decompress()
+    assert decompress(PAYLOAD, ctx) == PAYLOAD
+    # a payload looking like gzip isn't decompressed if the header says otherwise
+    gzip_like = b"\x1f\x8b" + PAYLOAD
+    assert decompress(gzip_like, SerializationContext(topic, headers=[("content-encoding", b"identity")])) == gzip_like
+
+
+def test_fallback_codec(ctx):
+    # payloads without header nor magic bytes are expected to be gzip
+    with pytest.raises(zlib.error):
+        compression.decompress("gzip")(PAYLOAD, ctx)
+
+
+def test_unknown_codec(ctx, topic):
+    with pytest.raises(ValueError):
+        compression.compress("brotli")
+    with pytest.raises(ValueError):
+        compression.decompress()(PAYLOAD, SerializationContext(topic, headers=[("content-encoding", b"brotli")]))
+
+
+def test_zstd_dictionary(ctx):
+    pytest.importorskip("zstandard")
+    samples = [
+        f'{{"id": {idx}, "name": "user-{idx}", "email": "user-{idx}@example.com"}}'.encode() for idx in range(500)
+    ]
+    dictionary = compression.train_dictionary(samples, size=4096)
+    compress = compression.compress("zstd", dictionary=dictionary)
+
+    compressed = compress(samples[0], ctx)
+    assert len(compressed) < len(compression.compress("zstd")(samples[0], ctx))
+    assert compression.decompress(dictionary=dictionary)(compressed, ctx) == samples[0]
+    with pytest.raises(ValueError):
+        compression.compress("gzip", dictionary=dictionary)
+
+
+@pytest.mark.parametrize("threads", [0, 4])
+def test_batches(codec, threads, monkeypatch):
+    monkeypatch.setattr(compression, "PARALLEL_THRESHOLD", 0)
+    payloads = [PAYLOAD + str(idx).encode() for idx in range(20)]
+    serializer = composed(Serializer, compression.compress(codec, threads=threads))
+    deserializer = composed(Deserializer, compression.decompress(threads=threads))
+    compressed = serializer.call_many(payloads)
+    assert compressed == [serializer(payload) for payload in payloads]
+    assert deserializer.call_many(compressed) == payloads
@@ -1,93 +1,64 @@
-import json
+from unittest import mock
 
-import pytest
-import responses
-from confluent_kafka.schema_registry import SchemaRegistryClient
+from confluent_kafka.schema_registry import topic_subject_name_strategy
+from confluent_kafka.serialization import MessageField
+from pydantic import BaseModel, ValidationInfo, field_validator
+from quixstreams.models import Deserializer, Serializer
 
-from quixstreams_extensions.serializers.compositions import confluent
+from quixstreams_extensions.serializers.composer import composed, origin_of
+from quixstreams_extensions.serializers.compositions import confluent, pydantic
 
 
-SCHEMA_REGISTRY_URL = "http://schema-registry.url"
+def test_to_avro(mocked_schema_registry_during_serialization, schema_registry_client, schema, ctx):
+    serializer = confluent.to_avro(schema_registry_client, schema)
+    assert serializer({"it": "works"}, ctx) == b"\x00\x00\x00\x00\x01\x00"
 
 
-SCHEMA_ID = 1
+def test_to_dict(mocked_schema_registry_during_deserialization, schema_registry_client, ctx):
+    serializer = confluent.to_dict(schema_registry_client)
+    assert serializer(b"\x00\x00\x00\x00\x01\x00", ctx) == {"it": "works"}
 
 
-@pytest.fixture
-def subject(topic):
-    return f"{topic}-value"
+def test_to_avro_registers_the_key_subject(schema_registry_client, schema, ctx):
+    serializer = confluent.to_avro(schema_registry_client, schema, field=MessageField.KEY)
+    with mock.patch.object(schema_registry_client, "register_schema", return_value=1) as register_schema:
+        assert serializer({"it": "works"}, ctx) == serializer({"it": "works"}, ctx) == b"\x00\x00\x00\x00\x01\x00"
+    register_schema.assert_called_once_with("any-topic-key", mock.ANY, False)
 
 
-@pytest.fixture
-def schema_registry_client():
-    return SchemaRegistryClient({"url": SCHEMA_REGISTRY_URL})
+def test_only_built_in_subject_name_strategies_are_cached(schema_registry_client, schema, ctx):
+    assert confluent._cached_subject_name_strategy(topic_subject_name_strategy) is not topic_subject_name_strategy
+    # user strategies may depend on headers, they are called for every message
+    strategy = mock.Mock(wraps=topic_subject_name_strategy)
+    serializer = confluent.to_avro(schema_registry_client, schema, conf={"subject.name.strategy": strategy})
+    with mock.patch.object(schema_registry_client, "register_schema", return_value=1):
+        serializer({"it": "works"}, ctx)
+        serializer({"it": "works"}, ctx)
+    assert strategy.call_count == 2
 
 
-@pytest.fixture
-def schema():
-    return json.dumps(
-        {
-            "type": "record",
-            "name": "ExampleRecord",
-            "fields": [
-                {
-                    "name": "it",
-                    "type": {"type": "enum", "name": "ItEnum", "symbols": ["works"]},
-                }
-            ],
-        }
+def test_key_steps_keep_their_field_when_fused(schema_registry_client, schema):
+    serializer = composed(
+        Serializer, pydantic.to_dict, confluent.to_avro(schema_registry_client, schema, field=MessageField.KEY)
     )
-
-
-@pytest.fixture
-def mocked_responses():
-    with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
-        yield rsps
-
-
-@pytest.fixture
-def mocked_schema_registry_during_serialization(mocked_responses, subject, schema):
-    mocked_responses.get(
-        f"{SCHEMA_REGISTRY_URL}/subjects/{subject}/versions/latest",
-        status=200,
-        json={
-            "id": SCHEMA_ID,
-            "schema": schema,
-            "subject": subject,
-            "version": 1,
-        },
-    )
-    mocked_responses.post(
-        f"{SCHEMA_REGISTRY_URL}/subjects/{subject}/versions?normalize=False",
-        status=200,
-        json={
-            "id": SCHEMA_ID,
-            "schema": schema,
-            "subject": subject,
-            "version": 1,
-        },
+    assert origin_of(serializer.steps[0].fn).kwargs == {"field": MessageField.KEY}
+    deserializer = composed(
+        Deserializer, confluent.to_dict(schema_registry_client, field=MessageField.KEY), pydantic.to_dict
     )
+    assert origin_of(deserializer.steps[0].fn).kwargs == {"field": MessageField.KEY}
 
 
-@pytest.fixture
-def mocked_schema_registry_during_deserialization(mocked_responses, subject, schema):
-    mocked_responses.get(
-        f"{SCHEMA_REGISTRY_URL}/schemas/ids/{SCHEMA_ID}",
-        status=200,
-        json={
-            "id": SCHEMA_ID,
-            "schema": schema,
-            "subject": subject,
-            "version": 1,
-        },
-    )
+class Tagged(BaseModel):
+    it: str
 
+    @field_validator("it")
+    @classmethod
+    def from_context(cls, value: str, info: ValidationInfo) -> str:
+        return f"{value} on {info.context['topic']}" if info.context else value
 
-def test_to_avro(mocked_schema_registry_during_serialization, schema_registry_client, schema, ctx):
-    serializer = confluent.to_avro(schema_registry_client, schema)
-    assert serializer({"it": "works"}, ctx) == b"\x00\x00\x00\x00\x01\x00"
 
-
-def test_to_dict(mocked_schema_registry_during_deserialization, schema_registry_client, ctx):
-    serializer = confluent.to_dict(schema_registry_client)
-    assert serializer(b"\x00\x00\x00\x00\x01\x00", ctx) == {"it": "works"}
+def test_decode_and_validate_keep_the_context_of_validators(
+    mocked_schema_registry_during_deserialization, schema_registry_client, ctx
+):
+    deserializer = composed(Deserializer, confluent.to_dict(schema_registry_client), pydantic.to_instance_of(Tagged))
+    assert deserializer(b"\x00\x00\x00\x00\x01\x00", ctx) == Tagged(it="works on any-topic")
@@ -0,0 +1,51 @@
+from datetime import date
+
+import pytest
+from pydantic import BaseModel
+from quixstreams.models import Deserializer, Serializer
+
+from quixstreams_extensions.serializers.composer import composed
+from quixstreams_extensions.serializers.compositions import json, pydantic
+
+
+class Model(BaseModel):
+    it: str
+
+
+@pytest.mark.parametrize("data", [b'{"it": "works"}', bytearray(b'{"it": "works"}'), '{"it": "works"}'])
+def test_loads(data, ctx):
+    assert json.loads(data, ctx) == {"it": "works"}
+
+
+def test_loads_memoryview_in_place(ctx):
+    buffer = bytearray(b'[{"it": "works"}, {"it": "too"}]')
+    assert json.loads(memoryview(buffer)[1:16], ctx) == {"it": "works"}
+
+
+def test_dumps(ctx):
+    assert json.dumps({"b": 1, "a": 2}, ctx) == b'{"b":1,"a":2}'
+
+
+def test_dumps_with_options(ctx):
+    dumps = json.dumps_with(non_str_keys=True, sort_keys=True)
+    assert dumps({2: "b", date(2024, 7, 13): "a"}, ctx) == b'{"2":"b","2024-07-13":"a"}'
+    assert composed(Serializer, dumps).explain() == "1. json.dumps(non_str_keys=True, sort_keys=True)(value, ctx)"
+
+
+def test_dumps_with_default(ctx):
+    dumps = json.dumps_with(default=str)
+    assert dumps({"it": {1, 2}}, ctx) in (b'{"it":"{1, 2}"}', b'{"it":"{2, 1}"}')
+
+
+def test_loads_is_fused_with_validation():
+    deserializer = composed(Deserializer, json.loads, pydantic.to_instance_of(Model))
+    assert len(deserializer.steps) == 1
+    assert deserializer(memoryview(b'{"it": "works"}')) == Model(it="works")
+
+
+def test_dumps_is_fused_with_dump():
+    assert len(composed(Serializer, pydantic.to_dict, json.dumps).steps) == 1
+    assert composed(Serializer, pydantic.to_dict, json.dumps)(Model(it="works")) == b'{"it":"works"}'
+    # pydantic can't sort keys
+    serializer = composed(Serializer, pydantic.to_dict, json.dumps_with(sort_keys=True))
+    assert len(serializer.steps) == 2
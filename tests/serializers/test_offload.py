@@ -0,0 +1,75 @@
+import os
+from typing import Optional
+
+import pytest
+from pydantic import BaseModel
+from quixstreams.models import Deserializer, SerializationContext, Serializer
+
+from quixstreams_extensions.serializers.composer import composed
+from quixstreams_extensions.serializers.compositions import json, pydantic
+from quixstreams_extensions.serializers.offload import offloaded
+
+
+class Model(BaseModel):
+    idx: int
+    topic: Optional[str] = None
+    pid: Optional[int] = None
+
+
+def with_origin(data: dict, ctx: SerializationContext) -> dict:
+    return {**data, "topic": ctx.topic if ctx else None, "pid": os.getpid()}
+
+
+def make_deserializer():
+    return composed(Deserializer, json.loads, with_origin, pydantic.to_instance_of(Model))
+
+
+def make_serializer():
+    return composed(Serializer, pydantic.to_json)
+
+
+@pytest.fixture
+def deserializer():
+    deserializer = offloaded(make_deserializer, workers=2, min_batch_size=10)
+    yield deserializer
+    deserializer.close()
+
+
+def test_offloads_large_batches_in_order(deserializer, topic):
+    payloads = [b'{"idx": %d}' % idx for idx in range(100)]
+    results = deserializer.call_many(payloads, [SerializationContext(topic)] * 100)
+    assert [result.idx for result in results] == list(range(100))
+    assert {result.topic for result in results} == {topic}
+    assert os.getpid() not in {result.pid for result in results}
+    assert deserializer.stats.offloaded == 1
+    assert deserializer.stats.seconds >= deserializer.stats.worker_seconds > 0
+
+
+def test_runs_small_batches_and_single_values_inline(deserializer):
+    assert deserializer(b'{"idx": 1}').pid == os.getpid()
+    results = deserializer.call_many([b'{"idx": %d}' % idx for idx in range(9)])
+    assert {result.pid for result in results} == {os.getpid()}
+    assert deserializer.stats.offloaded == 0
+    assert deserializer.stats.batches == 1
+
+
+def test_grows_shared_memory(deserializer):
+    for size in (10, 50, 20):
+        assert len(deserializer.call_many([b'{"idx": %d}' % idx for idx in range(size)])) == size
+
+
+def test_raises_worker_errors(deserializer):
+    with pytest.raises(ValueError):
+        deserializer.call_many([b'{"idx": "nan"}'] * 10)
+
+
+def test_pickles_values_which_are_not_bytes():
+    serializer = offloaded(make_serializer, workers=2, min_batch_size=2)
+    try:
+        assert serializer.call_many([Model(idx=1), Model(idx=2)]) == [
+            b'{"idx":1,"topic":null,"pid":null}',
+            b'{"idx":2,"topic":null,"pid":null}',
+        ]
+        assert isinstance(serializer, Serializer)
+    finally:
+        serializer.close()
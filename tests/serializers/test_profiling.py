@@ -0,0 +1,80 @@
+from functools import partial
+
+import pytest
+from quixstreams.models import Serializer
+
+from quixstreams_extensions.serializers.composer import composed as original_composed, with_batch
+
+composed = partial(original_composed, Serializer)
+
+
+def add_one(x: int) -> int:
+    return x + 1
+
+
+def fail_on_zero(x: int) -> int:
+    return 1 // x
+
+
+@with_batch(lambda values, ctxs: [value * 2 for value in values])
+def double(x: int) -> int:
+    return x * 2
+
+
+def test_not_profiled_by_default(monkeypatch):
+    monkeypatch.delenv("QUIXSTREAMS_EXTENSIONS_PROFILE", raising=False)
+    assert composed(add_one).profile is None
+
+
+def test_profiles_every_step():
+    serializer = composed(add_one, fail_on_zero, profile=True)
+    for value in (1, 2, 3):
+        serializer(value)
+    with pytest.raises(ZeroDivisionError):
+        serializer(-1)
+
+    profile = serializer.profile
+    assert (profile.calls, profile.errors) == (4, 1)
+    first, second = profile.steps
+    assert (first.name, first.calls, first.exceptions) == (f"1. {__name__}.add_one", 4, 0)
+    assert (second.calls, second.exceptions) == (4, 1)
+    assert 0 < first.percentile(50) <= first.percentile(99)
+    assert first.seconds >= first.mean > 0
+
+
+def test_samples_calls():
+    serializer = composed(add_one, profile=0.25)
+    for value in range(100):
+        assert serializer(value) == value + 1
+    assert serializer.profile.calls == 100
+    assert serializer.profile.steps[0].calls == 25
+
+
+def test_profiles_batches():
+    serializer = composed(add_one, double, profile=True)
+    assert serializer.call_many([1, 2, 3]) == [4, 6, 8]
+    assert [step.calls for step in serializer.profile.steps] == [3, 3]
+
+
+def test_profile_from_environment(monkeypatch):
+    monkeypatch.setenv("QUIXSTREAMS_EXTENSIONS_PROFILE", "0.5")
+    assert composed(add_one).profile.rate == 0.5
+    monkeypatch.setenv("QUIXSTREAMS_EXTENSIONS_PROFILE", "true")
+    assert composed(add_one).profile.rate == 1
+    assert composed(add_one, profile=False).profile is None
+
+
+def test_rejects_invalid_sample_rate():
+    with pytest.raises(ValueError):
+        composed(add_one, profile=2)
+
+
+def test_profile_table():
+    serializer = composed(add_one, double, profile=True)
+    serializer(1)
+    lines = serializer.profile.table().splitlines()
+    assert lines[0].split(" | ")[0].strip() == "step"
+    assert lines[2].startswith(f"1. {__name__}.add_one")
+    assert lines[-1] == "1 calls, 0 errors, sample rate 1"
+    serializer.profile.reset()
+    assert serializer.profile.calls == serializer.profile.steps[0].calls == 0
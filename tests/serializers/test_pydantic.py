@@ -1,12 +1,15 @@
 from dataclasses import dataclass
-from typing import Literal, Union
+from datetime import datetime
+from typing import Annotated, Literal, Optional, Union
+from unittest import mock
 
+import orjson
 import pytest
-from pydantic import BaseModel
-from quixstreams.models import Serializer
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, ValidationInfo, field_validator
+from quixstreams.models import Deserializer, Serializer, SerializationContext
 
 from quixstreams_extensions.serializers.composer import composed
-from quixstreams_extensions.serializers.compositions import pydantic
+from quixstreams_extensions.serializers.compositions import json, pydantic
 
 
 class Model(BaseModel):
@@ -46,3 +49,139 @@ def test_to_dict(obj, expected):
 def test_chain():
     serializer = composed(Serializer, pydantic.to_instance_of(Model), pydantic.to_dict)
     assert serializer({"it": "works"}) == {"it": "works"}
+
+
+def test_call_many():
+    serializer = composed(Serializer, pydantic.to_instance_of(Model), pydantic.to_dict)
+    ctxs = [SerializationContext("topic"), SerializationContext("topic", headers=[("h", b"v")])]
+    assert serializer.call_many([{"it": "works"}, {"it": "works"}], ctxs) == [{"it": "works"}, {"it": "works"}]
+
+
+@pytest.mark.parametrize("model_class", (Model, Union[Model, DataClass]))
+def test_to_instance_of_many_raises(model_class):
+    serializer = composed(Serializer, pydantic.to_instance_of(model_class))
+    with pytest.raises(ValidationError):
+        serializer.call_many([{"it": "works"}, {"it": "fails"}])
+
+
+def test_to_dict_many_with_shared_context():
+    serializer = composed(Serializer, pydantic.to_dict)
+    ctx = SerializationContext("topic")
+    assert serializer.call_many([Model(it="works"), Model(it="works")], [ctx, ctx]) == [{"it": "works"}] * 2
+
+
+def test_to_dict_many_mixed_types():
+    serializer = composed(Serializer, pydantic.to_dict)
+    assert serializer.call_many([Model(it="works"), DataClass(it="also works")]) == [
+        {"it": "works"},
+        {"it": "also works"},
+    ]
+
+
+@pytest.mark.parametrize("model_class", (Model, Union[Model, DataClass]))
+def test_loads_and_to_instance_of_are_fused(model_class):
+    deserializer = composed(Deserializer, orjson.loads, pydantic.to_instance_of(model_class))
+    assert len(deserializer.steps) == 1
+    assert deserializer(b'{"it": "works"}', SerializationContext("topic")) == Model(it="works")
+    with pytest.raises(ValidationError):
+        deserializer(b'{"it": "fails"}')
+
+
+@pytest.mark.parametrize("obj", (Model(it="works"), DataClass(it="also works")))
+def test_to_dict_and_dumps_are_fused(obj):
+    serializer = composed(Serializer, pydantic.to_dict, orjson.dumps)
+    assert serializer.explain() == "1. pydantic.to_json(value, ctx) <- fused pydantic.to_dict + orjson.dumps"
+    assert serializer(obj) == composed(Serializer, pydantic.to_dict, orjson.dumps, optimized=False)(obj)
+
+
+class ContextModel(BaseModel):
+    topic: Optional[str] = None
+
+    @field_validator("topic")
+    @classmethod
+    def from_context(cls, value: Optional[str], info: ValidationInfo) -> Optional[str]:
+        return info.context["topic"] if info.context else value
+
+
+class Nested(BaseModel):
+    inner: ContextModel
+
+
+class Count(BaseModel):
+    count: int
+
+
+@pytest.mark.parametrize(
+    "model_class, payload, expected",
+    (
+        (ContextModel, {"topic": "payload"}, ContextModel(topic="topic")),
+        (Nested, {"inner": {"topic": "payload"}}, Nested(inner=ContextModel(topic="topic"))),
+        (Optional[ContextModel], {"topic": "payload"}, ContextModel(topic="topic")),
+    ),
+)
+def test_to_instance_of_with_context(model_class, payload, expected):
+    ctx = SerializationContext("topic")
+    assert pydantic.to_instance_of(model_class)(payload, ctx) == expected
+    assert composed(Deserializer, pydantic.to_instance_of(model_class)).call_many([payload], [ctx]) == [expected]
+    assert pydantic.from_json(model_class)(orjson.dumps(payload), ctx) == expected
+
+
+def test_to_instance_of_strict():
+    assert pydantic.to_instance_of(Count)({"count": "1"}) == Count(count=1)
+    with pytest.raises(ValidationError):
+        pydantic.to_instance_of(Count, strict=True)({"count": "1"})
+    with pytest.raises(ValidationError):
+        pydantic.from_json(Count, strict=True)(b'{"count": "1"}')
+
+
+class Event(BaseModel):
+    at: datetime
+
+
+@pytest.mark.parametrize("loads", (orjson.loads, json.loads))
+def test_loads_and_strict_to_instance_of_are_not_fused(loads):
+    deserializer = composed(Deserializer, loads, pydantic.to_instance_of(Event, strict=True))
+    assert len(deserializer.steps) == 2
+    # strict JSON validation would accept it
+    with pytest.raises(ValidationError):
+        deserializer(b'{"at": "2024-07-13T00:00:00"}')
+
+
+class StrictEvent(BaseModel):
+    model_config = ConfigDict(strict=True)
+
+    at: datetime
+
+
+class StrictFieldEvent(BaseModel):
+    at: Annotated[datetime, Field(strict=True)]
+
+
+@pytest.mark.parametrize("model_class", (StrictEvent, StrictFieldEvent, Optional[StrictEvent]))
+@pytest.mark.parametrize("loads", (orjson.loads, json.loads))
+def test_loads_and_to_instance_of_strictly_configured_types_are_not_fused(loads, model_class):
+    fused = composed(Deserializer, loads, pydantic.to_instance_of(model_class))
+    unfused = composed(Deserializer, loads, pydantic.to_instance_of(model_class), optimized=False)
+    assert len(fused.steps) == 2
+    for deserializer in (fused, unfused):
+        with pytest.raises(ValidationError):
+            deserializer(b'{"at": "2024-07-13T00:00:00"}')
+
+
+def test_to_instance_of_trusted():
+    validate = pydantic.to_instance_of(Count, trusted=True)
+    assert validate({"count": "not validated"}).count == "not validated"
+    assert composed(Deserializer, validate).call_many([{"count": 1}]) == [Count(count=1)]
+    with pytest.raises(TypeError):
+        pydantic.to_instance_of(DataClass, trusted=True)
+
+
+def test_loads_and_trusted_to_instance_of_are_not_fused():
+    assert len(composed(Deserializer, orjson.loads, pydantic.to_instance_of(Count, trusted=True)).steps) == 2
+
+
+def test_to_instance_of_without_context_validators_skips_context():
+    validate = pydantic.to_instance_of(Model)
+    with mock.patch.object(pydantic, "_as_own_context") as as_own_context:
+        assert validate({"it": "works"}, SerializationContext("topic")) == Model(it="works")
+    as_own_context.assert_not_called()
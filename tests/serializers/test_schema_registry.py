@@ -0,0 +1,117 @@
+import time
+
+import pytest
+from confluent_kafka.schema_registry import Schema
+from quixstreams.models import SerializationContext
+
+from quixstreams_extensions.serializers.compositions import avro, confluent
+from quixstreams_extensions.serializers.compositions.schema_registry import CachedSchemaRegistryClient
+
+URL = "http://schema-registry.url"
+
+
+def registered(schema, subject, schema_id=1, version=1):
+    return {"id": schema_id, "schema": schema, "subject": subject, "version": version}
+
+
+@pytest.fixture
+def snapshot_path(tmp_path):
+    return tmp_path / "state" / "schema-registry.json"
+
+
+@pytest.fixture
+def client(snapshot_path):
+    with CachedSchemaRegistryClient({"url": URL}, snapshot_path) as client:
+        yield client
+
+
+def test_snapshot_is_reloaded(mocked_responses, client, snapshot_path, schema, subject):
+    mocked_responses.get(f"{URL}/schemas/ids/1", json=registered(schema, subject))
+    client.warm_up(schema_ids=[1])
+    assert snapshot_path.exists()
+
+    mocked_responses.reset()  # the registry is gone
+    restarted = CachedSchemaRegistryClient({"url": URL}, snapshot_path)
+    assert restarted.get_schema(1).schema_str == schema
+
+
+def test_compositions_run_from_the_snapshot(mocked_responses, client, snapshot_path, schema, subject, topic):
+    mocked_responses.post(f"{URL}/subjects/{subject}/versions?normalize=False", json=registered(schema, subject))
+    mocked_responses.get(f"{URL}/schemas/ids/1", json=registered(schema, subject))
+    ctx = SerializationContext(topic)
+    payload = confluent.to_avro(client, schema)({"it": "works"}, ctx)
+    assert confluent.to_dict(client)(payload, ctx) == {"it": "works"}
+    client.save()
+
+    mocked_responses.reset()
+    restarted = CachedSchemaRegistryClient({"url": URL}, snapshot_path)
+    assert avro.to_avro(restarted, schema)({"it": "works"}, ctx) == payload
+    assert avro.to_dict(restarted)(payload, ctx) == {"it": "works"}
+
+
+def test_warm_up_subjects(mocked_responses, client, schema, subject):
+    versions = mocked_responses.get(f"{URL}/subjects/{subject}/versions", json=[1, 2])
+    for version in (1, 2):
+        mocked_responses.get(
+            f"{URL}/subjects/{subject}/versions/{version}", json=registered(schema, subject, version, version)
+        )
+    latest = mocked_responses.get(f"{URL}/subjects/{subject}/versions/latest", json=registered(schema, subject, 2, 2))
+    client.warm_up(subjects=[subject])
+    assert client.get_latest_version(subject).version == 2
+    assert client.get_version(subject, 1).schema_id == 1
+    assert client.get_schema(2).schema_str == schema
+    assert (versions.call_count, latest.call_count) == (1, 1)
+
+
+def test_refresh_picks_new_versions(mocked_responses, client, snapshot_path, schema, subject):
+    latest = mocked_responses.get(f"{URL}/subjects/{subject}/versions/latest", json=registered(schema, subject))
+    assert client.get_latest_version(subject).version == 1
+    assert client.refresh() == []
+
+    mocked_responses.replace("GET", latest.url, json=registered(schema, subject, 2, 2))
+    (updated,) = client.refresh()
+    assert (updated.version, updated.schema_id) == (2, 2)
+    assert client.get_latest_version(subject).version == 2
+    restarted = CachedSchemaRegistryClient({"url": URL}, snapshot_path)
+    assert restarted.get_latest_version(subject).version == 2
+
+
+def test_background_refresh(mocked_responses, snapshot_path, schema, subject):
+    latest = mocked_responses.get(f"{URL}/subjects/{subject}/versions/latest", json=registered(schema, subject))
+    with CachedSchemaRegistryClient({"url": URL}, refresh_interval=0.01) as client:
+        client.get_latest_version(subject)
+        mocked_responses.replace("GET", latest.url, json=registered(schema, subject, 2, 2))
+        deadline = time.monotonic() + 5
+        while client.get_latest_version(subject).version != 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert client.get_latest_version(subject).version == 2
+
+
+def test_registrations_are_cached(mocked_responses, client, schema, subject):
+    register = mocked_responses.post(
+        f"{URL}/subjects/{subject}/versions?normalize=False", json=registered(schema, subject)
+    )
+    lookup = mocked_responses.post(f"{URL}/subjects/{subject}?normalize=False", json=registered(schema, subject))
+    for _ in range(2):
+        assert client.register_schema(subject, Schema(schema, "AVRO")) == 1
+        assert client.lookup_schema(subject, Schema(schema, "AVRO")).schema_id == 1
+    assert (register.call_count, lookup.call_count) == (1, 1)
+
+
+def test_lookups_are_reloaded_by_the_looked_up_schema(mocked_responses, client, snapshot_path, schema, subject):
+    looked_up = " " + schema  # not the registry's canonical form
+    mocked_responses.post(f"{URL}/subjects/{subject}?normalize=True", json=registered(schema, subject))
+    client.lookup_schema(subject, Schema(looked_up, "AVRO"), normalize_schemas=True)
+    client.save()
+
+    mocked_responses.reset()  # the registry is gone
+    restarted = CachedSchemaRegistryClient({"url": URL}, snapshot_path)
+    assert restarted.lookup_schema(subject, Schema(looked_up, "AVRO"), normalize_schemas=True).schema_id == 1
+    assert len(mocked_responses.calls) == 0
+
+
+def test_unreadable_snapshot_is_ignored(snapshot_path):
+    snapshot_path.parent.mkdir(parents=True)
+    snapshot_path.write_text("{not json")
+    client = CachedSchemaRegistryClient({"url": URL}, snapshot_path)
+    assert client._schemas == {}
@@ -0,0 +1,153 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import pytest
+
+
+class FakeDocument:
+    def __init__(self, path: str):
+        self.path = path
+
+    def __eq__(self, other):
+        return isinstance(other, FakeDocument) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+
+class FakeCollection:
+    def __init__(self, path: str):
+        self.path = path
+
+    def document(self, key: str) -> FakeDocument:
+        return FakeDocument(f"{self.path}/{key}")
+
+
+class FakeCollectionGroup:
+    def __init__(self, client: "FakeFirestoreClient", name: str):
+        self._client = client
+        self._name = name
+
+    def select(self, field_paths: List[str]) -> "FakeCollectionGroup":
+        return self
+
+    def _snapshots(self) -> List[SimpleNamespace]:
+        self._client.collection_group_queries += 1
+        return [
+            SimpleNamespace(reference=FakeDocument(path))
+            for path in list(self._client.documents)
+            if path.split("/")[-2] == self._name
+        ]
+
+    def stream(self):
+        yield from self._snapshots()
+
+
+class FakeAsyncCollectionGroup(FakeCollectionGroup):
+    async def stream(self):
+        for snapshot in self._snapshots():
+            yield snapshot
+
+
+class FakeBatch:
+    def __init__(self, client: "FakeFirestoreClient"):
+        self._client = client
+        self.writes = []
+
+    def set(self, document: FakeDocument, data: dict, merge: bool = False):
+        self.writes.append((document.path, data, merge) if merge else (document.path, data))
+
+    def commit(self):
+        started = time.monotonic()
+        time.sleep(self._client.latency)
+        with self._client.lock:
+            if self._client.failures:
+                raise self._client.failures.pop(0)
+            self._client.commits.append(
+                {
+                    "writes": self.writes,
+                    "started": started,
+                    "finished": time.monotonic(),
+                    "thread": threading.get_ident(),
+                }
+            )
+            for path, data, *merge in self.writes:
+                self._client.documents[path] = {**self._client.documents.get(path, {}), **data} if merge else data
+
+
+class FakeAsyncBatch(FakeBatch):
+    async def commit(self):
+        client = self._client
+        started = time.monotonic()
+        client.in_flight += 1
+        client.max_in_flight = max(client.max_in_flight, client.in_flight)
+        try:
+            await asyncio.sleep(client.latency)
+            if client.failures:
+                raise client.failures.pop(0)
+        finally:
+            client.in_flight -= 1
+        client.commits.append({"writes": self.writes, "started": started, "finished": time.monotonic()})
+        for path, data, *merge in self.writes:
+            client.documents[path] = {**client.documents.get(path, {}), **data} if merge else data
+
+
+class FakeFirestoreClient:
+    """
+    A local stand-in for `firestore.Client`, recording every commit with its timing.
+    """
+
+    def __init__(self, latency: float = 0.0, failures: Optional[List[Exception]] = None):
+        self.latency = latency
+        self.failures = failures or []
+        self.lock = threading.Lock()
+        self.commits: List[dict] = []
+        self.documents: Dict[str, dict] = {}
+        self.collection_group_queries = 0
+
+    def collection(self, name: str) -> FakeCollection:
+        return FakeCollection(name)
+
+    def collection_group(self, name: str) -> FakeCollectionGroup:
+        return FakeCollectionGroup(self, name)
+
+    def document(self, path: str) -> FakeDocument:
+        return FakeDocument(path)
+
+    def batch(self) -> FakeBatch:
+        return FakeBatch(self)
+
+
+class FakeAsyncFirestoreClient(FakeFirestoreClient):
+    """
+    A local stand-in for `firestore.AsyncClient`, its commits take `latency` seconds on the event loop.
+    """
+
+    def __init__(self, latency: float = 0.0, failures: Optional[List[Exception]] = None):
+        super().__init__(latency, failures)
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def batch(self) -> FakeAsyncBatch:
+        return FakeAsyncBatch(self)
+
+    def collection_group(self, name: str) -> FakeAsyncCollectionGroup:
+        return FakeAsyncCollectionGroup(self, name)
+
+
+@pytest.fixture
+def make_async_firestore_client():
+    return FakeAsyncFirestoreClient
+
+
+@pytest.fixture
+def make_firestore_client():
+    return FakeFirestoreClient
+
+
+@pytest.fixture
+def firestore_client(make_firestore_client):
+    return make_firestore_client()
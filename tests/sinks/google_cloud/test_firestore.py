@@ -1,8 +1,25 @@
+import subprocess
+import sys
 from datetime import datetime
 from unittest import mock
 
+import pytest
+from google.api_core.exceptions import DeadlineExceeded, InvalidArgument, ServiceUnavailable
+from quixstreams.models import Serializer
+from quixstreams.sinks import SinkBackpressureError
+from rocksdict import Rdict
 
-from quixstreams_extensions.sinks.google_cloud import GoogleFirestoreFlatSink
+from quixstreams_extensions.serializers.composer import composed
+from quixstreams_extensions.sinks.google_cloud import (
+    AsyncGoogleFirestoreFlatSink,
+    AsyncGoogleFirestoreNestedSink,
+    CacheStats,
+    GoogleFirestoreFlatSink,
+    GoogleFirestoreNestedSink,
+    KeyCache,
+    NodeCache,
+)
+from quixstreams_extensions.sinks.state import DB_NAME
 
 
 def test_flat_sink(topic):
@@ -18,3 +35,489 @@ def test_flat_sink(topic):
     sink._db.collection.return_value.document.assert_has_calls([mock.call("k1"), mock.call("k2")])
     sink._db.collection.return_value.document.return_value.set.assert_not_called()
     sink._db.batch.return_value.set.assert_has_calls([mock.call(mock.ANY, "v1"), mock.call(mock.ANY, "v2")])
+
+
+def test_flat_sink_serializes_batch_at_once(topic):
+    value_serializer = composed(Serializer, str.upper)
+    value_serializer.call_many = mock.Mock(wraps=value_serializer.call_many)
+    sink = GoogleFirestoreFlatSink("test_collection", client=mock.Mock(), value_serializer=value_serializer)
+    for idx, value in enumerate(["v1", "v2"]):
+        sink.add(value, f"k{idx}", int(datetime.now().timestamp()), [], topic, 0, idx)
+    sink.flush(topic, 0)
+    value_serializer.call_many.assert_called_once_with(["v1", "v2"], mock.ANY)
+    sink._db.batch.return_value.set.assert_has_calls([mock.call(mock.ANY, "V1"), mock.call(mock.ANY, "V2")])
+
+
+def fill(sink, topic, messages):
+    for idx, (key, value) in enumerate(messages):
+        sink.add(value, key, int(datetime.now().timestamp()), [], topic, 0, idx)
+
+
+def test_flat_sink_caches_serialized_keys(topic, firestore_client):
+    calls = []
+
+    def key_serializer(key, ctx):
+        calls.append((key, ctx))
+        return f"user-{key}"
+
+    sink = GoogleFirestoreFlatSink(
+        "test_collection", client=firestore_client, key_serializer=key_serializer, key_cache_size=2
+    )
+    fill(sink, topic, [(1, {"v": 1}), (2, {"v": 2}), (1, {"v": 3})])
+    sink.flush(topic, 0)
+    fill(sink, topic, [(2, {"v": 4}), (3, {"v": 5})])
+    sink.flush(topic, 0)
+
+    assert [key for key, _ in calls] == [1, 2, 3]
+    assert calls[0][1] is calls[1][1]
+    assert firestore_client.documents == {
+        "test_collection/user-1": {"v": 3},
+        "test_collection/user-2": {"v": 4},
+        "test_collection/user-3": {"v": 5},
+    }
+    assert sink.key_cache.stats == CacheStats(hits=2, store_hits=0, misses=3)
+    assert len(sink.key_cache) == 2  # key 1 evicted
+
+
+def test_key_cache_serializes_unhashable_keys(topic):
+    cache = KeyCache(10)
+    assert cache.serialize(topic, [{"id": 1}, "2", {"id": 1}], lambda key, ctx: str(key)) == [
+        "{'id': 1}",
+        "2",
+        "{'id': 1}",
+    ]
+    assert cache.serialize(topic, [{"id": 1}], lambda key, ctx: str(key["id"])) == ["1"]
+    assert len(cache) == 1
+    assert cache.stats.misses == 4
+
+
+def test_flat_sink_commits_in_chunks(topic, firestore_client):
+    sink = GoogleFirestoreFlatSink("test_collection", client=firestore_client, batch_size=500)
+    fill(sink, topic, [(f"k{idx}", {"idx": idx}) for idx in range(1201)])
+    sink.flush(topic, 0)
+    assert sorted(len(commit["writes"]) for commit in firestore_client.commits) == [201, 500, 500]
+    assert len(firestore_client.documents) == 1201
+
+
+def test_flat_sink_commits_chunks_concurrently(topic, make_firestore_client):
+    firestore_client = make_firestore_client(latency=0.05)
+    sink = GoogleFirestoreFlatSink("test_collection", client=firestore_client, batch_size=10, max_concurrent_commits=4)
+    fill(sink, topic, [(f"k{idx}", {"idx": idx}) for idx in range(40)])
+    sink.flush(topic, 0)
+    commits = firestore_client.commits
+    assert len(commits) == 4
+    assert len({commit["thread"] for commit in commits}) > 1
+    # all chunks are in flight at the same time
+    assert max(commit["started"] for commit in commits) < min(commit["finished"] for commit in commits)
+
+
+def test_flat_sink_keeps_order_of_writes_to_the_same_document(topic, make_firestore_client):
+    firestore_client = make_firestore_client(latency=0.01)
+    sink = GoogleFirestoreFlatSink("test_collection", client=firestore_client, batch_size=2, max_concurrent_commits=4)
+    fill(sink, topic, [("a", {"v": 1}), ("b", {"v": 1}), ("c", {"v": 1}), ("d", {"v": 1}), ("a", {"v": 2})])
+    sink.flush(topic, 0)
+    first, second = [
+        commit for commit in firestore_client.commits if ("test_collection/a", mock.ANY) in commit["writes"]
+    ]
+    assert first["finished"] <= second["started"]
+    assert firestore_client.documents["test_collection/a"] == {"v": 2}
+
+
+def test_flat_sink_retries_transient_errors(topic, make_firestore_client):
+    firestore_client = make_firestore_client(failures=[ServiceUnavailable("busy"), DeadlineExceeded("slow")])
+    sink = GoogleFirestoreFlatSink("test_collection", client=firestore_client, commit_backoff=0)
+    fill(sink, topic, [("k1", {"v": 1})])
+    sink.flush(topic, 0)
+    assert firestore_client.documents == {"test_collection/k1": {"v": 1}}
+
+
+def test_flat_sink_gives_up_after_retries(topic, make_firestore_client):
+    firestore_client = make_firestore_client(failures=[ServiceUnavailable("busy")] * 3)
+    sink = GoogleFirestoreFlatSink("test_collection", client=firestore_client, commit_retries=2, commit_backoff=0)
+    fill(sink, topic, [("k1", {"v": 1})])
+    with pytest.raises(ServiceUnavailable):
+        sink.flush(topic, 0)
+    assert firestore_client.documents == {}
+
+
+def test_flat_sink_does_not_retry_permanent_errors(topic, make_firestore_client):
+    firestore_client = make_firestore_client(failures=[InvalidArgument("bad")])
+    sink = GoogleFirestoreFlatSink("test_collection", client=firestore_client, commit_backoff=0)
+    fill(sink, topic, [("k1", {"v": 1})])
+    with pytest.raises(InvalidArgument):
+        sink.flush(topic, 0)
+    assert firestore_client.failures == []
+
+
+@pytest.mark.parametrize("batch_size", [0, 501])
+def test_flat_sink_rejects_invalid_batch_size(firestore_client, batch_size):
+    with pytest.raises(ValueError):
+        GoogleFirestoreFlatSink("test_collection", client=firestore_client, batch_size=batch_size)
+
+
+def test_nested_sink_commits_in_chunks(topic, firestore_client, tmp_path):
+    sink = GoogleFirestoreNestedSink(
+        [("stores", lambda item: item.key["store"]), ("users", lambda item: item.key["user"])],
+        client=firestore_client,
+        state_dir=str(tmp_path),
+        batch_size=3,
+    )
+    fill(sink, topic, [({"store": "s1", "user": f"u{idx}"}, {"idx": idx}) for idx in range(3)])
+    sink.flush(topic, 0)
+    assert all(len(commit["writes"]) <= 3 for commit in firestore_client.commits)
+    assert firestore_client.documents == {
+        "stores/s1": {".tap": True},
+        # the value lands after the node creation, even when it is committed in another chunk
+        **{f"stores/s1/users/u{idx}": {"idx": idx} for idx in range(3)},
+    }
+
+
+def test_flat_sink_deduplicates_writes(topic, firestore_client):
+    serialized = []
+
+    def value_serializer(value, ctx):
+        serialized.append(value)
+        return value
+
+    sink = GoogleFirestoreFlatSink(
+        "test_collection", client=firestore_client, value_serializer=value_serializer, deduplicate=True
+    )
+    fill(sink, topic, [("a", {"v": 1}), ("b", {"v": 1}), ("a", {"v": 2}), ("a", {"v": 3})])
+    sink.flush(topic, 0)
+    (commit,) = firestore_client.commits
+    assert commit["writes"] == [("test_collection/a", {"v": 3}), ("test_collection/b", {"v": 1})]
+    # superseded values are not serialized
+    assert serialized == [{"v": 3}, {"v": 1}]
+
+
+def test_flat_sink_merges_writes(topic, firestore_client):
+    sink = GoogleFirestoreFlatSink("test_collection", client=firestore_client, deduplicate=True, merge=True)
+    fill(sink, topic, [("a", {"x": 1, "m": {"p": 1}}), ("a", {"y": 2, "m": {"q": 2}}), ("a", {"x": 3})])
+    sink.flush(topic, 0)
+    (commit,) = firestore_client.commits
+    assert commit["writes"] == [("test_collection/a", {"x": 3, "y": 2, "m": {"p": 1, "q": 2}}, True)]
+
+
+def test_flat_sink_merges_writes_with_custom_function(topic, firestore_client):
+    def add(older, newer):
+        return {"count": older["count"] + newer["count"]}
+
+    sink = GoogleFirestoreFlatSink("test_collection", client=firestore_client, deduplicate=True, merge=add)
+    fill(sink, topic, [("a", {"count": 1}), ("b", {"count": 1}), ("a", {"count": 2})])
+    sink.flush(topic, 0)
+    assert firestore_client.documents == {"test_collection/a": {"count": 3}, "test_collection/b": {"count": 1}}
+
+
+def test_nested_sink_deduplicates_writes(topic, firestore_client, tmp_path):
+    sink = GoogleFirestoreNestedSink(
+        [("stores", lambda item: item.key["store"]), ("users", lambda item: item.key["user"])],
+        client=firestore_client,
+        state_dir=str(tmp_path),
+        deduplicate=True,
+    )
+    fill(sink, topic, [({"store": "s1", "user": "u1"}, {"v": idx}) for idx in range(3)])
+    sink.flush(topic, 0)
+    (commit,) = firestore_client.commits
+    assert commit["writes"] == [
+        ("stores/s1", {".tap": True}),
+        ("stores/s1/users/u1", {".tap": True}),
+        ("stores/s1/users/u1", {"v": 2}),
+    ]
+
+
+def nested_sink(firestore_client, tmp_path, **kwargs):
+    return GoogleFirestoreNestedSink(
+        [("stores", lambda item: item.key["store"]), ("users", lambda item: item.key["user"])],
+        client=firestore_client,
+        state_dir=str(tmp_path),
+        **kwargs,
+    )
+
+
+def tapped(firestore_client):
+    return [path for commit in firestore_client.commits for path, data in commit["writes"] if data == {".tap": True}]
+
+
+def test_node_cache_evicts_least_recently_used():
+    cache = NodeCache(2)
+    cache.add("topic", ["/a", "/b"])
+    assert cache.contains("topic", "/a")
+    cache.add("topic", ["/c"])
+    assert not cache.contains("topic", "/b")
+    assert cache.contains("topic", "/a") and cache.contains("topic", "/c")
+    assert not cache.contains("other-topic", "/a")
+    assert cache.stats == CacheStats(hits=3, store_hits=0, misses=2)
+    assert cache.stats.hit_ratio == 0.6
+
+
+def test_nested_sink_creates_nodes_once(topic, firestore_client, tmp_path):
+    sink = nested_sink(firestore_client, tmp_path)
+    for offset, user in enumerate(["u1", "u2", "u1"]):
+        sink.add({"v": 1}, {"store": "s1", "user": user}, 0, [], topic, 0, offset)
+        sink.flush(topic, 0)
+    assert tapped(firestore_client) == ["stores/s1", "stores/s1/users/u1", "stores/s1/users/u2"]
+    assert sink.node_cache.stats.hits == 3
+
+
+def test_nested_sink_falls_back_to_rocksdb(topic, firestore_client, tmp_path):
+    sink = nested_sink(firestore_client, tmp_path)
+    sink.add({"v": 1}, {"store": "s1", "user": "u1"}, 0, [], topic, 0, 0)
+    sink.flush(topic, 0)
+    sink.node_cache.clear()
+    sink.add({"v": 2}, {"store": "s1", "user": "u1"}, 0, [], topic, 0, 1)
+    sink.flush(topic, 0)
+    assert tapped(firestore_client) == ["stores/s1", "stores/s1/users/u1"]
+    assert sink.node_cache.stats.store_hits == 2
+    assert len(sink.node_cache) == 2
+
+
+def test_nested_sink_does_not_cache_uncommitted_nodes(topic, make_firestore_client, tmp_path):
+    firestore_client = make_firestore_client(failures=[InvalidArgument("bad")])
+    sink = nested_sink(firestore_client, tmp_path)
+    sink.add({"v": 1}, {"store": "s1", "user": "u1"}, 0, [], topic, 0, 0)
+    with pytest.raises(InvalidArgument):
+        sink.flush(topic, 0)
+    sink.add({"v": 1}, {"store": "s1", "user": "u1"}, 0, [], topic, 0, 0)
+    sink.flush(topic, 0)
+    assert tapped(firestore_client) == ["stores/s1", "stores/s1/users/u1"]
+
+
+def test_nested_sink_with_node_ttl(topic, firestore_client, tmp_path):
+    sink = nested_sink(firestore_client, tmp_path, node_ttl=3600, node_cache_size=0)
+    for offset in range(2):
+        sink.add({"v": 1}, {"store": "s1", "user": "u1"}, 0, [], topic, 0, offset)
+        sink.flush(topic, 0)
+    assert tapped(firestore_client) == ["stores/s1", "stores/s1/users/u1"]
+    assert sink.node_cache.stats.store_hits == 2
+
+
+def test_nested_sink_builds_shared_nodes_once(topic, firestore_client, tmp_path):
+    firestore_client.document = mock.Mock(wraps=firestore_client.document)
+    sink = nested_sink(firestore_client, tmp_path)
+    fill(sink, topic, [({"store": "s1", "user": f"u{idx % 3}"}, {"idx": idx}) for idx in range(30)])
+    sink.flush(topic, 0)
+    # one reference per distinct node, not per item and level
+    assert firestore_client.document.call_count == 4
+    assert tapped(firestore_client) == ["stores/s1", "stores/s1/users/u0", "stores/s1/users/u1", "stores/s1/users/u2"]
+    assert sink.node_cache.stats == CacheStats(hits=0, store_hits=0, misses=4)
+
+
+def test_async_flat_sink_commits_while_accumulating(topic, make_async_firestore_client):
+    firestore_client = make_async_firestore_client(latency=0.05)
+    sink = AsyncGoogleFirestoreFlatSink("test_collection", client=firestore_client, batch_size=10, max_in_flight=2)
+    fill(sink, topic, [(f"k{idx}", {"idx": idx}) for idx in range(45)])
+    # full batches are already committing, flush waits for them and commits the rest
+    assert sum(map(len, sink._in_flight.values())) >= 2
+    sink.flush(topic, 0)
+    assert len(firestore_client.documents) == 45
+    assert sorted(len(commit["writes"]) for commit in firestore_client.commits) == [5, 10, 10, 10, 10]
+    assert firestore_client.max_in_flight == 2
+    sink.close()
+
+
+def test_async_flat_sink_fails_flush_of_failed_commits(topic, make_async_firestore_client):
+    firestore_client = make_async_firestore_client(failures=[InvalidArgument("bad")])
+    sink = AsyncGoogleFirestoreFlatSink("test_collection", client=firestore_client, batch_size=2)
+    fill(sink, topic, [(f"k{idx}", {"idx": idx}) for idx in range(5)])
+    with pytest.raises(InvalidArgument):
+        sink.flush(topic, 0)
+    sink.flush(topic, 0)
+    sink.close()
+
+
+def test_async_flat_sink_retries_transient_errors(topic, make_async_firestore_client):
+    firestore_client = make_async_firestore_client(failures=[ServiceUnavailable("busy")])
+    sink = AsyncGoogleFirestoreFlatSink("test_collection", client=firestore_client, commit_backoff=0)
+    fill(sink, topic, [("k1", {"v": 1})])
+    sink.flush(topic, 0)
+    assert firestore_client.documents == {"test_collection/k1": {"v": 1}}
+    sink.close()
+
+
+def test_async_flat_sink_keeps_order_of_writes_to_the_same_document(topic, make_async_firestore_client):
+    firestore_client = make_async_firestore_client(latency=0.01)
+    sink = AsyncGoogleFirestoreFlatSink("test_collection", client=firestore_client, batch_size=2, max_in_flight=4)
+    fill(sink, topic, [("a", {"v": 1}), ("b", {"v": 1}), ("c", {"v": 1}), ("d", {"v": 1}), ("a", {"v": 2})])
+    sink.flush(topic, 0)
+    first, second = [
+        commit for commit in firestore_client.commits if ("test_collection/a", mock.ANY) in commit["writes"]
+    ]
+    assert first["finished"] <= second["started"]
+    assert firestore_client.documents["test_collection/a"] == {"v": 2}
+    sink.close()
+
+
+def test_async_nested_sink_creates_nodes_once(topic, make_async_firestore_client, tmp_path):
+    firestore_client = make_async_firestore_client(latency=0.02)
+    sink = AsyncGoogleFirestoreNestedSink(
+        [("stores", lambda item: item.key["store"]), ("users", lambda item: item.key["user"])],
+        client=firestore_client,
+        state_dir=str(tmp_path),
+        batch_size=2,
+    )
+    fill(sink, topic, [({"store": "s1", "user": f"u{idx % 2}"}, {"idx": idx}) for idx in range(6)])
+    sink.flush(topic, 0)
+    assert sorted(tapped(firestore_client)) == ["stores/s1", "stores/s1/users/u0", "stores/s1/users/u1"]
+    assert firestore_client.documents["stores/s1/users/u0"] == {"idx": 4}
+    assert len(sink.node_cache) == 3
+    sink.close()
+
+
+def test_nested_sinks_share_the_state_store(topic, firestore_client, tmp_path):
+    sinks = [nested_sink(firestore_client, tmp_path) for _ in range(2)]
+    for partition, sink in enumerate(sinks):
+        sink.add({"v": 1}, {"store": "s1", "user": "u1"}, 0, [], topic, partition, 0)
+        sink.flush(topic, partition)
+    for sink in sinks:
+        sink.close()
+    assert Rdict.list_cf(str(tmp_path / DB_NAME)) == [
+        "default",
+        f"GoogleFirestoreNestedSink:{topic}:0",
+        f"GoogleFirestoreNestedSink:{topic}:1",
+    ]
+
+
+def test_nested_sink_rebuilds_nodes_of_assigned_partition(topic, firestore_client, tmp_path):
+    firestore_client.documents = {
+        "stores/s1": {".tap": True},
+        "stores/s1/users/u1": {"v": 0},
+        # same collection names, another tree
+        "archive/a1/users/u2": {"v": 0},
+    }
+    sink = nested_sink(firestore_client, tmp_path, rebuild_depth=2, node_cache_size=0)
+    sink.on_assigned(topic, 0)
+    assert firestore_client.collection_group_queries == 2
+    for offset, user in enumerate(["u1", "u2"]):
+        sink.add({"v": 1}, {"store": "s1", "user": user}, 0, [], topic, 0, offset)
+    sink.flush(topic, 0)
+    assert tapped(firestore_client) == ["stores/s1/users/u2"]
+
+    # the partition's nodes are known already
+    sink.on_assigned(topic, 0)
+    assert firestore_client.collection_group_queries == 2
+    sink.close()
+
+
+def test_async_nested_sink_rebuilds_nodes_of_assigned_partition(topic, make_async_firestore_client, tmp_path):
+    firestore_client = make_async_firestore_client()
+    firestore_client.documents = {"stores/s1": {".tap": True}}
+    sink = AsyncGoogleFirestoreNestedSink(
+        [("stores", lambda item: item.key["store"]), ("users", lambda item: item.key["user"])],
+        client=firestore_client,
+        state_dir=str(tmp_path),
+        rebuild_depth=1,
+    )
+    sink.on_assigned(topic, 0)
+    sink.add({"v": 1}, {"store": "s1", "user": "u1"}, 0, [], topic, 0, 0)
+    sink.flush(topic, 0)
+    assert tapped(firestore_client) == ["stores/s1/users/u1"]
+    sink.close()
+
+
+@pytest.mark.parametrize("drop_revoked_state, tapped_again", [(False, []), (True, ["stores/s1", "stores/s1/users/u1"])])
+def test_nested_sink_revoked_state(topic, firestore_client, tmp_path, drop_revoked_state, tapped_again):
+    sink = nested_sink(firestore_client, tmp_path, node_cache_size=0, drop_revoked_state=drop_revoked_state)
+    sink.add({"v": 1}, {"store": "s1", "user": "u1"}, 0, [], topic, 0, 0)
+    sink.flush(topic, 0)
+    sink.on_revoked(topic, 0)
+    sink.on_assigned(topic, 0)
+    firestore_client.commits.clear()
+    sink.add({"v": 2}, {"store": "s1", "user": "u1"}, 0, [], topic, 0, 1)
+    sink.flush(topic, 0)
+    assert tapped(firestore_client) == tapped_again
+    sink.close()
+
+
+def test_nested_sink_rejects_invalid_rebuild_depth(firestore_client, tmp_path):
+    with pytest.raises(ValueError):
+        nested_sink(firestore_client, tmp_path, rebuild_depth=3)
+
+
+def test_flat_sink_writes_ahead_of_checkpoint_past_max_buffered_bytes(topic, firestore_client):
+    sink = GoogleFirestoreFlatSink("test_collection", client=firestore_client, max_buffered_bytes=5_000)
+    fill(sink, topic, [(f"k{idx}", {"idx": idx}) for idx in range(45)])
+    written = len(firestore_client.documents)
+    assert 0 < written < 45
+    assert 0 < sink.buffered_bytes < 5_000
+    sink.flush(topic, 0)
+    assert len(firestore_client.documents) == 45
+    assert sink.buffered_bytes == 0
+
+
+def test_async_flat_sink_signals_backpressure_past_max_in_flight_bytes(topic, make_async_firestore_client):
+    firestore_client = make_async_firestore_client(latency=0.2)
+    sink = AsyncGoogleFirestoreFlatSink(
+        "test_collection", client=firestore_client, batch_size=10, max_in_flight_bytes=5_000, backpressure_delay=1
+    )
+    fill(sink, topic, [(f"k{idx}", {"idx": idx}) for idx in range(30)])
+    # the second batch would exceed the limit while the first one commits, the partition is dropped since
+    assert 0 < sink.in_flight_bytes <= 5_000
+    with pytest.raises(SinkBackpressureError) as exc_info:
+        sink.flush(topic, 0)
+    assert exc_info.value.retry_after == 1
+    assert len(firestore_client.documents) == 10
+
+    # consumed again from the last committed offset once resumed
+    fill(sink, topic, [(f"k{idx}", {"idx": idx}) for idx in range(10, 15)])
+    sink.flush(topic, 0)
+    assert len(firestore_client.documents) == 15
+    sink.close()
+
+
+PEAK_RSS_SCRIPT = """
+import resource
+from quixstreams_extensions.sinks.google_cloud import GoogleFirestoreFlatSink
+
+class Document:
+    def __init__(self, path):
+        self.path = path
+
+class Collection:
+    def document(self, key):
+        return Document(key)
+
+class Batch:
+    def set(self, document, data, merge=False):
+        client.writes += 1
+
+    def commit(self):
+        pass
+
+class Client:
+    writes = 0
+
+    def collection(self, name):
+        return Collection()
+
+    def batch(self):
+        return Batch()
+
+client = Client()
+sink = GoogleFirestoreFlatSink("users", client=client, max_buffered_bytes={max_buffered_bytes})
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+for offset in range(1_000_000):
+    sink.add({{"id": offset, "name": f"user-{{offset}}"}}, f"key-{{offset}}", 0, [], "users", 0, offset)
+sink.flush("users", 0)
+print(client.writes, (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before) * 1024)
+"""
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="ru_maxrss is in kilobytes on Linux only")
+def test_flat_sink_peak_memory_is_bounded_by_max_buffered_bytes():
+    max_buffered_bytes = 16 << 20
+    result = subprocess.run(
+        [sys.executable, "-c", PEAK_RSS_SCRIPT.format(max_buffered_bytes=max_buffered_bytes)],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    writes, peak_growth = map(int, result.stdout.split())
+    assert writes == 1_000_000
+    # about 500 MiB when buffering the whole batch, the writes of a partial batch come on top of the limit
+    assert peak_growth < 4 * max_buffered_bytes
+
+
+def test_nested_sink_warns_about_legacy_node_cache(firestore_client, tmp_path, caplog):
+    (tmp_path / "GoogleFirestoreNestedSink").mkdir()
+    nested_sink(firestore_client, tmp_path).close()
+    assert "node cache of an earlier version" in caplog.text
@@ -0,0 +1,108 @@
+import threading
+from unittest import mock
+
+import pytest
+
+from quixstreams_extensions.sinks.kv import (
+    AsyncKeyValueFlatSink,
+    Backend,
+    BackendCapabilities,
+    KeyValueFlatSink,
+    KeyValueNestedSink,
+)
+from quixstreams_extensions.sinks.local import SQLiteBackend
+
+
+def fill(sink, topic, messages, partition=0):
+    for offset, (key, value) in enumerate(messages):
+        sink.add(value, key, 0, [], topic, partition, offset)
+    sink.flush(topic, partition)
+
+
+def nested_sink(backend, tmp_path, **kwargs):
+    return KeyValueNestedSink(
+        [("stores", lambda item: item.key["store"]), ("users", lambda item: item.key["user"])],
+        backend,
+        state_dir=str(tmp_path / "state"),
+        **kwargs,
+    )
+
+
+def test_flat_sink_writes_into_sqlite(topic):
+    backend = SQLiteBackend()
+    sink = KeyValueFlatSink("users", backend)
+    fill(sink, topic, [("u1", {"v": 1}), ("u2", {"v": 2}), ("u1", {"v": 3})])
+    assert backend.documents() == {"users/u1": {"v": 3}, "users/u2": {"v": 2}}
+    assert backend.get("users/u3") is None
+
+
+def test_sqlite_merges_fields_like_firestore(topic):
+    backend = SQLiteBackend()
+    sink = KeyValueFlatSink("users", backend, merge=True)
+    fill(sink, topic, [("u1", {"name": "a", "stats": {"x": 1, "y": 1}})])
+    fill(sink, topic, [("u1", {"stats": {"y": 2}}), ("u1", {"age": 3})])
+    assert backend.get("users/u1") == {"name": "a", "stats": {"x": 1, "y": 2}, "age": 3}
+
+
+def test_sqlite_commits_chunks_atomically(topic):
+    backend = SQLiteBackend()
+    sink = KeyValueFlatSink("users", backend)
+    with pytest.raises(Exception):
+        # the lock can't be pickled, nothing of its chunk is written
+        fill(sink, topic, [("u1", {"v": 1}), ("u2", {"lock": threading.Lock()})])
+    assert len(backend) == 0
+
+
+def test_nested_sink_rebuilds_nodes_from_sqlite_file(topic, tmp_path):
+    path = str(tmp_path / "documents.db")
+    sink = nested_sink(SQLiteBackend(path), tmp_path / "first")
+    fill(sink, topic, [({"store": "s1", "user": "u1"}, {"v": 1})])
+    sink.close()
+
+    backend = SQLiteBackend(path)
+    commit = mock.Mock(wraps=backend.commit)
+    backend.commit = commit
+    sink = nested_sink(backend, tmp_path / "second", rebuild_depth=1)
+    sink.on_assigned(topic, 0)
+    fill(sink, topic, [({"store": "s1", "user": "u2"}, {"v": 2})])
+    # the store node is known from the database, it isn't written again
+    assert {write.document.path for write in commit.call_args.args[0]} == {"stores/s1/users/u2"}
+    assert backend.documents("stores/s1/") == {"stores/s1/users/u1": {"v": 1}, "stores/s1/users/u2": {"v": 2}}
+    sink.close()
+
+
+def test_batch_size_defaults_to_backend_limit(topic):
+    backend = SQLiteBackend(max_batch_size=10)
+    commit = mock.Mock(wraps=backend.commit)
+    backend.commit = commit
+    sink = KeyValueFlatSink("users", backend, max_concurrent_commits=4)
+    fill(sink, topic, [(f"u{idx}", {"v": idx}) for idx in range(25)])
+    assert [len(call.args[0]) for call in commit.call_args_list] == [10, 10, 5]
+    # SQLite has a single writer, chunks are committed one at a time
+    assert sink._executor is None
+    with pytest.raises(ValueError):
+        KeyValueFlatSink("users", backend, batch_size=11)
+
+
+def test_merge_requires_backend_support():
+    backend = SQLiteBackend()
+    backend.capabilities = BackendCapabilities(500, supports_merge=False)
+    KeyValueFlatSink("users", backend)
+    with pytest.raises(ValueError, match="merging"):
+        KeyValueFlatSink("users", backend, merge=True)
+
+
+def test_async_sink_requires_async_backend():
+    with pytest.raises(ValueError, match="async"):
+        AsyncKeyValueFlatSink("users", SQLiteBackend())
+
+
+def test_incomplete_backend_fails_when_instantiated():
+    class WriteOnly(Backend):
+        capabilities = BackendCapabilities(500)
+
+        def commit(self, chunk):
+            pass
+
+    with pytest.raises(TypeError, match="collection"):
+        WriteOnly()
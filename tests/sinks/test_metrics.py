@@ -0,0 +1,94 @@
+from collections import defaultdict
+from unittest import mock
+
+import pytest
+from google.api_core.exceptions import ServiceUnavailable
+
+from quixstreams_extensions.sinks.google_cloud import GoogleFirestoreFlatSink, GoogleFirestoreNestedSink
+from quixstreams_extensions.sinks.metrics import NOOP, OpenTelemetrySinkMetrics, PrometheusSinkMetrics
+
+
+class RecordingMetrics:
+    enabled = True
+
+    def __init__(self):
+        self.phases = defaultdict(list)
+        self.batches = []
+        self.cache = []
+        self.retries = []
+
+    def observe_phase(self, sink, topic, phase, seconds):
+        self.phases[phase].append(seconds)
+
+    def observe_batch(self, sink, topic, messages, writes):
+        self.batches.append((sink, topic, messages, writes))
+
+    def observe_cache(self, sink, topic, hits, misses):
+        self.cache.append((hits, misses))
+
+    def observe_retry(self, sink, error):
+        self.retries.append((sink, type(error)))
+
+
+def test_noop_metrics_are_disabled():
+    assert not NOOP.enabled
+
+
+def test_flat_sink_metrics(topic):
+    metrics = RecordingMetrics()
+    client = mock.Mock()
+    client.batch.return_value.commit.side_effect = [ServiceUnavailable("busy"), None]
+    sink = GoogleFirestoreFlatSink("test_collection", client=client, metrics=metrics, commit_backoff=0)
+    for idx in range(3):
+        sink.add({"v": idx}, f"k{idx}", 0, [], topic, 0, idx)
+    sink.flush(topic, 0)
+    assert set(metrics.phases) == {"key", "serialize", "commit"}
+    assert metrics.batches == [("GoogleFirestoreFlatSink", topic, 3, 3)]
+    assert metrics.retries == [("GoogleFirestoreFlatSink", ServiceUnavailable)]
+
+
+def test_nested_sink_metrics(topic, tmp_path):
+    metrics = RecordingMetrics()
+    sink = GoogleFirestoreNestedSink(
+        [("stores", lambda item: item.key["store"]), ("users", lambda item: item.key["user"])],
+        client=mock.Mock(),
+        state_dir=str(tmp_path),
+        metrics=metrics,
+    )
+    for offset in range(2):
+        sink.add({"v": offset}, {"store": "s1", "user": f"u{offset}"}, 0, [], topic, 0, offset)
+        sink.flush(topic, 0)
+    assert set(metrics.phases) == {"nodes", "serialize", "commit", "rocksdb"}
+    # 2 nodes and 1 value for the first batch, 1 node and 1 value for the second one
+    assert [writes / messages for _, _, messages, writes in metrics.batches] == [3, 2]
+    assert metrics.cache == [(0, 2), (1, 1)]
+
+
+def test_prometheus_metrics(topic):
+    prometheus_client = pytest.importorskip("prometheus_client")
+    registry = prometheus_client.CollectorRegistry()
+    sink = GoogleFirestoreFlatSink("test_collection", client=mock.Mock(), metrics=PrometheusSinkMetrics(registry))
+    sink.add({"v": 1}, "k1", 0, [], topic, 0, 0)
+    sink.flush(topic, 0)
+    labels = {"sink": "GoogleFirestoreFlatSink", "topic": topic}
+    assert registry.get_sample_value("quixstreams_extensions_sink_writes_total", labels) == 1
+    assert registry.get_sample_value("quixstreams_extensions_sink_phase_seconds_count", {**labels, "phase": "commit"})
+
+
+def test_opentelemetry_metrics(topic):
+    pytest.importorskip("opentelemetry.sdk")
+    from opentelemetry.sdk.metrics import MeterProvider
+    from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+
+    reader = InMemoryMetricReader()
+    meter = MeterProvider(metric_readers=[reader]).get_meter("test")
+    sink = GoogleFirestoreFlatSink("test_collection", client=mock.Mock(), metrics=OpenTelemetrySinkMetrics(meter))
+    sink.add({"v": 1}, "k1", 0, [], topic, 0, 0)
+    sink.flush(topic, 0)
+    names = {
+        metric.name
+        for resource in reader.get_metrics_data().resource_metrics
+        for scope in resource.scope_metrics
+        for metric in scope.metrics
+    }
+    assert {"sink.phase.duration", "sink.messages", "sink.writes"} <= names
@@ -0,0 +1,165 @@
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import pytest
+from pydantic import BaseModel
+
+pa = pytest.importorskip("pyarrow")
+pytest.importorskip("fsspec")
+pq = pytest.importorskip("pyarrow.parquet")
+
+from quixstreams_extensions.sinks.parquet import ParquetSink, arrow_schema  # noqa: E402
+
+DAY = int(datetime(2024, 7, 13, tzinfo=timezone.utc).timestamp() * 1000)
+NEXT_DAY = DAY + 24 * 3600 * 1000
+
+SCHEMA = {
+    "type": "record",
+    "name": "Event",
+    "fields": [
+        {"name": "id", "type": "long"},
+        {"name": "name", "type": ["null", "string"], "default": None},
+    ],
+}
+
+
+def fill(sink, count: int, timestamp: int = DAY, start: int = 0):
+    for offset in range(start, start + count):
+        sink.add({"id": offset, "name": f"event-{offset}"}, b"key", timestamp, [], "topic", 0, offset)
+
+
+def files(path) -> List[str]:
+    return sorted(str(file.relative_to(path)) for file in path.rglob("*") if file.is_file())
+
+
+def test_flush_writes_partitioned_files(tmp_path):
+    sink = ParquetSink(str(tmp_path), SCHEMA)
+    fill(sink, 3)
+    fill(sink, 2, timestamp=NEXT_DAY, start=3)
+    sink.flush("topic", 0)
+
+    assert files(tmp_path) == [
+        "topic=topic/partition=0/date=2024-07-13/00000000000000000000.parquet",
+        "topic=topic/partition=0/date=2024-07-14/00000000000000000003.parquet",
+    ]
+    table = pq.read_table(tmp_path / "topic=topic/partition=0/date=2024-07-13/00000000000000000000.parquet")
+    assert table.to_pylist() == [{"id": idx, "name": f"event-{idx}"} for idx in range(3)]
+
+
+def test_files_are_visible_once_flushed_only(tmp_path):
+    sink = ParquetSink(str(tmp_path), SCHEMA, row_group_size=2)
+    fill(sink, 5)
+
+    # row groups are already written, but under a temporary name
+    assert [name.rsplit("/", 1)[1] for name in files(tmp_path)] == [".00000000000000000000.parquet.inprogress"]
+
+    sink.flush("topic", 0)
+    path = tmp_path / "topic=topic/partition=0/date=2024-07-13/00000000000000000000.parquet"
+    assert files(tmp_path) == [str(path.relative_to(tmp_path))]
+    assert pq.ParquetFile(path).metadata.num_row_groups == 3
+
+
+def test_files_roll_over_max_file_rows(tmp_path):
+    sink = ParquetSink(str(tmp_path), SCHEMA, row_group_size=4, max_file_rows=10)
+    fill(sink, 25)
+    sink.flush("topic", 0)
+
+    paths = sorted(tmp_path.rglob("*.parquet"))
+    assert [path.name for path in paths] == [f"{offset:020d}.parquet" for offset in (0, 10, 20)]
+    assert [pq.ParquetFile(path).metadata.num_rows for path in paths] == [10, 10, 5]
+    assert pq.ParquetFile(paths[0]).metadata.num_row_groups == 3
+
+
+def test_files_roll_over_max_file_age(tmp_path):
+    sink = ParquetSink(str(tmp_path), SCHEMA, row_group_size=1, max_file_age=0)
+    fill(sink, 3)
+    sink.flush("topic", 0)
+
+    assert len(list(tmp_path.rglob("*.parquet"))) == 3
+
+
+def test_paused_partition_discards_its_files(tmp_path):
+    sink = ParquetSink(str(tmp_path), SCHEMA, row_group_size=2)
+    fill(sink, 5)
+    sink.on_paused("topic", 0)
+    sink.flush("topic", 0)
+
+    assert files(tmp_path) == []
+
+
+def test_fsspec_filesystem():
+    fsspec = pytest.importorskip("fsspec")
+    sink = ParquetSink("memory://bucket/events", SCHEMA)
+    fill(sink, 2)
+    sink.flush("topic", 0)
+
+    fs = fsspec.filesystem("memory")
+    path = "/bucket/events/topic=topic/partition=0/date=2024-07-13/00000000000000000000.parquet"
+    with fs.open(path, "rb") as file:
+        assert pq.read_table(file).num_rows == 2
+    fs.rm("/bucket", recursive=True)
+
+
+def test_value_serializer(tmp_path):
+    sink = ParquetSink(str(tmp_path), SCHEMA, value_serializer=lambda value, ctx: {"id": value, "name": ctx.topic})
+    sink.add(7, b"key", DAY, [], "topic", 0, 0)
+    sink.flush("topic", 0)
+
+    assert pq.read_table(next(tmp_path.rglob("*.parquet"))).to_pylist() == [{"id": 7, "name": "topic"}]
+
+
+class Line(BaseModel):
+    sku: str
+    quantity: int
+
+
+class Order(BaseModel):
+    id: str
+    created_at: datetime
+    note: Optional[str] = None
+    lines: List[Line]
+    tags: Dict[str, str]
+
+
+def test_pydantic_model(tmp_path):
+    sink = ParquetSink(str(tmp_path), Order)
+    order = Order(
+        id="order-1", created_at=datetime(2024, 7, 13), lines=[Line(sku="sku", quantity=2)], tags={"channel": "web"}
+    )
+    sink.add(order, b"key", DAY, [], "topic", 0, 0)
+    sink.flush("topic", 0)
+
+    row = pq.read_table(next(tmp_path.rglob("*.parquet"))).to_pylist()[0]
+    assert row == {**order.model_dump(), "tags": [("channel", "web")]}
+
+
+def test_arrow_schema_from_avro():
+    schema = arrow_schema(
+        {
+            "type": "record",
+            "name": "Order",
+            "namespace": "shop",
+            "fields": [
+                {"name": "created_at", "type": {"type": "long", "logicalType": "timestamp-millis"}},
+                {"name": "total", "type": {"type": "bytes", "logicalType": "decimal", "precision": 10, "scale": 2}},
+                {"name": "status", "type": {"type": "enum", "name": "Status", "symbols": ["NEW", "PAID"]}},
+                {"name": "previous_status", "type": ["null", "shop.Status"]},
+                {"name": "lines", "type": {"type": "array", "items": "string"}},
+            ],
+        }
+    )
+
+    assert schema == pa.schema(
+        [
+            pa.field("created_at", pa.timestamp("ms", tz="UTC"), nullable=False),
+            pa.field("total", pa.decimal128(10, 2), nullable=False),
+            pa.field("status", pa.string(), nullable=False),
+            pa.field("previous_status", pa.string()),
+            pa.field("lines", pa.list_(pa.field("item", pa.string(), nullable=False)), nullable=False),
+        ]
+    )
+
+
+def test_arrow_schema_rejects_unions():
+    with pytest.raises(ValueError):
+        arrow_schema({"type": "record", "name": "Event", "fields": [{"name": "id", "type": ["string", "long"]}]})
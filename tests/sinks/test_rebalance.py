@@ -0,0 +1,48 @@
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+from confluent_kafka import TopicPartition
+from quixstreams import Application
+
+from quixstreams_extensions.sinks import rebalance
+from quixstreams_extensions.sinks.rebalance import notify_rebalances
+
+
+def test_notify_rebalances():
+    calls = []
+    app = SimpleNamespace(
+        _on_assign=lambda consumer, tps: calls.append("assign"),
+        _on_revoke=lambda consumer, tps: calls.append("revoke"),
+        _on_lost=lambda consumer, tps: calls.append("lost"),
+    )
+    sink = mock.Mock()
+    sink.on_assigned.side_effect = lambda topic, partition: calls.append(("assigned", topic, partition))
+    sink.on_revoked.side_effect = lambda topic, partition: calls.append(("revoked", topic, partition))
+    notify_rebalances(app, sink)
+
+    app._on_assign(None, [TopicPartition("topic", 0), TopicPartition("topic", 1)])
+    app._on_revoke(None, [TopicPartition("topic", 0)])
+    app._on_lost(None, [TopicPartition("topic", 1)])
+    assert calls == [
+        "assign",
+        ("assigned", "topic", 0),
+        ("assigned", "topic", 1),
+        "revoke",
+        ("revoked", "topic", 0),
+        "lost",
+        ("revoked", "topic", 1),
+    ]
+
+
+def test_application_has_the_rebalance_callbacks(tmp_path):
+    app = Application(broker_address="localhost:9092", state_dir=str(tmp_path / "state"))
+    callbacks = [getattr(app, name) for name in rebalance._CALLBACKS]
+    notify_rebalances(app, mock.Mock())
+    assert [getattr(app, name) for name in rebalance._CALLBACKS] != callbacks
+
+
+def test_notify_rebalances_requires_the_rebalance_callbacks():
+    app = SimpleNamespace(_on_assign=lambda consumer, tps: None, _on_revoke=lambda consumer, tps: None)
+    with pytest.raises(RuntimeError, match="_on_lost"):
+        notify_rebalances(app, mock.Mock())
@@ -0,0 +1,39 @@
+import pytest
+from rocksdict import Rdict
+
+from quixstreams_extensions.sinks.state import DB_NAME, open_state_store
+
+
+def test_store_is_shared_until_every_reference_is_closed(tmp_path):
+    store = open_state_store(str(tmp_path))
+    assert open_state_store(str(tmp_path)) is store
+
+    store.column_family("sink:topic:0")["key"] = True
+    store.close()
+    assert not store.closed
+    assert "key" in store.column_family("sink:topic:0")
+
+    store.close()
+    assert store.closed
+    # reopened right away, the lock has been released
+    reopened = open_state_store(str(tmp_path))
+    assert reopened is not store
+    assert "key" in reopened.column_family("sink:topic:0")
+    reopened.close()
+
+
+def test_store_rejects_another_ttl(tmp_path):
+    store = open_state_store(str(tmp_path), ttl=3600)
+    with pytest.raises(ValueError):
+        open_state_store(str(tmp_path))
+    store.close()
+
+
+def test_drop_column_family(tmp_path):
+    store = open_state_store(str(tmp_path))
+    store.column_family("sink:topic:0")["key"] = True
+    store.drop_column_family("sink:topic:0")
+    store.drop_column_family("sink:topic:1")
+    assert "key" not in store.column_family("sink:topic:0")
+    store.close()
+    assert Rdict.list_cf(str(tmp_path / DB_NAME)) == ["default", "sink:topic:0"]